@@ -8,6 +8,20 @@ import HomePage from './pages/HomePage';
 const App = () => {
   const [isAuthenticated, setIsAuthenticated] = useState(false);
 
+  useEffect(() => {
+    // A rejected token (expired or revoked) sends the admin back to the login form
+    const interceptor = axios.interceptors.response.use(
+      (response) => response,
+      (error) => {
+        if (error.response && error.response.status === 401) {
+          logout();
+        }
+        return Promise.reject(error);
+      }
+    );
+    return () => axios.interceptors.response.eject(interceptor);
+  }, []);
+
   useEffect(() => {
     const token = localStorage.getItem('adminToken');
     if (token) {
@@ -18,16 +32,31 @@ const App = () => {
   const verifyToken = async (token) => {
     try {
       const response = await axios.post('/api/verify-admin/', { token });
-      setIsAuthenticated(response.data.valid);
+      if (response.data.valid) {
+        setToken(token);
+      } else {
+        logout();
+      }
     } catch (error) {
       console.error('Error verifying token:', error);
-      setIsAuthenticated(false);
+      logout();
     }
   };
 
+  const setToken = (token) => {
+    axios.defaults.headers.common['Authorization'] = `Token ${token}`;
+    setIsAuthenticated(true);
+  };
+
+  const logout = () => {
+    delete axios.defaults.headers.common['Authorization'];
+    localStorage.removeItem('adminToken');
+    setIsAuthenticated(false);
+  };
+
   const handleLogin = (token) => {
     localStorage.setItem('adminToken', token);
-    setIsAuthenticated(true);
+    setToken(token);
   };
 
   return (
@@ -3,6 +3,12 @@ import React from 'react';
 import { motion } from 'framer-motion';
 import { FaEdit, FaTrash } from 'react-icons/fa';
 
+// Prefer the small generated thumbnail over the full size upload
+const thumbnailUrl = (product) => {
+  const primaryImage = product.images.find(img => img.is_primary);
+  return primaryImage?.variants?.thumb?.webp || primaryImage?.image || '/placeholder-image.jpg';
+};
+
 const ProductsTable = ({ products, handleEditProduct, handleDeleteProduct }) => {
   if (!products.length) {
     return (
@@ -44,7 +50,7 @@ const ProductsTable = ({ products, handleEditProduct, handleDeleteProduct }) =>
             >
               <td className="p-3">
                 <img
-                  src={product.images.find(img => img.is_primary)?.image || '/placeholder-image.jpg'}
+                  src={thumbnailUrl(product)}
                   alt={product.name}
                   className="w-12 h-12 object-cover rounded"
                 />
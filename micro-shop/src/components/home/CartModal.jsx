@@ -74,7 +74,7 @@ const CartItem = ({ item, onRemove, onUpdateQuantity, mainColor, lightenedShade,
   return (
     <div className="flex items-center mb-4">
       <img
-        src={primaryImage.image}
+        src={primaryImage.variants?.thumb?.webp || primaryImage.image}
         alt={item.name}
         className="w-16 h-16 object-cover rounded mr-4"
       />
@@ -149,7 +149,7 @@ const ProductCard = ({ product, onClick, onAddToCart, isLoading, mainColor, ligh
     >
       <div className="relative">
         <img 
-          src={product.images[currentImageIndex].image} 
+          src={product.images[currentImageIndex].variants?.card?.webp || product.images[currentImageIndex].image} 
           alt={`${product.name} - Image ${currentImageIndex + 1}`} 
           className="w-full h-64 object-cover"
         />
@@ -51,7 +51,7 @@ const ProductModal = ({ product, onClose, addToCart, loading, isOpen, mainColor
             <div className="flex flex-col md:flex-row">
               <div className="md:w-1/2 mb-4 md:mb-0 relative">
                 <img 
-                  src={product.images[currentImageIndex].image} 
+                  src={product.images[currentImageIndex].variants?.detail?.webp || product.images[currentImageIndex].image} 
                   alt={`${product.name} - Image ${currentImageIndex + 1}`}
                   className="w-full h-auto object-cover rounded-lg"
                 />
@@ -181,6 +181,7 @@ const HomePage = () => {
       const response = await axios.post('/api/transactions/', {
         ...formData,
         products: cartItems.map(item => `${item.name} (x${item.quantity})`).join(', '),
+        items: cartItems.map(item => ({ product: item.id, quantity: item.quantity })),
         total_amount: getTotalPrice(),
       });
       if (response.status === 201) {
@@ -1,11 +1,18 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.files.storage import default_storage
 from django.utils.html import format_html
-from .models import Product, ProductImage, Transaction, BankDetails, AdminToken, SiteSettings
+from .models import Product, ProductImage, Transaction, OrderItem, OrderStatusEvent, OutgoingEmail, BankDetails, AdminToken, SiteSettings
+from .tokens import generate_token, hash_token
+
+def preview_url(image, variant):
+    # Prefer a small generated variant over the full size upload
+    path = image.variants.get(variant, {}).get('jpeg')
+    return default_storage.url(path) if path else image.image.url
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'category', 'price', 'quantity')
-    search_fields = ('name', 'category')
+    list_display = ('name', 'sku', 'category', 'price', 'quantity')
+    search_fields = ('name', 'sku', 'category')
     list_filter = ('category',)
 
     class ProductImageInline(admin.StackedInline):
@@ -15,7 +22,7 @@ class ProductAdmin(admin.ModelAdmin):
 
         def display_image(self, instance):
             if instance.image:
-                return format_html('<img src="{}" style="max-height: 200px; max-width: 200px;" />'.format(instance.image.url))
+                return format_html('<img src="{}" style="max-height: 200px; max-width: 200px;" />', preview_url(instance, 'card'))
             return "No image"
 
     inlines = [ProductImageInline]
@@ -27,7 +34,7 @@ class ProductImageAdmin(admin.ModelAdmin):
 
     def display_image(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="max-height: 100px; max-width: 100px;" />'.format(obj.image.url))
+            return format_html('<img src="{}" style="max-height: 100px; max-width: 100px;" />', preview_url(obj, 'thumb'))
         return "No image"
     display_image.short_description = 'Image'
 
@@ -38,6 +45,28 @@ class TransactionAdmin(admin.ModelAdmin):
     search_fields = ('name', 'email', 'tracking_number')
     readonly_fields = ('tracking_number',)
 
+    class OrderItemInline(admin.TabularInline):
+        model = OrderItem
+        extra = 0
+        raw_id_fields = ('product',)
+
+    class OrderStatusEventInline(admin.TabularInline):
+        model = OrderStatusEvent
+        extra = 0
+        can_delete = False
+        readonly_fields = ('from_status', 'to_status', 'created_at')
+
+        def has_add_permission(self, request, obj=None):
+            return False
+
+    inlines = [OrderItemInline, OrderStatusEventInline]
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('to', 'subject')
+
 @admin.register(BankDetails)
 class BankDetailsAdmin(admin.ModelAdmin):
     list_display = ('bank_name', 'account_name', 'account_number')
@@ -45,8 +74,17 @@ class BankDetailsAdmin(admin.ModelAdmin):
 
 @admin.register(AdminToken)
 class AdminTokenAdmin(admin.ModelAdmin):
-    list_display = ('token', 'created_at', 'is_token_valid')
-    readonly_fields = ('created_at',)
+    list_display = ('prefix', 'created_at', 'expires_at', 'is_token_valid')
+    readonly_fields = ('prefix', 'created_at')
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            # Only the hash is kept, so this message is the one chance to copy the token
+            token = generate_token()
+            obj.token_hash = hash_token(token)
+            obj.prefix = token[:8]
+            messages.warning(request, f'New admin token: {token} (copy it now, it will not be shown again)')
+        super().save_model(request, obj, form, change)
 
     def is_token_valid(self, obj):
         return obj.is_valid()
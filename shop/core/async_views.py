@@ -0,0 +1,69 @@
+# core/async_views.py
+"""
+Async versions of the storefront read endpoints, served under /api/async/.
+
+DRF views are sync only, so under ASGI each request to them, middleware to
+response, is handed to a worker thread. These views stay on the event loop
+and only the queries themselves leave it, through the async ORM. Responses
+match the sync endpoints field for field.
+"""
+
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
+
+from .cache import not_modified, site_settings_cache
+from .models import Product, Transaction
+from .ratelimit import aremember_unknown_tracking_number, aunknown_tracking_number, rate_limit
+from .rows import product_rows
+from .serializers import ProductSerializer, TransactionSerializer, requested_fields
+
+
+def product_queryset(request):
+    queryset = Product.objects.prefetch_related('images')
+    fields = requested_fields(request, product_rows.field_names)
+    if fields and not fields & {'images', 'primary_image'}:
+        queryset = queryset.prefetch_related(None)
+    return queryset
+
+
+@require_GET
+async def product_list(request):
+    products = [product async for product in product_queryset(request)]
+    serializer = ProductSerializer(products, many=True, context={'request': request})
+    return JsonResponse(serializer.data, safe=False)
+
+
+@require_GET
+async def product_detail(request, pk):
+    try:
+        product = await product_queryset(request).aget(pk=pk)
+    except Product.DoesNotExist:
+        return JsonResponse({'detail': 'No Product matches the given query.'}, status=404)
+    serializer = ProductSerializer(product, context={'request': request})
+    return JsonResponse(serializer.data)
+
+
+@rate_limit('track_order')
+@require_GET
+async def track_order(request):
+    tracking_number = request.GET.get('tracking_number')
+
+    if await aunknown_tracking_number(tracking_number):
+        return JsonResponse({'error': 'Invalid tracking number'}, status=400)
+    try:
+        transaction = await Transaction.objects.prefetch_related('items').aget(tracking_number=tracking_number)
+    except Transaction.DoesNotExist:
+        await aremember_unknown_tracking_number(tracking_number)
+        return JsonResponse({'error': 'Invalid tracking number'}, status=400)
+
+    serializer = TransactionSerializer(transaction)
+    return JsonResponse(serializer.data)
+
+
+@require_GET
+async def site_settings(request):
+    data, etag = await site_settings_cache.aget()
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if not_modified(request, etag):
+        return HttpResponse(status=304, headers=headers)
+    return JsonResponse(data, headers=headers)
@@ -0,0 +1,589 @@
+# core/benchmarks.py
+"""
+Latency benchmark for the public API, driven by `manage.py benchmark`.
+
+Seeds a catalog and order history, replays a fixed set of requests through
+the Django test client and through a local WSGI server, and reports
+p50/p95/p99 latency, queries and allocations per endpoint as JSON.
+run_concurrency() additionally compares throughput of the sync and async
+read endpoints under uvicorn with many concurrent connections, and
+run_serialization() the per-object cost of the list serializers, and
+run_write_concurrency() checkout throughput with Django's default database
+connection settings against the ones in settings.DATABASES.
+"""
+
+import asyncio
+import copy
+import json
+import logging
+import platform
+import socket
+import subprocess
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+import uuid
+from io import BytesIO
+from itertools import count, islice
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+import django
+from django.core.asgi import get_asgi_application
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import Client, RequestFactory
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework import renderers
+from rest_framework.request import Request
+
+from .images import wait_for_pending_variants
+from .models import Product, ProductImage, Transaction
+from .renderers import JSONRenderer, orjson
+from .rows import product_rows, transaction_rows
+from .rollups import rebuild_rollups
+from .search import rebuild_index
+from .serializers import ProductSerializer, TransactionSerializer
+from .tokens import create_token
+
+FIRST_NAMES = ['Jane', 'John', 'Ada', 'Chinedu', 'Amaka', 'Tunde', 'Grace', 'Musa', 'Ngozi', 'Emeka']
+LAST_NAMES = ['Doe', 'Smith', 'Okafor', 'Adeyemi', 'Bello', 'Eze', 'Lovelace', 'Obi', 'Ibrahim', 'Nwosu']
+CATEGORIES = ['Shoes', 'Bags', 'Dresses', 'Accessories', 'Electronics']
+BATCH_SIZE = 5000
+# The unpaginated catalog serializes every product, so it gets a fraction of the iterations
+ITERATION_SCALE = {'products_list': 0.05}
+
+
+def batched(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def seed_products(count_, images_per_product=3, stock=1000000):
+    """Products with placeholder image rows; no files are written"""
+    products = (
+        Product(
+            name=f'Product {i}',
+            category=CATEGORIES[i % len(CATEGORIES)],
+            description=f'Description of product {i}. ' * 5,
+            price=f'{10 + i % 90}.99',
+            quantity=stock,
+        )
+        for i in range(count_)
+    )
+    for batch in batched(products):
+        Product.objects.bulk_create(batch)
+
+    images = (
+        ProductImage(product_id=product_id, image=f'products/images/seed_{product_id}_{n}.jpg', is_primary=n == 0)
+        for product_id in Product.objects.values_list('pk', flat=True).iterator()
+        for n in range(images_per_product)
+    )
+    for batch in batched(images):
+        ProductImage.objects.bulk_create(batch)
+
+
+def seed_transactions(count_):
+    """Synthetic order history; bulk inserts bypass signals so the search index and rollups are rebuilt at the end"""
+    now = timezone.now()
+    transactions = (
+        Transaction(
+            tracking_number=uuid.uuid4(),
+            name=f'{FIRST_NAMES[i % 10]} {LAST_NAMES[(i // 10) % 10]} {i}',
+            email=f'customer{i}@example.com',
+            location='Lagos',
+            phone='08000000000',
+            total_amount='20.00',
+            products='Product 1 (x1)',
+            created_at=now,
+        )
+        for i in range(count_)
+    )
+    for batch in batched(transactions):
+        Transaction.objects.bulk_create(batch)
+    rebuild_index()
+    rebuild_rollups()
+
+
+def small_png():
+    buffer = BytesIO()
+    Image.new('RGB', (640, 480), (30, 120, 200)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def build_scenarios():
+    """name -> callable returning (method, path, body, content_type) for one request"""
+    product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True)[:1000])
+    tracking_numbers = [str(t) for t in Transaction.objects.order_by('-pk').values_list('tracking_number', flat=True)[:1000]]
+    search_terms = ['jane', 'Chinedu Oka', 'customer12345', 'ibrahim 9']
+    image = small_png()
+    sequence = count()
+
+    def pick(values):
+        return values[next(sequence) % len(values)]
+
+    def checkout():
+        body = json.dumps({
+            'name': 'Benchmark Customer',
+            'email': 'bench@example.com',
+            'location': 'Lagos',
+            'phone': '08000000000',
+            'items': [{'product': pick(product_ids), 'quantity': 1}, {'product': pick(product_ids), 'quantity': 2}],
+        })
+        return 'POST', '/api/transactions/', body.encode(), 'application/json'
+
+    def upload():
+        # Alternate products so the 10 images per product limit is not hit
+        product_id = product_ids[-1 - next(sequence) % len(product_ids)]
+        body = encode_multipart(BOUNDARY, {'images': SimpleUploadedFile('bench.png', image, 'image/png')})
+        return 'POST', f'/api/products/{product_id}/upload-images/', body, MULTIPART_CONTENT
+
+    return {
+        'products_list': lambda: ('GET', '/api/products/', None, None),
+        'products_page': lambda: ('GET', '/api/products/?page_size=50', None, None),
+        'product_detail': lambda: ('GET', f'/api/products/{pick(product_ids)}/', None, None),
+        'track_order': lambda: ('GET', f'/api/track-order/?tracking_number={pick(tracking_numbers)}', None, None),
+        'transaction_search': lambda: ('GET', f'/api/transactions/?search={urllib.request.quote(pick(search_terms))}', None, None),
+        'checkout': checkout,
+        'upload_images': upload,
+    }
+
+
+class TestClientTransport:
+    name = 'client'
+
+    def __init__(self, headers):
+        self.client = Client(headers=headers)
+
+    def request(self, method, path, body, content_type):
+        kwargs = {'data': body, 'content_type': content_type} if body is not None else {}
+        response = self.client.generic(method, path, **kwargs)
+        response.content  # make sure streaming responses are consumed
+        return response.status_code
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class WSGIServerTransport:
+    name = 'wsgi'
+
+    def __init__(self, headers):
+        self.headers = headers
+        self.server = make_server('127.0.0.1', 0, WSGIHandler(), handler_class=QuietRequestHandler)
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        try:
+            self.server.serve_forever(poll_interval=0.05)
+        finally:
+            connections.close_all()
+
+    def request(self, method, path, body, content_type):
+        headers = dict(self.headers)
+        if content_type:
+            headers['Content-Type'] = content_type
+        request = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class UvicornServer:
+    """The ASGI application under uvicorn, on a thread of this process so it sees the benchmark database"""
+
+    def __init__(self):
+        import uvicorn  # only needed for the concurrency benchmark
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.bind(('127.0.0.1', 0))
+        self.port = self.socket.getsockname()[1]
+        config = uvicorn.Config(get_asgi_application(), lifespan='off', access_log=False, log_level='warning')
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, kwargs={'sockets': [self.socket]}, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+    def close(self):
+        self.server.should_exit = True
+        self.thread.join()
+        self.socket.close()
+
+
+def build_concurrency_scenarios():
+    """name -> callable(prefix) returning a GET path; prefix is '' for the sync view and 'async/' for the async one"""
+    product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True)[:1000])
+    tracking_numbers = [str(t) for t in Transaction.objects.order_by('-pk').values_list('tracking_number', flat=True)[:1000]]
+    sequence = count()
+
+    def pick(values):
+        return values[next(sequence) % len(values)]
+
+    return {
+        'track_order': lambda prefix: f'/api/{prefix}track-order/?tracking_number={pick(tracking_numbers)}',
+        'product_detail': lambda prefix: f'/api/{prefix}products/{pick(product_ids)}/',
+        'products_list': lambda prefix: f'/api/{prefix}products/?fields=id,name,price,quantity',
+        'site_settings': lambda prefix: f'/api/{prefix}site-settings/',
+    }
+
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response off a keep-alive connection and return its status code"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Server closed the connection')
+    length = 0
+    chunked = False
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding':
+            chunked = 'chunked' in value.lower()
+    if chunked:
+        while size := int((await reader.readline()).split(b';')[0], 16):
+            await reader.readexactly(size + 2)
+        await reader.readline()
+    else:
+        await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def http_worker(port, make_path, deadline, timings, errors):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            writer.write(f'GET {make_path()} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'.encode())
+            status_code = await read_response(reader)
+            timings.append((time.perf_counter() - started) * 1000)
+            if status_code >= 400:
+                errors.append(status_code)
+    finally:
+        writer.close()
+
+
+async def run_load(port, make_path, concurrency, duration):
+    timings = []
+    errors = []
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(http_worker(port, make_path, deadline, timings, errors) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        'requests': len(timings),
+        'errors': len(errors),
+        'requests_per_s': round(len(timings) / elapsed, 1),
+        'p50_ms': round(percentile(timings, 50), 3) if timings else None,
+        'p95_ms': round(percentile(timings, 95), 3) if timings else None,
+    }
+
+
+def run_concurrency(concurrency=50, duration=5, scenarios=None, log=None):
+    """
+    Throughput of each read endpoint in sync and async form under uvicorn,
+    with `concurrency` keep-alive connections for `duration` seconds each.
+    The load generator shares this process, so compare the modes with each
+    other rather than with numbers from a separate client.
+    """
+    available = build_concurrency_scenarios()
+    selected = {name: available[name] for name in (scenarios or available)}
+    server = UvicornServer()
+    results = {'sync': {}, 'async': {}}
+    try:
+        for name, make_path in selected.items():
+            for mode, prefix in (('sync', ''), ('async', 'async/')):
+                stats = asyncio.run(run_load(server.port, lambda: make_path(prefix), concurrency, duration))
+                results[mode][name] = stats
+                if log:
+                    log(f'{mode:6} {name:20} {stats["requests_per_s"]:8.1f} req/s  p50 {stats["p50_ms"]:8.2f}ms  '
+                        f'p95 {stats["p95_ms"]:8.2f}ms  errors {stats["errors"]}')
+    finally:
+        server.close()
+    return {'concurrency': concurrency, 'duration': duration, 'results': results}
+
+
+def connection_profiles(settings_dict):
+    """'default' is Django's out of the box setup, 'configured' what settings.DATABASES asks for"""
+    configured = {key: copy.deepcopy(settings_dict.get(key)) for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'OPTIONS')}
+    options = {
+        key: value for key, value in (configured['OPTIONS'] or {}).items()
+        if key not in ('init_command', 'transaction_mode', 'pool')
+    }
+    if settings_dict['ENGINE'].endswith('sqlite3'):
+        # WAL mode is stored in the database file, so switch it back explicitly
+        options['init_command'] = 'PRAGMA journal_mode=DELETE'
+    return {
+        'default': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': options},
+        'configured': configured,
+    }
+
+
+def call_wsgi(handler, environ):
+    status = []
+    response = handler(environ, lambda status_line, headers, exc_info=None: status.append(status_line))
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()  # sends request_finished, which closes or keeps the connection
+    return int(status[0].split()[0])
+
+
+def checkout_worker(handler, make_request, deadline, timings, errors):
+    factory = RequestFactory()
+    try:
+        while time.perf_counter() < deadline:
+            _, path, body, content_type = make_request()
+            environ = factory.post(path, body, content_type=content_type).environ
+            started = time.perf_counter()
+            status_code = call_wsgi(handler, environ)
+            timings.append((time.perf_counter() - started) * 1000)
+            if status_code >= 400:
+                errors.append(status_code)
+    finally:
+        connections.close_all()
+
+
+def run_write_concurrency(threads=16, duration=5, log=None):
+    """
+    Checkouts per second with `threads` worker threads calling the WSGI
+    handler for `duration` seconds, once per connection profile (see
+    connection_profiles). Each thread reuses its connection between
+    requests when the profile allows, like a threaded WSGI server would.
+    """
+    make_request = build_scenarios()['checkout']
+    handler = WSGIHandler()
+    settings_dict = connection.settings_dict
+    profiles = connection_profiles(settings_dict)
+    opened = []
+
+    def count_connection(sender, connection, **kwargs):
+        opened.append(connection.alias)
+
+    # Failed checkouts are counted, not logged
+    request_logger = logging.getLogger('django.request')
+    logger_disabled = request_logger.disabled
+    request_logger.disabled = True
+    connection_created.connect(count_connection)
+    results = {}
+    try:
+        for name, profile in profiles.items():
+            # Worker connections are created from this same dict
+            connection.close()
+            settings_dict.update(copy.deepcopy(profile))
+            journal_mode = None
+            if connection.vendor == 'sqlite':
+                with connection.cursor() as cursor:
+                    journal_mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+                connection.close()
+
+            opened.clear()
+            timings, errors = [], []
+            deadline = time.perf_counter() + duration
+            workers = [
+                threading.Thread(target=checkout_worker, args=(handler, make_request, deadline, timings, errors))
+                for _ in range(threads)
+            ]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+
+            timings.sort()
+            results[name] = stats = {
+                'checkouts': len(timings) - len(errors),
+                'errors': len(errors),
+                'checkouts_per_s': round((len(timings) - len(errors)) / elapsed, 1),
+                'p50_ms': round(percentile(timings, 50), 3) if timings else None,
+                'p95_ms': round(percentile(timings, 95), 3) if timings else None,
+                'connections_opened': len(opened),
+                'journal_mode': journal_mode,
+            }
+            if log:
+                log(f'{name:10} {stats["checkouts_per_s"]:8.1f} checkouts/s  p50 {stats["p50_ms"] or 0:8.2f}ms  '
+                    f'p95 {stats["p95_ms"] or 0:8.2f}ms  errors {stats["errors"]}  connections {stats["connections_opened"]}')
+    finally:
+        connection_created.disconnect(count_connection)
+        request_logger.disabled = logger_disabled
+        connection.close()
+        settings_dict.update(profiles['configured'])
+    return {'threads': threads, 'duration': duration, 'results': results}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(transport, make_request, iterations, warmup=3, allocation_samples=10):
+    for _ in range(warmup):
+        transport.request(*make_request())
+
+    timings = []
+    queries = []
+    errors = 0
+    for _ in range(iterations):
+        request = make_request()
+        # Queries are only visible on this thread's connection, i.e. for the test client
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            status_code = transport.request(*request)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+        if status_code >= 400:
+            errors += 1
+
+    allocations = []
+    if transport.name == 'client':
+        tracemalloc.start()
+        try:
+            for _ in range(min(iterations, allocation_samples)):
+                request = make_request()
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                transport.request(*request)
+                allocations.append((tracemalloc.get_traced_memory()[1] - baseline) / 1024)
+        finally:
+            tracemalloc.stop()
+
+    timings.sort()
+    allocations.sort()
+    return {
+        'requests': iterations,
+        'errors': errors,
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'queries': round(sum(queries) / len(queries), 2) if transport.name == 'client' else None,
+        'alloc_peak_kb': round(percentile(allocations, 50), 1) if allocations else None,
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(iterations=200, scenarios=None, transports=('client', 'wsgi'), log=None):
+    seeded = {'products': Product.objects.count(), 'transactions': Transaction.objects.count()}
+    available = build_scenarios()
+    selected = {name: available[name] for name in (scenarios or available)}
+    # Search and image uploads are admin endpoints
+    _, token = create_token()
+    headers = {'Authorization': f'Token {token}'}
+    results = {}
+    for transport_name in transports:
+        transport_class = TestClientTransport if transport_name == 'client' else WSGIServerTransport
+        transport = transport_class(headers)
+        results[transport_name] = {}
+        try:
+            for name, make_request in selected.items():
+                scenario_iterations = max(5, int(iterations * ITERATION_SCALE.get(name, 1)))
+                results[transport_name][name] = run_scenario(transport, make_request, scenario_iterations)
+                if log:
+                    stats = results[transport_name][name]
+                    log(f'{transport_name:6} {name:20} p50 {stats["p50_ms"]:8.2f}ms  p95 {stats["p95_ms"]:8.2f}ms  '
+                        f'p99 {stats["p99_ms"]:8.2f}ms  errors {stats["errors"]}')
+        finally:
+            if hasattr(transport, 'close'):
+                transport.close()
+            # Variant workers must not outlive the benchmark database
+            wait_for_pending_variants()
+
+    return {
+        'meta': {
+            'commit': current_commit(),
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            **seeded,
+            'iterations': iterations,
+        },
+        'results': results,
+    }
+
+
+def best_time(func, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def run_serialization(count_=1000, rounds=5, log=None):
+    """
+    Microseconds per object to load and serialize the first `count_`
+    products and transactions with the ModelSerializers and with
+    core.rows, and to render the result with DRF's stdlib encoder and
+    with core.renderers (orjson when installed). Best of `rounds`.
+    """
+    request = Request(RequestFactory().get('/'))
+    lists = {
+        'products': (ProductSerializer, Product.objects.prefetch_related('images').order_by('pk'), product_rows),
+        'transactions': (TransactionSerializer, Transaction.objects.prefetch_related('items').order_by('pk'), transaction_rows),
+    }
+    results = {'json_backend': 'orjson' if orjson else 'stdlib'}
+    for name, (serializer_class, queryset, rows) in lists.items():
+        queryset = queryset[:count_]
+        objects = max(1, len(queryset))
+        serializer_time, data = best_time(
+            lambda: serializer_class(queryset.all(), many=True, context={'request': request}).data, rounds
+        )
+        rows_time, _ = best_time(lambda: rows.build(list(rows.values(queryset.all(), request)), request), rounds)
+        drf_render_time, _ = best_time(lambda: renderers.JSONRenderer().render(data), rounds)
+        fast_render_time, _ = best_time(lambda: JSONRenderer().render(data), rounds)
+        results[name] = stats = {
+            'objects': objects,
+            'model_serializer_us': round(serializer_time / objects * 1e6, 2),
+            'rows_us': round(rows_time / objects * 1e6, 2),
+            'drf_render_us': round(drf_render_time / objects * 1e6, 2),
+            'fast_render_us': round(fast_render_time / objects * 1e6, 2),
+        }
+        if log:
+            log(f'{name:12} serializer {stats["model_serializer_us"]:8.2f}us  rows {stats["rows_us"]:8.2f}us  '
+                f'render {stats["drf_render_us"]:6.2f}us -> {stats["fast_render_us"]:6.2f}us per object')
+    return results
+
+
+def compare(baseline, current, metric='p95_ms'):
+    """Yield (transport, scenario, before, after, change %) for results present in both runs"""
+    for transport, scenarios in current['results'].items():
+        for name, stats in scenarios.items():
+            before = baseline.get('results', {}).get(transport, {}).get(name, {}).get(metric)
+            after = stats.get(metric)
+            if before and after is not None:
+                yield transport, name, before, after, (after - before) / before * 100
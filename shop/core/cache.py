@@ -0,0 +1,96 @@
+# core/cache.py
+
+import hashlib
+import json
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import BankDetails, SiteSettings
+from .serializers import BankDetailsSerializer, SiteSettingsSerializer
+
+
+class CachedPayload:
+    """
+    Serialized API data for rarely changing rows, kept in a process-local
+    layer in front of the shared Django cache. Call invalidate() when the
+    underlying rows change; other processes pick the change up from the
+    shared cache within local_ttl seconds. Shared entries expire after
+    shared_ttl seconds, so one written from a read that raced an
+    invalidate() is not served for long.
+    """
+    def __init__(self, key, loader, local_ttl=5, shared_ttl=300):
+        self.key = key
+        self.loader = loader
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self._local = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return (data, etag)"""
+        local = self._local
+        if local is not None and local[0] > time.monotonic():
+            return local[1]
+
+        payload = cache.get(self.key)
+        if payload is None:
+            data = self.loader()
+            body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()
+            payload = (data, quote_etag(hashlib.sha1(body).hexdigest()))
+            cache.set(self.key, payload, timeout=self.shared_ttl)
+        with self._lock:
+            self._local = (time.monotonic() + self.local_ttl, payload)
+        return payload
+
+    async def aget(self):
+        """Async get(); a fresh local copy is returned without leaving the event loop"""
+        local = self._local
+        if local is not None and local[0] > time.monotonic():
+            return local[1]
+        return await sync_to_async(self.get)()
+
+    def invalidate(self):
+        with self._lock:
+            self._local = None
+        cache.delete(self.key)
+
+
+def load_bank_details():
+    return [dict(row) for row in BankDetailsSerializer(BankDetails.objects.all(), many=True).data]
+
+
+def load_site_settings():
+    settings = SiteSettings.objects.first()
+    if not settings:
+        settings = SiteSettings.objects.create()
+    return dict(SiteSettingsSerializer(settings).data)
+
+
+# Both are read on every storefront page load but change rarely; core.signals
+# invalidates them whenever a row is saved or deleted
+bank_details_cache = CachedPayload('core:bank-details', load_bank_details)
+site_settings_cache = CachedPayload('core:site-settings', load_site_settings)
+
+
+def not_modified(request, etag):
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    # Weak comparison: CompressionMiddleware hands out W/ versions of our ETags
+    return if_none_match.strip() == '*' or etag in {tag.removeprefix('W/') for tag in parse_etags(if_none_match)}
+
+
+def cached_response(request, payload):
+    """Build a 200 with an ETag, or a 304 if the client already has it"""
+    data, etag = payload
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if not_modified(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(data, headers=headers)
@@ -0,0 +1,157 @@
+# core/catalog.py
+"""
+Bulk product import and export in CSV or JSON Lines.
+
+Both directions stream: imports read the file row by row and upsert
+products in batches keyed on SKU, exports read the table with a
+server-side iterator. Memory use does not grow with the catalog size.
+"""
+
+import codecs
+import csv
+import json
+import os
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Product
+from .versions import bump as bump_version
+
+FORMATS = ('csv', 'jsonl')
+EXPORT_FIELDS = ['id', 'sku', 'name', 'category', 'description', 'price', 'quantity']
+IMPORT_FIELDS = ['name', 'category', 'description', 'price', 'quantity']
+BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+def file_format(filename, default=None):
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension == 'ndjson':
+        return 'jsonl'
+    return extension if extension in FORMATS else default
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict or None) from a binary stream; None marks an unparsable line"""
+    text = codecs.iterdecode(stream, 'utf-8-sig')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        if reader.fieldnames is None or 'sku' not in reader.fieldnames:
+            raise ImportFormatError('The CSV header must include a sku column')
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+    else:
+        raise ImportFormatError(f'Unsupported format; use one of {", ".join(FORMATS)}')
+
+
+def clean_row(row):
+    """Return (Product, errors); validation uses the model fields so imports obey the same rules as the API"""
+    if row is None:
+        return None, {'row': ['Could not parse this line']}
+    errors = {}
+    values = {}
+    for name in ['sku'] + IMPORT_FIELDS:
+        raw = row.get(name)
+        if isinstance(raw, str):
+            raw = raw.strip()
+        if name == 'sku' and not raw:
+            errors[name] = ['This field is required.']
+            continue
+        try:
+            values[name] = Product._meta.get_field(name).clean(raw, None)
+        except ValidationError as e:
+            errors[name] = e.messages
+    if errors:
+        return None, errors
+    return Product(**values), {}
+
+
+def upsert_batch(products):
+    """Insert new SKUs and update existing ones; returns (created, updated)"""
+    # Later rows win when a SKU appears twice in the same batch
+    by_sku = {product.sku: product for product in products}
+    with transaction.atomic():
+        existing = set(Product.objects.filter(sku__in=by_sku).values_list('sku', flat=True))
+        Product.objects.bulk_create(
+            by_sku.values(),
+            update_conflicts=True,
+            unique_fields=['sku'],
+            update_fields=IMPORT_FIELDS,
+        )
+        bump_version(Product)
+    return len(by_sku) - len(existing), len(existing)
+
+
+def next_chunk(rows, size):
+    try:
+        return list(islice(rows, size))
+    except UnicodeDecodeError:
+        raise ImportFormatError('The file must be UTF-8 encoded')
+
+
+def import_products(stream, fmt, batch_size=BATCH_SIZE):
+    """
+    Upsert products from a CSV or JSON Lines stream. Valid rows are saved
+    batch by batch even when other rows fail; the report lists the first
+    MAX_REPORTED_ERRORS failures by line number.
+    """
+    report = {'rows': 0, 'created': 0, 'updated': 0, 'failed': 0, 'errors': []}
+    rows = read_rows(stream, fmt)
+    while chunk := next_chunk(rows, batch_size):
+        products = []
+        for line_number, row in chunk:
+            report['rows'] += 1
+            product, errors = clean_row(row)
+            if errors:
+                report['failed'] += 1
+                if len(report['errors']) < MAX_REPORTED_ERRORS:
+                    sku = row.get('sku') if row else None
+                    report['errors'].append({'line': line_number, 'sku': sku, 'errors': errors})
+                continue
+            products.append(product)
+        if products:
+            created, updated = upsert_batch(products)
+            report['created'] += created
+            report['updated'] += updated
+    return report
+
+
+class Echo:
+    """File-like object whose write() hands the line back, so csv.writer can feed a generator"""
+    def write(self, value):
+        return value
+
+
+def export_products(fmt):
+    """Yield the catalog as encoded CSV or JSON Lines, one chunk per EXPORT_CHUNK_SIZE rows"""
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        encode = writer.writerow
+        yield encode(EXPORT_FIELDS).encode()
+    elif fmt == 'jsonl':
+        def encode(row):
+            record = dict(zip(EXPORT_FIELDS, row))
+            record['price'] = str(record['price'])
+            return json.dumps(record) + '\n'
+    else:
+        raise ImportFormatError(f'Unsupported format; use one of {", ".join(FORMATS)}')
+
+    rows = Product.objects.order_by('pk').values_list(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    while chunk := list(islice(rows, EXPORT_CHUNK_SIZE)):
+        yield ''.join(encode(row) for row in chunk).encode()
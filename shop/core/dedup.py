@@ -0,0 +1,152 @@
+# core/dedup.py
+"""
+Content-addressed storage for uploaded product images and payment proofs.
+
+Uploads are hashed with SHA-256 as they stream in: the upload handlers in
+settings.FILE_UPLOAD_HANDLERS set `sha256` on every uploaded file, and
+chunked uploads are hashed when they are completed. Files that carry a
+hash are stored once per content, as <upload dir>/<sha256><ext>, with a
+StoredFile row counting the fields that point at them. Saving content
+that is already stored only bumps the count, and deleting only drops the
+file when the last reference goes, so django_cleanup keeps working.
+
+Files without a hash (image variants, direct uploads, files stored before
+this) are saved and deleted as usual.
+"""
+
+import hashlib
+import posixpath
+import re
+from collections import Counter
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models import F
+
+READ_SIZE = 64 * 1024
+CONTENT_NAME = re.compile(r'[0-9a-f]{64}(\.\w+)?')
+
+
+class HashingMixin:
+    def new_file(self, *args, **kwargs):
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        data = super().receive_data_chunk(raw_data, start)
+        if data is None:  # this handler kept the chunk
+            self.hasher.update(raw_data)
+        return data
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def hash_file(file):
+    """Set and return file.sha256, reading the file from the start"""
+    hasher = hashlib.sha256()
+    file.seek(0)
+    for data in iter(lambda: file.read(READ_SIZE), b''):
+        hasher.update(data)
+    file.seek(0)
+    file.sha256 = hasher.hexdigest()
+    return file.sha256
+
+
+def content_name(name, digest):
+    directory, filename = posixpath.split(name)
+    return posixpath.join(directory, digest + posixpath.splitext(filename)[1].lower())
+
+
+def is_content_name(name):
+    return bool(name) and CONTENT_NAME.fullmatch(posixpath.basename(name)) is not None
+
+
+def save_files(field, files):
+    """
+    Store files for a model file field in one batch and return their names,
+    to assign to the field. Storage names (str) are passed through.
+    """
+    uploads = [(field.generate_filename(None, file.name), file) for file in files if not isinstance(file, str)]
+    if hasattr(field.storage, 'save_many'):
+        saved = field.storage.save_many(uploads, field.max_length)
+    else:
+        saved = [field.storage.save(name, file, max_length=field.max_length) for name, file in uploads]
+    saved = iter(saved)
+    return [file if isinstance(file, str) else next(saved) for file in files]
+
+
+class ContentAddressedMixin:
+    """
+    For Storage classes with an `alias` (their key in settings.STORAGES).
+    save_many() stores a batch in a constant number of queries.
+    """
+    def save(self, name, content, max_length=None):
+        if not getattr(content, 'sha256', None):
+            return super().save(name, content, max_length)
+        return self.save_many([(name or content.name, content)], max_length)[0]
+
+    def save_many(self, files, max_length=None):
+        """Save (name, content) pairs and return the stored names, in order"""
+        # core.models imports this module through core.storage
+        from .models import StoredFile
+
+        targets = [content_name(name, content.sha256) if getattr(content, 'sha256', None) else None for name, content in files]
+        with transaction.atomic():
+            known = set(StoredFile.objects.filter(
+                storage=self.alias, name__in={target for target in targets if target},
+            ).values_list('name', flat=True))
+
+            names, new = [], {}
+            for (name, content), target in zip(files, targets):
+                if target is None:
+                    names.append(super().save(name, content, max_length))
+                    continue
+                if target not in known and target not in new:
+                    self.write_once(target, content, max_length)
+                    new[target] = StoredFile(storage=self.alias, name=target, size=content.size, refs=0)
+                names.append(target)
+
+            StoredFile.objects.bulk_create(new.values(), ignore_conflicts=True)
+            # One UPDATE per distinct count, usually just one
+            counts = Counter(name for name, target in zip(names, targets) if target)
+            by_count = {}
+            for name, count in counts.items():
+                by_count.setdefault(count, []).append(name)
+            for count, batch in by_count.items():
+                StoredFile.objects.filter(storage=self.alias, name__in=batch).update(refs=F('refs') + count)
+        return names
+
+    def write_once(self, name, content, max_length):
+        # A file already at the name has the same bytes (say, left by a rolled
+        # back upload), unless an earlier write was cut short
+        if self.exists(name) and self.size(name) == content.size:
+            return
+        super().delete(name)
+        saved = super().save(name, content, max_length)
+        if saved != name:
+            # A concurrent upload of the same content got there first
+            super().delete(saved)
+
+    def delete(self, name):
+        if not is_content_name(name):
+            return super().delete(name)
+        from .models import StoredFile
+
+        with transaction.atomic():
+            stored = StoredFile.objects.filter(storage=self.alias, name=name)
+            if stored.filter(refs__gt=1).update(refs=F('refs') - 1):
+                return
+            stored.delete()
+            super().delete(name)
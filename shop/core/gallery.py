@@ -0,0 +1,78 @@
+# core/gallery.py
+"""
+Product image management in a constant number of queries. New images are
+inserted with one bulk_create and the primary flag is moved with
+conditional UPDATEs, all inside one transaction that holds a lock on the
+product row, so concurrent calls for one product run one after another
+and can't exceed MAX_IMAGES or leave the product with zero or two
+primary images. (SQLite ignores select_for_update(), but it serializes
+writers anyway.)
+"""
+
+from django.db import transaction
+
+from .dedup import save_files
+from .images import schedule_variants
+from .models import Product, ProductImage
+from .versions import bump as bump_version
+
+MAX_IMAGES = 10
+
+
+class GalleryError(Exception):
+    pass
+
+
+def lock_product(product_id):
+    list(Product.objects.select_for_update().filter(pk=product_id).values_list('pk'))
+
+
+def add_images(product, files, primary_image_id=None):
+    """
+    Store files (or storage names of files already stored) as new images of
+    product and return them. primary_image_id picks an existing image as
+    primary; otherwise the first new image becomes primary if the product
+    has none.
+    """
+    with transaction.atomic():
+        lock_product(product.pk)
+        existing_count = ProductImage.objects.filter(product_id=product.pk).count()
+        if existing_count + len(files) > MAX_IMAGES:
+            raise GalleryError(
+                f'Maximum {MAX_IMAGES} images allowed per product. '
+                f'You can add {MAX_IMAGES - existing_count} more images.'
+            )
+        # Checked before any file is written
+        if primary_image_id and not ProductImage.objects.make_primary(product.pk, primary_image_id):
+            raise GalleryError('Specified primary image does not exist')
+
+        # Duplicates of files already stored are not written again (see core.dedup)
+        names = save_files(ProductImage._meta.get_field('image'), files)
+        images = ProductImage.objects.bulk_create([ProductImage(product=product, image=name) for name in names])
+        if images and not primary_image_id and ProductImage.objects.promote_if_none(product.pk, images[0].pk):
+            images[0].is_primary = True
+
+        # bulk_create sends no post_save, so do what core.signals would
+        schedule_variants([image.pk for image in images])
+        bump_version(ProductImage)
+    return images
+
+
+def set_primary(product, image_id):
+    with transaction.atomic():
+        lock_product(product.pk)
+        if not ProductImage.objects.make_primary(product.pk, image_id):
+            raise GalleryError('Specified image does not exist')
+        bump_version(ProductImage)
+
+
+def delete_image(product, image_id):
+    """Delete one image; if it was primary, the newest remaining image takes over"""
+    with transaction.atomic():
+        lock_product(product.pk)
+        image = ProductImage.objects.filter(product_id=product.pk, pk=image_id).first()
+        if image is None:
+            raise GalleryError('Specified image does not exist')
+        image.delete()
+        if image.is_primary:
+            ProductImage.objects.promote_if_none(product.pk)
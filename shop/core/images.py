@@ -0,0 +1,126 @@
+# core/images.py
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from .models import ProductImage
+from .versions import bump as bump_version
+
+logger = logging.getLogger(__name__)
+
+# name -> target width in pixels; images are never upscaled
+VARIANT_WIDTHS = {
+    'thumb': 150,
+    'card': 400,
+    'detail': 1000,
+}
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+VARIANT_DIR = 'products/variants/'
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2),
+            thread_name_prefix='image-variants',
+        )
+    return _executor
+
+
+def wait_for_pending_variants():
+    """Block until every scheduled variant job has finished"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def render_variants(source):
+    """Yield (name, format, bytes) for every variant of an open PIL image"""
+    source = ImageOps.exif_transpose(source)
+    if source.mode not in ('RGB', 'L'):
+        # Flatten transparency onto white, JPEG has no alpha channel
+        background = Image.new('RGB', source.size, (255, 255, 255))
+        background.paste(source, mask=source.convert('RGBA').split()[-1])
+        source = background
+    for name, width in VARIANT_WIDTHS.items():
+        resized = source
+        if source.width > width:
+            height = round(source.height * width / source.width)
+            resized = source.resize((width, height), Image.LANCZOS)
+        for extension, (pil_format, options) in VARIANT_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, **options)
+            yield name, extension, buffer.getvalue()
+
+
+def generate_variants(image_id):
+    """Create the resized variants for one ProductImage and record their paths"""
+    try:
+        product_image = ProductImage.objects.get(pk=image_id)
+    except ProductImage.DoesNotExist:
+        return None
+
+    base = os.path.splitext(os.path.basename(product_image.image.name))[0]
+    variants = {}
+    with product_image.image.open('rb') as original, Image.open(original) as source:
+        for name, extension, data in render_variants(source):
+            path = default_storage.save(f'{VARIANT_DIR}{product_image.pk}_{base}_{name}.{extension}', ContentFile(data))
+            variants.setdefault(name, {})[extension] = path
+
+    delete_variant_files(product_image.variants)
+    # update() rather than save() so the primary image logic is not re-run
+    ProductImage.objects.filter(pk=image_id).update(variants=variants)
+    bump_version(ProductImage)
+    return variants
+
+
+def _generate_in_worker(image_id):
+    try:
+        generate_variants(image_id)
+    except Exception:
+        logger.exception('Could not generate variants for product image %s', image_id)
+    finally:
+        # Pool threads outlive requests, so a connection kept for CONN_MAX_AGE would
+        # hold the database open after wait_for_pending_variants() returns
+        connections.close_all()
+
+
+def schedule_variants(image_ids):
+    """
+    Generate variants once the surrounding transaction commits. With
+    IMAGE_VARIANTS_ASYNC the work runs in a thread pool so uploads return
+    straight away.
+    """
+    image_ids = list(image_ids)
+
+    def run():
+        if getattr(settings, 'IMAGE_VARIANTS_ASYNC', True):
+            executor = get_executor()
+            for image_id in image_ids:
+                executor.submit(_generate_in_worker, image_id)
+        else:
+            for image_id in image_ids:
+                generate_variants(image_id)
+
+    transaction.on_commit(run)
+
+
+def delete_variant_files(variants):
+    for formats in (variants or {}).values():
+        for path in formats.values():
+            default_storage.delete(path)
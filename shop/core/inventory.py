@@ -0,0 +1,100 @@
+# core/inventory.py
+
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .models import OrderItem, OrderStatusEvent, Product, Transaction
+from .rollups import status_changed
+from .versions import bump as bump_version
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id):
+        super().__init__(f'Not enough stock for product {product_id}')
+        self.product_id = product_id
+
+
+def reservation_timeout():
+    return timedelta(hours=getattr(settings, 'STOCK_RESERVATION_HOURS', 48))
+
+
+def quantities_by_product(items):
+    quantities = Counter()
+    for item in items:
+        if item.product_id is not None:
+            quantities[item.product_id] += item.quantity
+    return quantities
+
+
+def reserve_stock(items):
+    """
+    Take the items' quantities out of stock. Each product is decremented with
+    a single conditional UPDATE, so concurrent checkouts can never drive
+    quantity below zero. Must run inside a transaction: if any product is
+    short, OutOfStock is raised and the caller's transaction rolls back.
+    """
+    # A fixed lock order avoids deadlocks between overlapping carts
+    for product_id, quantity in sorted(quantities_by_product(items).items()):
+        updated = Product.objects.filter(pk=product_id, quantity__gte=quantity).update(quantity=F('quantity') - quantity)
+        if not updated:
+            raise OutOfStock(product_id)
+    bump_version(Product)
+
+
+def release_stock(order):
+    """Put a reserved order's items back in stock. Safe to call repeatedly."""
+    with db_transaction.atomic():
+        # Flip the flag first; only the caller that flips it returns the stock
+        if not Transaction.objects.filter(pk=order.pk, stock_reserved=True).update(stock_reserved=False, reserved_until=None):
+            return False
+        for product_id, quantity in sorted(quantities_by_product(order.items.all()).items()):
+            Product.objects.filter(pk=product_id).update(quantity=F('quantity') + quantity)
+        bump_version(Product, Transaction)
+    order.stock_reserved = False
+    order.reserved_until = None
+    return True
+
+
+def release_orders_stock(order_ids):
+    """
+    release_stock() for many orders: one UPDATE for the flags and one for all
+    the products. Run it in a transaction that has locked the orders.
+    """
+    order_ids = list(Transaction.objects.filter(pk__in=order_ids, stock_reserved=True).values_list('pk', flat=True))
+    if not order_ids:
+        return 0
+    Transaction.objects.filter(pk__in=order_ids).update(stock_reserved=False, reserved_until=None)
+    quantities = dict(
+        OrderItem.objects.filter(transaction_id__in=order_ids, product__isnull=False)
+        .values_list('product').annotate(Sum('quantity')).order_by()
+    )
+    if quantities:
+        Product.objects.filter(pk__in=quantities).update(quantity=F('quantity') + Case(
+            *(When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()),
+            output_field=IntegerField(),
+        ))
+    bump_version(Product, Transaction)
+    return len(order_ids)
+
+
+def release_expired_reservations(now=None):
+    """Cancel unpaid pending orders whose reservation ran out and restock them"""
+    now = now or timezone.now()
+    expired = Transaction.objects.filter(status='pending', stock_reserved=True, reserved_until__lt=now)
+    released = 0
+    for order in expired.iterator():
+        with db_transaction.atomic():
+            if release_stock(order):
+                if Transaction.objects.filter(pk=order.pk, status='pending').update(status='cancelled'):
+                    # update() sends no post_save, so move the order in the dashboard rollups
+                    # and record its status change here
+                    status_changed(order, 'pending', 'cancelled')
+                    OrderStatusEvent.objects.create(transaction=order, from_status='pending', to_status='cancelled')
+                    bump_version(Transaction)
+                released += 1
+    return released
@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from core.benchmarks import (
+    build_concurrency_scenarios, build_scenarios, compare, run_benchmarks, run_concurrency, run_serialization,
+    run_write_concurrency, seed_products, seed_transactions,
+)
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway database and report API latency per endpoint as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--transactions', type=int, default=1000000)
+        parser.add_argument('--iterations', type=int, default=200, help='Requests per endpoint')
+        parser.add_argument('--scenarios', help='Comma separated subset of endpoints to run')
+        parser.add_argument('--transports', default='client,wsgi', help='client, wsgi, both, or empty for none')
+        parser.add_argument(
+            '--concurrency', type=int, default=0,
+            help='Also compare sync and async read endpoints under uvicorn with this many connections (needs uvicorn)',
+        )
+        parser.add_argument(
+            '--write-concurrency', type=int, default=0,
+            help='Also compare checkout throughput with default and configured database connection settings '
+                 'using this many threads',
+        )
+        parser.add_argument(
+            '--duration', type=float, default=5,
+            help='Seconds per endpoint for --concurrency, per connection profile for --write-concurrency',
+        )
+        parser.add_argument(
+            '--serialization', type=int, default=0,
+            help='Also time list serialization and rendering per object over this many products and transactions',
+        )
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='Earlier results file to diff p95 latency against')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+        transports = [t.strip() for t in options['transports'].split(',') if t.strip()]
+        if set(transports) - {'client', 'wsgi'}:
+            raise CommandError('--transports accepts client and wsgi')
+        if options['concurrency']:
+            try:
+                import uvicorn  # noqa: F401
+            except ImportError:
+                raise CommandError('--concurrency needs uvicorn: pip install uvicorn')
+
+        # Never touch the real database or media files. The throwaway database
+        # is a file so the WSGI server and image workers can share it.
+        old_name = connection.settings_dict['NAME']
+        scratch_dir = tempfile.mkdtemp()
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = os.path.join(scratch_dir, 'benchmark.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # Rate limits are off: every benchmark request comes from one address
+            with override_settings(
+                MEDIA_ROOT=os.path.join(scratch_dir, 'media'), ALLOWED_HOSTS=['*'], DEBUG=False, RATE_LIMITS={},
+            ):
+                results = self.run(options, transports)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        if baseline:
+            self.stdout.write('\np95 change against baseline:')
+            for transport, name, before, after, change in compare(baseline, results):
+                self.stdout.write(f'{transport:6} {name:20} {before:8.2f}ms -> {after:8.2f}ms  {change:+6.1f}%')
+
+    def run(self, options, transports):
+        started = time.perf_counter()
+        seed_products(options['products'])
+        seed_transactions(options['transactions'])
+        self.stdout.write(
+            f'Seeded {options["products"]} products and {options["transactions"]} transactions '
+            f'in {time.perf_counter() - started:.1f}s'
+        )
+
+        scenarios = concurrency_scenarios = None
+        if options['scenarios']:
+            requested = [name.strip() for name in options['scenarios'].split(',')]
+            available = set(build_scenarios()) | (set(build_concurrency_scenarios()) if options['concurrency'] else set())
+            unknown = set(requested) - available
+            if unknown:
+                raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+            scenarios = [name for name in requested if name in build_scenarios()]
+            concurrency_scenarios = [name for name in requested if name in build_concurrency_scenarios()]
+
+        results = {'meta': {}, 'results': {}}
+        if transports and scenarios != []:
+            results = run_benchmarks(options['iterations'], scenarios, transports, log=self.stdout.write)
+        if options['write_concurrency']:
+            results['write_concurrency'] = run_write_concurrency(
+                options['write_concurrency'], options['duration'], log=self.stdout.write
+            )
+        if options['concurrency'] and concurrency_scenarios != []:
+            results['concurrency'] = run_concurrency(
+                options['concurrency'], options['duration'], concurrency_scenarios, log=self.stdout.write
+            )
+        if options['serialization']:
+            results['serialization'] = run_serialization(options['serialization'], log=self.stdout.write)
+        return results
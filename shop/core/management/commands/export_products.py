@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.catalog import FORMATS, export_products, file_format
+
+
+class Command(BaseCommand):
+    help = 'Write the product catalog as CSV or JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='Output file; defaults to stdout')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension, else csv')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or file_format(path, default='csv')
+
+        if path == '-':
+            for chunk in export_products(fmt):
+                self.stdout.write(chunk.decode(), ending='')
+            return
+        try:
+            with open(path, 'wb') as f:
+                for chunk in export_products(fmt):
+                    f.write(chunk)
+        except OSError as e:
+            raise CommandError(str(e))
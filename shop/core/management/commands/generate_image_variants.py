@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core.images import generate_variants
+from core.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Generate resized variants for product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate images that already have variants')
+
+    def handle(self, *args, **options):
+        queryset = ProductImage.objects.order_by('pk')
+        if not options['all']:
+            queryset = queryset.filter(variants={})
+        done = failed = 0
+        for image_id in queryset.values_list('pk', flat=True).iterator():
+            try:
+                generate_variants(image_id)
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Image {image_id}: {e}')
+        self.stdout.write(f'Generated variants for {done} image(s), {failed} failed')
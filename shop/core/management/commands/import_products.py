@@ -0,0 +1,37 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.catalog import BATCH_SIZE, FORMATS, ImportFormatError, file_format, import_products
+
+
+class Command(BaseCommand):
+    help = 'Upsert products by SKU from a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - for stdin')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or file_format(path)
+        if fmt is None:
+            raise CommandError('Cannot tell the format from the file name; pass --format')
+
+        try:
+            if path == '-':
+                report = import_products(sys.stdin.buffer, fmt, options['batch_size'])
+            else:
+                with open(path, 'rb') as f:
+                    report = import_products(f, fmt, options['batch_size'])
+        except (OSError, ImportFormatError) as e:
+            raise CommandError(str(e))
+
+        for error in report['errors']:
+            self.stderr.write(f'line {error["line"]}: {json.dumps(error["errors"])}')
+        self.stdout.write(
+            f'{report["rows"]} row(s): {report["created"]} created, {report["updated"]} updated, '
+            f'{report["failed"]} failed'
+        )
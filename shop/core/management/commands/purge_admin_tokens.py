@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.tokens import PURGE_BATCH_SIZE, purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = 'Delete expired admin tokens in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        purged = purge_expired_tokens(options['batch_size'])
+        self.stdout.write(f'Purged {purged} expired admin token(s)')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.uploads import purge_expired_uploads
+
+
+class Command(BaseCommand):
+    help = 'Discard chunked uploads that were started but never completed'
+
+    def handle(self, *args, **options):
+        purged = purge_expired_uploads()
+        self.stdout.write(f'Purged {purged} expired upload(s)')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the dashboard order rollups from scratch, e.g. after bulk imports that bypass signals'
+
+    def handle(self, *args, **options):
+        rows = rebuild_rollups()
+        self.stdout.write(f'Dashboard rollups rebuilt ({rows} day/status rows)')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.inventory import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Cancel unpaid pending orders whose stock reservation expired and return the stock'
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations()
+        self.stdout.write(f'Released {released} expired reservation(s)')
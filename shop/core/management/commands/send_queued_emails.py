@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.outbox import send_queued_emails
+
+
+class Command(BaseCommand):
+    help = 'Send pending emails from the outbox, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new emails')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep between polls when idle')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_queued_emails(options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'Sent {sent} email(s), {failed} failed')
+            if not options['loop']:
+                break
+            # Keep draining while there is a backlog, only sleep when idle
+            if sent + failed < options['batch_size']:
+                time.sleep(options['interval'])
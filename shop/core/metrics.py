@@ -0,0 +1,200 @@
+# core/metrics.py
+"""
+Opt-in request instrumentation, enabled with METRICS_ENABLED = True.
+
+Every request records wall time, database queries and query time,
+serializer time and response size per view. The numbers are returned as
+a Server-Timing header and aggregated for the Prometheus text endpoint at
+/api/metrics/, which needs an admin token. Each thread writes to its own
+collector, so recording takes no locks; only the (rare) export walks all
+of them.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'db_time', 'serializer_time', 'serializer_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed as a database execute_wrapper for the request
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+
+class ViewStats:
+    __slots__ = ('count', 'duration', 'buckets', 'queries', 'db_time', 'serializer_time', 'response_bytes')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.response_bytes = 0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._local = threading.local()
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def collector(self):
+        try:
+            return self._local.collector
+        except AttributeError:
+            collector = self._local.collector = {}
+            with self._lock:
+                self._collectors.append(collector)
+            return collector
+
+    def record(self, view, method, duration, request_metrics, response_bytes):
+        collector = self.collector()
+        stats = collector.get((view, method))
+        if stats is None:
+            stats = collector[(view, method)] = ViewStats()
+        stats.count += 1
+        stats.duration += duration
+        stats.buckets[bisect_left(DURATION_BUCKETS, duration)] += 1
+        stats.queries += request_metrics.queries
+        stats.db_time += request_metrics.db_time
+        stats.serializer_time += request_metrics.serializer_time
+        stats.response_bytes += response_bytes
+
+    def snapshot(self):
+        """Merge every thread's collector into {(view, method): ViewStats}"""
+        with self._lock:
+            collectors = list(self._collectors)
+        merged = {}
+        for collector in collectors:
+            for key, stats in list(collector.items()):
+                total = merged.get(key)
+                if total is None:
+                    total = merged[key] = ViewStats()
+                total.count += stats.count
+                total.duration += stats.duration
+                total.buckets = [a + b for a, b in zip(total.buckets, stats.buckets)]
+                total.queries += stats.queries
+                total.db_time += stats.db_time
+                total.serializer_time += stats.serializer_time
+                total.response_bytes += stats.response_bytes
+        return merged
+
+    def reset(self):
+        with self._lock:
+            for collector in self._collectors:
+                collector.clear()
+
+    def render_prometheus(self):
+        lines = [
+            '# HELP shop_request_duration_seconds Request wall time per view.',
+            '# TYPE shop_request_duration_seconds histogram',
+        ]
+        snapshot = sorted(self.snapshot().items())
+        for (view, method), stats in snapshot:
+            labels = f'view="{view}",method="{method}"'
+            cumulative = 0
+            for bound, observed in zip(DURATION_BUCKETS, stats.buckets):
+                cumulative += observed
+                lines.append(f'shop_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'shop_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+            lines.append(f'shop_request_duration_seconds_sum{{{labels}}} {stats.duration:.6f}')
+            lines.append(f'shop_request_duration_seconds_count{{{labels}}} {stats.count}')
+
+        counters = [
+            ('shop_db_queries_total', 'Database queries per view.', 'queries', '{}'),
+            ('shop_db_query_seconds_total', 'Time spent in database queries per view.', 'db_time', '{:.6f}'),
+            ('shop_serializer_seconds_total', 'Time spent serializing per view.', 'serializer_time', '{:.6f}'),
+            ('shop_response_bytes_total', 'Response body bytes per view.', 'response_bytes', '{}'),
+        ]
+        for name, help_text, attribute, value_format in counters:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for (view, method), stats in snapshot:
+                value = value_format.format(getattr(stats, attribute))
+                lines.append(f'{name}{{view="{view}",method="{method}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def timed_representation(to_representation, instance):
+    """Call to_representation, timing it if it is the request's outermost serializer"""
+    request_metrics = _current.get()
+    if request_metrics is None:
+        return to_representation(instance)
+    request_metrics.serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        return to_representation(instance)
+    finally:
+        request_metrics.serializer_depth -= 1
+        if not request_metrics.serializer_depth:
+            request_metrics.serializer_time += time.perf_counter() - started
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match._func_path
+
+
+class MetricsMiddleware:
+    # Sync only on purpose: under ASGI Django then runs it in the request's own
+    # thread, and the async views' ORM calls (thread sensitive) come back to that
+    # thread and its wrapped connections, so their queries are counted too
+    sync_capable = True
+    async_capable = False
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics = RequestMetrics()
+        token = _current.set(request_metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(request_metrics))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        duration = time.perf_counter() - started
+
+        response_bytes = 0 if response.streaming else len(response.content)
+        registry.record(view_name(request), request.method, duration, request_metrics, response_bytes)
+        response['Server-Timing'] = (
+            f'total;dur={duration * 1000:.1f}, '
+            f'db;dur={request_metrics.db_time * 1000:.1f};desc="{request_metrics.queries} queries", '
+            f'serialize;dur={request_metrics.serializer_time * 1000:.1f}'
+        )
+        return response
@@ -0,0 +1,90 @@
+# Parses the legacy Transaction.products text ("Name (x2), Other (x1)") into OrderItem rows,
+# priced from what the order cost rather than from today's product prices
+
+import re
+from decimal import Decimal
+
+from django.db import migrations
+
+CENT = Decimal('0.01')
+ITEM_PATTERN = re.compile(r'\s*(?P<name>.+?)\s*\(x(?P<quantity>\d+)\)\s*(?:,|$)')
+
+
+def parse_products(text):
+    return [(match['name'], int(match['quantity'])) for match in ITEM_PATTERN.finditer(text or '')]
+
+
+def allocate(total, lines):
+    """
+    Unit prices for [(quantity, current product price or None)] whose line
+    totals add up to the order total. Current prices only set the
+    proportions: a product may cost more today than when the order was
+    placed. Lines are weighted by quantity alone when any of their products
+    is unknown. The rounding leftover goes to the last line whose quantity
+    divides it, which any single unit line does; failing that it stays off
+    by under a cent per unit.
+    """
+    if all(price for _, price in lines):
+        weights = [quantity * price for quantity, price in lines]
+    else:
+        weights = [quantity for quantity, _ in lines]
+    weight_total = sum(weights)
+    if not weight_total:
+        return [Decimal('0.00')] * len(lines)
+    prices = [
+        (total * weight / weight_total / quantity).quantize(CENT) if quantity else Decimal('0.00')
+        for weight, (quantity, _) in zip(weights, lines)
+    ]
+    leftover = total - sum(price * quantity for price, (quantity, _) in zip(prices, lines))
+    for i in reversed(range(len(lines))):
+        quantity = lines[i][0]
+        if quantity and int(leftover * 100) % quantity == 0:
+            prices[i] += leftover / quantity
+            break
+    return [price.quantize(CENT) for price in prices]
+
+
+def populate_order_items(apps, schema_editor):
+    Transaction = apps.get_model('core', 'Transaction')
+    Product = apps.get_model('core', 'Product')
+    OrderItem = apps.get_model('core', 'OrderItem')
+
+    products_by_name = {}
+    for product in Product.objects.order_by('id'):
+        products_by_name.setdefault(product.name, product)
+
+    items = []
+    for transaction in Transaction.objects.order_by('id').iterator(chunk_size=2000):
+        parsed = parse_products(transaction.products)
+        products = [products_by_name.get(name) for name, _ in parsed]
+        prices = allocate(
+            transaction.total_amount,
+            [(quantity, product and product.price) for (_, quantity), product in zip(parsed, products)],
+        ) if parsed else []
+        for (name, quantity), product, unit_price in zip(parsed, products, prices):
+            items.append(OrderItem(
+                transaction=transaction,
+                product=product,
+                product_name=name[:200],
+                unit_price=unit_price,
+                quantity=quantity,
+            ))
+        if len(items) >= 2000:
+            OrderItem.objects.bulk_create(items)
+            items = []
+    OrderItem.objects.bulk_create(items)
+
+
+def remove_order_items(apps, schema_editor):
+    apps.get_model('core', 'OrderItem').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_orderitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_order_items, remove_order_items),
+    ]
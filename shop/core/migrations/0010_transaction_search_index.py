@@ -0,0 +1,33 @@
+# Full text search index over Transaction name, email and tracking number (SQLite FTS5)
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE core_transaction_fts USING fts5("
+        "name, email, tracking_number, tokenize='unicode61', prefix='2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO core_transaction_fts (rowid, name, email, tracking_number) "
+        "SELECT id, name, email, tracking_number FROM core_transaction"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS core_transaction_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
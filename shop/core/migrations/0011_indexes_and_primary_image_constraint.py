@@ -0,0 +1,56 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def keep_newest_primary_image(apps, schema_editor):
+    # Older rows may have several primary images per product; keep the newest
+    ProductImage = apps.get_model('core', 'ProductImage')
+    seen = set()
+    duplicates = []
+    for image in ProductImage.objects.filter(is_primary=True).order_by('product_id', '-created_at', '-id'):
+        if image.product_id in seen:
+            duplicates.append(image.pk)
+        seen.add(image.product_id)
+    ProductImage.objects.filter(pk__in=duplicates).update(is_primary=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_transaction_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productimage',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='images', to='core.product'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category'], name='core_product_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productimage',
+            index=models.Index(fields=['product', '-is_primary', '-created_at'], name='core_prodimg_product_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['status', '-created_at'], name='core_txn_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['-created_at', '-id'], name='core_txn_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['email'], name='core_txn_email_idx'),
+        ),
+        migrations.RunPython(keep_newest_primary_image, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='productimage',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_primary', True)), fields=('product',), name='core_unique_primary_image'),
+        ),
+    ]
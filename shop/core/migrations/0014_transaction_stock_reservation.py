@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='reserved_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='stock_reserved',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:26
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_rollups(apps, schema_editor):
+    Transaction = apps.get_model('core', 'Transaction')
+    DailyOrderStats = apps.get_model('core', 'DailyOrderStats')
+    totals = (
+        Transaction.objects.annotate(day=TruncDate('created_at'))
+        .values('day', 'status')
+        .annotate(orders=Count('id'), revenue=Sum('total_amount'))
+        .order_by()
+    )
+    DailyOrderStats.objects.bulk_create((DailyOrderStats(**row) for row in totals.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_product_sku'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOrderStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('payment_uploaded', 'Payment Uploaded'), ('payment_confirmed', 'Payment Confirmed'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=100)),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['quantity'], name='core_product_quantity_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyorderstats',
+            constraint=models.UniqueConstraint(fields=('day', 'status'), name='core_unique_daily_order_stats'),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
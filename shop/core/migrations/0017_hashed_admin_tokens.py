@@ -0,0 +1,56 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:31
+
+from datetime import timedelta
+
+import core.models
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+
+def hash_existing_tokens(apps, schema_editor):
+    # Same keyed hash as core.tokens.hash_token, so existing tokens keep working;
+    # they get a fresh week rather than expiring on deploy
+    AdminToken = apps.get_model('core', 'AdminToken')
+    expires_at = timezone.now() + timedelta(days=7)
+    for admin_token in AdminToken.objects.all():
+        admin_token.token_hash = salted_hmac('core.AdminToken', admin_token.token, algorithm='sha256').hexdigest()
+        admin_token.prefix = admin_token.token[:8]
+        admin_token.expires_at = expires_at
+        admin_token.save(update_fields=['token_hash', 'prefix', 'expires_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_dailyorderstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='admintoken',
+            name='token_hash',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='admintoken',
+            name='prefix',
+            field=models.CharField(default='', editable=False, help_text='First characters of the token, to tell tokens apart', max_length=8),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='admintoken',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, default=core.models.default_token_expiry),
+        ),
+        migrations.RunPython(hash_existing_tokens, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='admintoken',
+            name='token',
+        ),
+        migrations.AlterField(
+            model_name='admintoken',
+            name='token_hash',
+            field=models.CharField(editable=False, max_length=64, unique=True),
+        ),
+    ]
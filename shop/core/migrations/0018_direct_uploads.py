@@ -0,0 +1,25 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:02
+
+import core.storage
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_hashed_admin_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='key',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='payment_proof',
+            field=models.FileField(blank=True, null=True, storage=core.storage.private_storage, upload_to='payment_proofs/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png', 'pdf'])]),
+        ),
+    ]
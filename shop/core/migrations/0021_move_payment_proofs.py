@@ -0,0 +1,54 @@
+# Moves payment proofs stored under MEDIA_ROOT, where DEBUG serves them unsigned,
+# to the private storage's own location
+
+import os
+import shutil
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import migrations
+
+
+def move(names, source, target):
+    for name in names:
+        if source.exists(name) and not target.exists(name):
+            os.makedirs(os.path.dirname(target.path(name)), exist_ok=True)
+            shutil.move(source.path(name), target.path(name))
+
+
+def local_storages():
+    """(MEDIA_ROOT, private storage), or None when the private storage is elsewhere"""
+    public = FileSystemStorage(location=settings.MEDIA_ROOT)
+    private = storages['private']
+    if not isinstance(private, FileSystemStorage) or os.path.abspath(private.location) == os.path.abspath(public.location):
+        return None
+    return public, private
+
+
+def payment_proofs(apps):
+    Transaction = apps.get_model('core', 'Transaction')
+    return Transaction.objects.exclude(payment_proof='').values_list('payment_proof', flat=True).distinct().iterator()
+
+
+def move_to_private(apps, schema_editor):
+    found = local_storages()
+    if found:
+        move(payment_proofs(apps), *found)
+
+
+def move_to_media_root(apps, schema_editor):
+    found = local_storages()
+    if found:
+        public, private = found
+        move(payment_proofs(apps), private, public)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_orderstatusevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_to_private, move_to_media_root),
+    ]
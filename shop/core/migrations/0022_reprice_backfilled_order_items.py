@@ -0,0 +1,41 @@
+# 0008 used to price backfilled items at the product's price on the day it ran, not what
+# the customer paid. Reprices the items of orders placed before 0008 was applied whose
+# lines don't add up to the order total; checkouts since then snapshot their own prices.
+
+from importlib import import_module
+
+from django.db import migrations
+from django.db.migrations.recorder import MigrationRecorder
+
+allocate = import_module('core.migrations.0008_populate_orderitems').allocate
+
+
+def reprice_order_items(apps, schema_editor):
+    Transaction = apps.get_model('core', 'Transaction')
+    OrderItem = apps.get_model('core', 'OrderItem')
+    backfill = MigrationRecorder(schema_editor.connection).migration_qs.filter(
+        app='core', name='0008_populate_orderitems',
+    ).first()
+    if backfill is None:
+        return
+
+    orders = Transaction.objects.filter(created_at__lte=backfill.applied).prefetch_related('items__product').order_by('id')
+    for order in orders.iterator(chunk_size=2000):
+        items = list(order.items.all())
+        if not items or sum(item.unit_price * item.quantity for item in items) == order.total_amount:
+            continue
+        prices = allocate(order.total_amount, [(item.quantity, item.product and item.product.price) for item in items])
+        for item, unit_price in zip(items, prices):
+            item.unit_price = unit_price
+        OrderItem.objects.bulk_update(items, ['unit_price'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_move_payment_proofs'),
+    ]
+
+    operations = [
+        migrations.RunPython(reprice_order_items, migrations.RunPython.noop),
+    ]
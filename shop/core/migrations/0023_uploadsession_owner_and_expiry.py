@@ -0,0 +1,36 @@
+# Upload sessions are tied to the token returned when they start and expire on their own.
+# Sessions already in progress have no token and can no longer be resumed; purge_uploads
+# discards them once they expire, 24 hours after they started as before.
+
+from datetime import timedelta
+
+import core.models
+from django.db import migrations, models
+from django.db.models import F
+
+
+def expire_after_a_day(apps, schema_editor):
+    UploadSession = apps.get_model('core', 'UploadSession')
+    UploadSession.objects.update(expires_at=F('created_at') + timedelta(hours=24))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_reprice_backfilled_order_items'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='token_hash',
+            field=models.CharField(default='', editable=False, max_length=64),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, default=core.models.default_upload_expiry),
+        ),
+        migrations.RunPython(expire_after_a_day, migrations.RunPython.noop),
+    ]
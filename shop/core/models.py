@@ -1,10 +1,12 @@
 # core/models.py
 
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.utils import timezone
+from datetime import timedelta
 import uuid
 from django.core.validators import FileExtensionValidator
 from django.core.exceptions import ValidationError
+from .storage import private_storage
 
 def validate_image_size(file):
     """Validate image file size (max 5MB)"""
@@ -13,17 +15,47 @@ def validate_image_size(file):
         raise ValidationError(f'Image size cannot exceed 5MB. Current size: {file.size/(1024*1024):.2f}MB')
 
 class Product(models.Model):
+    # Optional; bulk imports match existing products on it
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=200)
     category = models.CharField(max_length=100)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category'], name='core_product_category_idx'),
+            models.Index(fields=['quantity'], name='core_product_quantity_idx'),
+        ]
     
     def __str__(self):
         return self.name
 
+class ProductImageQuerySet(models.QuerySet):
+    def make_primary(self, product_id, image_id):
+        """
+        Make image_id the product's only primary image; returns 0 if it is not
+        one of the product's images. Clearing the old primary first keeps the
+        unique constraint satisfied after every row, which a single UPDATE
+        would not guarantee. Run inside a transaction.
+        """
+        self.filter(product_id=product_id, is_primary=True).exclude(pk=image_id).update(is_primary=False)
+        return self.filter(product_id=product_id, pk=image_id).update(is_primary=True)
+
+    def promote_if_none(self, product_id, image_id=None):
+        """
+        Make image_id (default: the product's newest image) primary in one
+        conditional UPDATE, unless the product already has a primary image
+        """
+        if image_id is None:
+            image_id = models.Subquery(self.filter(product_id=product_id).order_by('-created_at', '-pk').values('pk')[:1])
+        has_primary = self.filter(product_id=product_id, is_primary=True)
+        return self.filter(product_id=product_id, pk=image_id).exclude(models.Exists(has_primary)).update(is_primary=True)
+
 class ProductImage(models.Model):
-    product = models.ForeignKey(Product, related_name='images', on_delete=models.CASCADE)
+    # Indexed by core_prodimg_product_order_idx below
+    product = models.ForeignKey(Product, related_name='images', on_delete=models.CASCADE, db_index=False)
     image = models.ImageField(
         upload_to='products/images/',
         validators=[
@@ -33,18 +65,44 @@ class ProductImage(models.Model):
     )
     is_primary = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Resized copies made by core.images, e.g. {"thumb": {"webp": path, "jpeg": path}}
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    objects = ProductImageQuerySet.as_manager()
     
     class Meta:
         ordering = ['-is_primary', '-created_at']
+        indexes = [
+            # Serves the per-product image prefetch in its default ordering
+            models.Index(fields=['product', '-is_primary', '-created_at'], name='core_prodimg_product_order_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product'],
+                condition=models.Q(is_primary=True),
+                name='core_unique_primary_image',
+            ),
+        ]
     
     def save(self, *args, **kwargs):
-        # Ensure only one primary image per product
-        if self.is_primary:
-            ProductImage.objects.filter(product=self.product, is_primary=True).update(is_primary=False)
-        # If this is the first image, make it primary
-        elif not ProductImage.objects.filter(product=self.product).exists():
-            self.is_primary = True
-        super().save(*args, **kwargs)
+        # Single saves (admin, forms) keep the one-primary rule here; batch
+        # changes go through core.gallery, which never calls save()
+        adding = self._state.adding
+        with transaction.atomic():
+            # Ensure only one primary image per product
+            if self.is_primary:
+                ProductImage.objects.filter(product_id=self.product_id, is_primary=True).exclude(pk=self.pk).update(is_primary=False)
+            super().save(*args, **kwargs)
+            # A new image becomes primary if the product has none yet. The
+            # conditional UPDATE plus the unique constraint keep this race free.
+            if adding and not self.is_primary:
+                try:
+                    with transaction.atomic():
+                        promoted = ProductImage.objects.promote_if_none(self.product_id, self.pk)
+                except IntegrityError:
+                    # A concurrent upload claimed primary first
+                    promoted = 0
+                self.is_primary = bool(promoted)
 
 class Transaction(models.Model):
     STATUS_CHOICES = [
@@ -56,6 +114,16 @@ class Transaction(models.Model):
         ('delivered', 'Delivered'),
         ('cancelled', 'Cancelled'),
     ]
+    # The statuses each status may change to; delivered and cancelled orders are final (see core.transitions)
+    STATUS_TRANSITIONS = {
+        'pending': ('payment_uploaded', 'payment_confirmed', 'cancelled'),
+        'payment_uploaded': ('pending', 'payment_confirmed', 'cancelled'),
+        'payment_confirmed': ('processing', 'shipped', 'cancelled'),
+        'processing': ('shipped', 'cancelled'),
+        'shipped': ('delivered',),
+        'delivered': (),
+        'cancelled': (),
+    }
 
     tracking_number = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     name = models.CharField(max_length=200)
@@ -68,14 +136,199 @@ class Transaction(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     payment_proof = models.FileField(
         upload_to='payment_proofs/',
+        storage=private_storage,
         null=True,
         blank=True,
         validators=[FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png', 'pdf'])]
     )
+    # Set while the order's items are held out of Product.quantity (see core.inventory)
+    stock_reserved = models.BooleanField(default=False, editable=False)
+    reserved_until = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-created_at'], name='core_txn_status_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='core_txn_created_idx'),
+            models.Index(fields=['email'], name='core_txn_email_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.tracking_number}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so core.signals can move a changed order between dashboard rollups,
+        # record its status change and skip reindexing it for search when unchanged
+        instance._loaded_rollup_key = instance.rollup_key()
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_search_key = instance.search_key()
+        return instance
+
+    @classmethod
+    def status_change_error(cls, old_status, new_status):
+        """Why an order can't go from old_status to new_status, or None if it can"""
+        if old_status == new_status or new_status in cls.STATUS_TRANSITIONS.get(old_status, ()):
+            return None
+        return f'Cannot change status from {old_status} to {new_status}'
+
+    def clean(self):
+        old_status = getattr(self, '_loaded_status', None)
+        error = old_status and self.status_change_error(old_status, self.status)
+        if error:
+            raise ValidationError({'status': error})
+
+    def search_key(self):
+        """The searchable fields; deferred ones are None, as they can't have changed"""
+        return self.__dict__.get('name'), self.__dict__.get('email')
+
+    def rollup_key(self):
+        """(day, status, total_amount), or None if any of them was deferred"""
+        values = self.__dict__
+        if not {'created_at', 'status', 'total_amount'} <= values.keys() or values['created_at'] is None:
+            return None
+        return (timezone.localdate(values['created_at']), values['status'], values['total_amount'])
+
+class OrderItemQuerySet(models.QuerySet):
+    def sales_by_product(self):
+        """Units sold and revenue per product, best sellers first"""
+        return (
+            self.filter(product__isnull=False)
+            .values('product', 'product__name')
+            .annotate(
+                quantity_sold=models.Sum('quantity'),
+                revenue=models.Sum(models.F('unit_price') * models.F('quantity')),
+            )
+            .order_by('-quantity_sold')
+        )
+
+class OrderItem(models.Model):
+    transaction = models.ForeignKey(Transaction, related_name='items', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='order_items', null=True, blank=True, on_delete=models.SET_NULL)
+    # Snapshots taken when the order is placed, so later product edits don't rewrite history
+    product_name = models.CharField(max_length=200)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField(default=1)
+
+    objects = OrderItemQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['id']
+
+    @property
+    def subtotal(self):
+        return self.unit_price * self.quantity
+
+    def __str__(self):
+        return f"{self.product_name} (x{self.quantity})"
+
+class OutgoingEmail(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to = models.EmailField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['next_attempt_at', 'id']
+        indexes = [
+            # The worker only ever looks for due pending messages
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to}"
+
+class DailyOrderStats(models.Model):
+    """Orders and revenue per day and status, kept up to date by core.rollups for the dashboard"""
+    day = models.DateField()
+    status = models.CharField(max_length=100, choices=Transaction.STATUS_CHOICES)
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status'], name='core_unique_daily_order_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.status}: {self.orders}"
+
+class OrderStatusEvent(models.Model):
+    """One status change of an order; rows are only ever added (see core.transitions)"""
+    # Indexed by core_status_event_txn_idx below
+    transaction = models.ForeignKey(Transaction, related_name='status_events', on_delete=models.CASCADE, db_index=False)
+    from_status = models.CharField(max_length=100, choices=Transaction.STATUS_CHOICES)
+    to_status = models.CharField(max_length=100, choices=Transaction.STATUS_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['transaction', 'created_at'], name='core_status_event_txn_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Order status events cannot be changed')
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.transaction_id}: {self.from_status} -> {self.to_status}"
+
+class StoredFile(models.Model):
+    """A file stored once per content (see core.dedup); refs counts the file fields that point at it"""
+    storage = models.CharField(max_length=50, help_text='Key in settings.STORAGES')
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    refs = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['storage', 'name'], name='core_unique_stored_file'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.refs} references)"
+
+def default_upload_expiry():
+    return timezone.now() + timedelta(hours=24)
+
+class UploadSession(models.Model):
+    PURPOSE_CHOICES = [
+        ('payment_proof', 'Payment Proof'),
+        ('product_image', 'Product Image'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    # Storage name of a direct upload, which the client sends straight to storage; empty for chunked uploads
+    key = models.CharField(max_length=255, blank=True)
+    transaction = models.ForeignKey(Transaction, null=True, blank=True, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, null=True, blank=True, on_delete=models.CASCADE)
+    # Keyed hash of the token handed to whoever started the upload (core.uploads.hash_upload_token)
+    token_hash = models.CharField(max_length=64, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=default_upload_expiry, db_index=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
 class BankDetails(models.Model):
     bank_name = models.CharField(max_length=255)
     account_name = models.CharField(max_length=255)
@@ -84,12 +337,21 @@ class BankDetails(models.Model):
     def __str__(self):
         return self.account_name
 
+def default_token_expiry():
+    return timezone.now() + timedelta(days=7)
+
 class AdminToken(models.Model):
-    token = models.CharField(max_length=255, unique=True)
+    # Only a keyed hash is stored (core.tokens.hash_token); the token is shown once on creation
+    token_hash = models.CharField(max_length=64, unique=True, editable=False)
+    prefix = models.CharField(max_length=8, editable=False, help_text='First characters of the token, to tell tokens apart')
     created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=default_token_expiry, db_index=True)
 
     def is_valid(self):
-        return (timezone.now() - self.created_at).days < 7
+        return self.expires_at > timezone.now()
+
+    def __str__(self):
+        return f"{self.prefix}…"
 
 class SiteSettings(models.Model):
     site_title = models.CharField(max_length=200, default="My E-commerce Site")
@@ -0,0 +1,94 @@
+# core/outbox.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection as db_connection
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 60  # seconds, doubled after every failed attempt
+LEASE_DURATION = timedelta(minutes=5)
+
+
+def queue_email(subject, body, to, from_email=None):
+    """
+    Store an email in the outbox. It is written in the caller's database
+    transaction, so it is only sent if that transaction commits.
+    """
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=body,
+        to=to,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+    )
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=RETRY_BASE_DELAY * 2 ** (attempts - 1))
+
+
+def claim_batch(batch_size):
+    """
+    Lease a batch of due emails by pushing their next attempt into the
+    future, so no database transaction is held open while talking to SMTP.
+    """
+    now = timezone.now()
+    with db_transaction.atomic():
+        queryset = OutgoingEmail.objects.filter(status='pending', next_attempt_at__lte=now)
+        if db_connection.features.has_select_for_update_skip_locked:
+            # Lets several workers run side by side without sending twice
+            queryset = queryset.select_for_update(skip_locked=True)
+        ids = list(queryset.values_list('id', flat=True)[:batch_size])
+        OutgoingEmail.objects.filter(id__in=ids).update(next_attempt_at=now + LEASE_DURATION)
+    return list(OutgoingEmail.objects.filter(id__in=ids))
+
+
+def send_queued_emails(batch_size=100):
+    """
+    Send one batch of due emails over a single mail connection.
+    Returns a (sent, failed) tuple of counts.
+    """
+    emails = claim_batch(batch_size)
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        connection, open_error = None, e
+
+    now = timezone.now()
+    for email in emails:
+        email.attempts += 1
+        try:
+            if connection is None:
+                raise open_error
+            message = EmailMessage(email.subject, email.body, email.from_email, [email.to], connection=connection)
+            message.send()
+        except Exception as e:
+            email.last_error = str(e)
+            if email.attempts >= MAX_ATTEMPTS:
+                email.status = 'failed'
+            else:
+                email.next_attempt_at = now + retry_delay(email.attempts)
+            failed += 1
+        else:
+            email.status = 'sent'
+            email.sent_at = now
+            email.last_error = ''
+            sent += 1
+
+    if connection is not None:
+        connection.close()
+
+    OutgoingEmail.objects.bulk_update(
+        emails, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+    )
+    return sent, failed
@@ -0,0 +1,62 @@
+# core/pagination.py
+
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class OptionalCursorPagination(CursorPagination):
+    """
+    Keyset pagination that only kicks in when the client asks for it with
+    ?cursor= or ?page_size=, so existing callers still get a plain list.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class ProductCursorPagination(OptionalCursorPagination):
+    ordering = ('-id',)
+
+
+class TransactionCursorPagination(OptionalCursorPagination):
+    ordering = ('-created_at', '-id')
+    search_query_param = 'search'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ranked = bool(request.query_params.get(self.search_query_param))
+        if not self.ranked:
+            return super().paginate_queryset(queryset, request, view)
+        # Search results are ranked and capped (core.search), so they are paged
+        # by position in that order rather than re-sorted by created_at
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        self.offset = self.cursor.offset if self.cursor else 0
+        results = list(queryset[self.offset:self.offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        self.has_next = len(results) > self.page_size
+        self.has_previous = self.offset > 0
+        return self.page
+
+    def get_next_link(self):
+        if self.ranked:
+            if not self.has_next:
+                return None
+            return self.encode_cursor(Cursor(offset=self.offset + self.page_size, reverse=False, position=None))
+        return super().get_next_link()
+
+    def get_previous_link(self):
+        if self.ranked:
+            if not self.has_previous:
+                return None
+            return self.encode_cursor(Cursor(offset=max(0, self.offset - self.page_size), reverse=False, position=None))
+        return super().get_previous_link()
@@ -0,0 +1,165 @@
+# core/ratelimit.py
+"""
+Abuse protection for the public order endpoints (track order, payment
+proof uploads), which anyone can call with a guessed tracking number.
+
+Requests are rate limited per endpoint and client IP with token buckets
+kept in a Django cache (settings.RATE_LIMIT_CACHE), so all workers share
+them. A rate of 'N/period' lets a client burst N requests and then refills
+the bucket at N per period. Rejected requests get a 429 before the view
+runs and cost no database query.
+
+Tracking numbers that are not UUIDs are rejected without a lookup, and
+unknown ones are remembered for UNKNOWN_TRACKING_TTL seconds. Tracking
+numbers are random UUIDs assigned by the server, so a remembered miss
+never turns into a real order.
+"""
+
+import functools
+import math
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.http import JsonResponse
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+UNKNOWN_TRACKING_TTL = 300
+
+
+def parse_rate(rate):
+    """'30/min' -> (30, 60); None means no limit"""
+    if rate is None:
+        return None
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def client_ip(request):
+    # X-Forwarded-For is only trusted for as many hops as there are proxies in
+    # front of the app; otherwise a client could pick a fresh address per request
+    proxies = settings.RATE_LIMIT_PROXIES
+    forwarded = [addr.strip() for addr in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if addr.strip()]
+    if proxies and forwarded:
+        return forwarded[-min(proxies, len(forwarded))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def take(state, now, capacity, period):
+    """
+    Take one token from a bucket. Return (new state, wait) where wait is
+    None if the request is allowed, else the seconds until a token is free.
+    """
+    tokens, updated = state or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * capacity / period)
+    if tokens >= 1:
+        return (tokens - 1, now), None
+    return None, (1 - tokens) * period / capacity
+
+
+class RateLimit:
+    """
+    Buckets for one scope of settings.RATE_LIMITS. A client IP listed in
+    settings.RATE_LIMIT_CLIENTS can have its own rate for the scope, or
+    None to be exempt.
+
+    The read and write of a bucket are not atomic, so concurrent requests
+    from one client can overshoot by a request or so per worker.
+    """
+    def __init__(self, scope):
+        self.scope = scope
+
+    def rate(self, ip):
+        overrides = settings.RATE_LIMIT_CLIENTS.get(ip, {})
+        return parse_rate(overrides[self.scope] if self.scope in overrides else settings.RATE_LIMITS.get(self.scope))
+
+    def prepare(self, request):
+        ip = client_ip(request)
+        return f'core:ratelimit:{self.scope}:{ip}', self.rate(ip)
+
+    def check(self, request):
+        """Return None if the request may go ahead, else the seconds to wait"""
+        key, rate = self.prepare(request)
+        if rate is None:
+            return None
+        store = caches[settings.RATE_LIMIT_CACHE]
+        state, wait = take(store.get(key), time.time(), *rate)
+        if state is not None:
+            store.set(key, state, rate[1])
+        return wait
+
+    async def acheck(self, request):
+        key, rate = self.prepare(request)
+        if rate is None:
+            return None
+        store = caches[settings.RATE_LIMIT_CACHE]
+        state, wait = take(await store.aget(key), time.time(), *rate)
+        if state is not None:
+            await store.aset(key, state, rate[1])
+        return wait
+
+
+def too_many_requests(wait):
+    return JsonResponse(
+        {'error': 'Too many requests, please try again later'},
+        status=429,
+        headers={'Retry-After': str(math.ceil(wait))},
+    )
+
+
+def rate_limit(scope):
+    """
+    Rate limit a sync or async view. Put it above @api_view so rejected
+    requests skip authentication and body parsing as well.
+    """
+    limit = RateLimit(scope)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                wait = await limit.acheck(request)
+                if wait is not None:
+                    return too_many_requests(wait)
+                return await view(request, *args, **kwargs)
+        else:
+            @functools.wraps(view)
+            def wrapper(request, *args, **kwargs):
+                wait = limit.check(request)
+                if wait is not None:
+                    return too_many_requests(wait)
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def unknown_key(tracking_number):
+    return f'core:unknown-tracking:{tracking_number}'
+
+
+def parse_tracking_number(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def unknown_tracking_number(value):
+    """True if value is not a UUID or was recently looked up and not found"""
+    tracking_number = parse_tracking_number(value)
+    return tracking_number is None or cache.get(unknown_key(tracking_number)) is not None
+
+
+async def aunknown_tracking_number(value):
+    tracking_number = parse_tracking_number(value)
+    return tracking_number is None or await cache.aget(unknown_key(tracking_number)) is not None
+
+
+def remember_unknown_tracking_number(value):
+    cache.set(unknown_key(parse_tracking_number(value)), True, UNKNOWN_TRACKING_TTL)
+
+
+async def aremember_unknown_tracking_number(value):
+    await cache.aset(unknown_key(parse_tracking_number(value)), True, UNKNOWN_TRACKING_TTL)
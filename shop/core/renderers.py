@@ -0,0 +1,30 @@
+# core/renderers.py
+
+from rest_framework import renderers
+
+try:
+    import orjson
+except ImportError:  # optional; DRF's stdlib encoder is used without it
+    orjson = None
+
+# Datetimes go through DRF's encoder so they are formatted exactly as before
+ORJSON_OPTIONS = orjson and orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """
+    DRF's JSONRenderer, encoding with orjson when it is installed. The output
+    is the same compact JSON; indented responses still go through DRF.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. integers wider than 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped by DRF as well, for JavaScript clients
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,157 @@
+# core/rollups.py
+"""
+Daily order and revenue rollups behind the admin dashboard.
+
+DailyOrderStats holds one row per (day, status). Every order save moves
+the order between rows with F() increments, so the dashboard reads a few
+rows per day instead of scanning orders. rebuild_rollups() recomputes
+everything from the orders table, e.g. after bulk imports.
+"""
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyOrderStats, Product, Transaction
+
+# Orders whose money has been received; they count towards revenue
+PAID_STATUSES = ('payment_confirmed', 'processing', 'shipped', 'delivered')
+DEFAULT_DAYS = 30
+MAX_DAYS = 366
+LOW_STOCK_LIMIT = 50
+
+
+def apply_delta(day, status, orders, revenue):
+    updated = DailyOrderStats.objects.filter(day=day, status=status).update(
+        orders=F('orders') + orders, revenue=F('revenue') + revenue
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            DailyOrderStats.objects.create(day=day, status=status, orders=orders, revenue=revenue)
+    except IntegrityError:
+        # Another writer created the row first
+        DailyOrderStats.objects.filter(day=day, status=status).update(
+            orders=F('orders') + orders, revenue=F('revenue') + revenue
+        )
+
+
+def add_order(key, sign=1):
+    day, status, amount = key
+    apply_delta(day, status, sign, sign * Decimal(str(amount)))
+
+
+def recount_day(day):
+    """Recompute one day's rows from the orders; used when an order's previous state is unknown"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    totals = (
+        Transaction.objects.filter(created_at__gte=start, created_at__lt=start + timedelta(days=1))
+        .values('status')
+        .annotate(orders=Count('id'), revenue=Sum('total_amount'))
+    )
+    with transaction.atomic():
+        DailyOrderStats.objects.filter(day=day).delete()
+        DailyOrderStats.objects.bulk_create(
+            DailyOrderStats(day=day, status=row['status'], orders=row['orders'], revenue=row['revenue'])
+            for row in totals
+        )
+
+
+def order_saved(order, created):
+    new_key = order.rollup_key()
+    old_key = None if created else getattr(order, '_loaded_rollup_key', None)
+    if new_key is None or (old_key is None and not created):
+        recount_day(timezone.localdate(order.created_at))
+    elif old_key != new_key:
+        with transaction.atomic():
+            if old_key is not None:
+                add_order(old_key, -1)
+            add_order(new_key)
+    order._loaded_rollup_key = order.rollup_key()
+
+
+def order_deleted(order):
+    key = getattr(order, '_loaded_rollup_key', None) or order.rollup_key()
+    if key is not None:
+        add_order(key, -1)
+
+
+def status_changed(order, old_status, new_status):
+    """For status updates made with QuerySet.update(), which sends no signals"""
+    day, _, amount = order.rollup_key()
+    with transaction.atomic():
+        add_order((day, old_status, amount), -1)
+        add_order((day, new_status, amount))
+
+
+def statuses_changed(orders, new_status):
+    """
+    status_changed() for many orders, given as dicts with created_at, status
+    and total_amount: one update per (day, status) rather than per order
+    """
+    deltas = {}
+    for order in orders:
+        day = timezone.localdate(order['created_at'])
+        for status, sign in ((order['status'], -1), (new_status, 1)):
+            orders_delta, revenue_delta = deltas.get((day, status), (0, Decimal('0')))
+            deltas[(day, status)] = (orders_delta + sign, revenue_delta + sign * order['total_amount'])
+    with transaction.atomic():
+        for (day, status), (orders_delta, revenue_delta) in sorted(deltas.items()):
+            apply_delta(day, status, orders_delta, revenue_delta)
+
+
+def rebuild_rollups():
+    totals = (
+        Transaction.objects.annotate(day=TruncDate('created_at'))
+        .values('day', 'status')
+        .annotate(orders=Count('id'), revenue=Sum('total_amount'))
+        .order_by()
+    )
+    with transaction.atomic():
+        DailyOrderStats.objects.all().delete()
+        DailyOrderStats.objects.bulk_create(
+            (DailyOrderStats(**row) for row in totals.iterator()), batch_size=1000
+        )
+    return DailyOrderStats.objects.count()
+
+
+def dashboard(start, end, low_stock_threshold=None):
+    """Aggregates for the days start..end inclusive; reads O(days x statuses) rollup rows"""
+    if low_stock_threshold is None:
+        low_stock_threshold = getattr(settings, 'LOW_STOCK_THRESHOLD', 5)
+
+    per_day = {start + timedelta(days=n): {'orders': 0, 'revenue': Decimal('0.00')} for n in range((end - start).days + 1)}
+    by_status = {status: 0 for status, _ in Transaction.STATUS_CHOICES}
+    for row in DailyOrderStats.objects.filter(day__gte=start, day__lte=end).values('day', 'status', 'orders', 'revenue'):
+        by_status[row['status']] = by_status.get(row['status'], 0) + row['orders']
+        if row['status'] in PAID_STATUSES:
+            per_day[row['day']]['orders'] += row['orders']
+            per_day[row['day']]['revenue'] += row['revenue']
+
+    paid_orders = sum(day['orders'] for day in per_day.values())
+    revenue = sum((day['revenue'] for day in per_day.values()), Decimal('0.00'))
+    average = (revenue / paid_orders).quantize(Decimal('0.01')) if paid_orders else Decimal('0.00')
+    low_stock = Product.objects.filter(quantity__lte=low_stock_threshold).order_by('quantity', 'id').values(
+        'id', 'sku', 'name', 'quantity'
+    )[:LOW_STOCK_LIMIT]
+
+    return {
+        'start': start,
+        'end': end,
+        'revenue': str(revenue),
+        'paid_orders': paid_orders,
+        'average_order_value': str(average),
+        'orders_by_status': by_status,
+        'revenue_per_day': [
+            {'day': day, 'orders': totals['orders'], 'revenue': str(totals['revenue'])}
+            for day, totals in per_day.items()
+        ],
+        'low_stock_threshold': low_stock_threshold,
+        'low_stock': list(low_stock),
+    }
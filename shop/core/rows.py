@@ -0,0 +1,213 @@
+# core/rows.py
+"""
+Read-only fast path for the product and transaction list endpoints.
+
+Rows come straight from .values(), nested rows (images, order items) from
+one extra query, and each column is formatted the way the matching DRF
+field would. No model instances are built and no serializer fields run,
+but the output is the same as ProductSerializer / TransactionSerializer,
+field projection included. Detail views and writes keep the serializers.
+"""
+
+from collections import defaultdict
+from functools import cached_property
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import models
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+from rest_framework.response import Response
+
+from .models import OrderItem, Product, ProductImage, Transaction
+from .metrics import timed_representation
+from .serializers import OrderItemSerializer, ProductImageSerializer, ProductSerializer, TransactionSerializer, requested_fields
+
+# Model columns behind the nested serializers; variants and subtotal are computed
+IMAGE_COLUMNS = [name for name in ProductImageSerializer.Meta.fields if name != 'variants']
+ORDER_ITEM_COLUMNS = [name for name in OrderItemSerializer.Meta.fields if name != 'subtotal']
+
+
+def format_decimal(value):
+    return None if value is None else f'{value:f}'
+
+
+def format_uuid(value):
+    return None if value is None else str(value)
+
+
+def datetime_formatter():
+    # Same output as DRF's DateTimeField: current timezone, ISO 8601, 'Z' for UTC
+    tz = timezone.get_current_timezone()
+
+    def format_datetime(value):
+        if not value:
+            return None
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return format_datetime
+
+
+def storage_url(name, storage=default_storage):
+    # FileSystemStorage.url() is urljoin(base_url, quoted name), and the urljoin
+    # is half the cost of a product list. Plain relative names join by concatenation.
+    if isinstance(storage, FileSystemStorage) and not getattr(storage, 'querystring_auth', False):
+        path = filepath_to_uri(name).lstrip('/')
+        if not {'', '.', '..'} & set(path.split('/')):
+            return storage.base_url + path
+    return storage.url(name)
+
+
+def url_builder(request):
+    """(storage path, storage) -> URL, absolute when there is a request, like DRF's FileField"""
+    if request is None:
+        return storage_url
+    base = request.build_absolute_uri('/')[:-1]
+
+    def build_url(path, storage=default_storage):
+        url = storage_url(path, storage)
+        return base + url if url.startswith('/') else url
+    return build_url
+
+
+def column_formatters(model, names, request):
+    """{field name: formatter} for the concrete model fields among names"""
+    format_datetime = datetime_formatter()
+    build_url = url_builder(request)
+    formatters = {}
+    for name in names:
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if not field.concrete:
+            continue
+        if isinstance(field, models.DecimalField):
+            formatters[name] = format_decimal
+        elif isinstance(field, models.DateTimeField):
+            formatters[name] = format_datetime
+        elif isinstance(field, models.DateField):
+            formatters[name] = lambda value: value and value.isoformat()
+        elif isinstance(field, models.UUIDField):
+            formatters[name] = format_uuid
+        elif isinstance(field, models.FileField):
+            formatters[name] = lambda value, storage=field.storage: build_url(value, storage) if value else None
+        else:
+            formatters[name] = None
+    return formatters
+
+
+def format_row(row, formatters):
+    return {
+        name: formatter(row[name]) if formatter else row[name]
+        for name, formatter in formatters.items()
+    }
+
+
+class Rows:
+    """
+    Builds list responses for one model. `nested` maps output fields that
+    are filled in by load_nested() rather than read from a column.
+    """
+    model = None
+    serializer_class = None
+    nested = ()
+    # Columns always read, e.g. for cursor pagination
+    required = ('id',)
+
+    @cached_property
+    def field_names(self):
+        return list(self.serializer_class().fields)
+
+    def selected(self, request):
+        fields = requested_fields(request, self.field_names)
+        return [name for name in self.field_names if not fields or name in fields]
+
+    def values(self, queryset, request):
+        selected = self.selected(request)
+        columns = list(column_formatters(self.model, selected, None))
+        columns += [name for name in self.required if name not in columns]
+        return queryset.prefetch_related(None).values(*columns)
+
+    def build(self, rows, request):
+        selected = self.selected(request)
+        formatters = column_formatters(self.model, selected, request)
+        nested = self.load_nested([row['id'] for row in rows], selected, request) if set(selected) & set(self.nested) else {}
+        data = []
+        for row in rows:
+            item = format_row(row, formatters)
+            for name in self.nested:
+                if name in selected:
+                    item[name] = nested.get(name, {}).get(row['id'], self.nested[name])
+            # Keep the serializer's key order
+            data.append({name: item[name] for name in selected})
+        return data
+
+    def load_nested(self, ids, selected, request):
+        """{nested field: {row id: value}}; rows missing here get the default from `nested`"""
+        return {}
+
+
+class ProductRows(Rows):
+    model = Product
+    serializer_class = ProductSerializer
+    nested = {'images': [], 'primary_image': None}
+
+    def load_nested(self, ids, selected, request):
+        images = ProductImage.objects.filter(product_id__in=ids).values('product_id', 'variants', *IMAGE_COLUMNS)
+        by_product = defaultdict(list)
+        primary = {}
+        formatters = column_formatters(ProductImage, IMAGE_COLUMNS, request)
+        # ProductSerializer.get_primary_image has no request, so those URLs stay relative
+        primary_formatters = column_formatters(ProductImage, IMAGE_COLUMNS, None)
+        variant_url = url_builder(request)
+        primary_variant_url = url_builder(None)
+        for image in images:
+            if 'images' in selected:
+                by_product[image['product_id']].append(format_image(image, formatters, variant_url))
+            if image['is_primary'] and 'primary_image' in selected:
+                primary[image['product_id']] = format_image(image, primary_formatters, primary_variant_url)
+        return {'images': by_product, 'primary_image': primary}
+
+
+def format_image(image, formatters, build_url):
+    data = format_row(image, formatters)
+    data['variants'] = {
+        name: {extension: build_url(path) for extension, path in formats.items()}
+        for name, formats in image['variants'].items()
+    }
+    return data
+
+
+class TransactionRows(Rows):
+    model = Transaction
+    serializer_class = TransactionSerializer
+    nested = {'items': []}
+    required = ('id', 'created_at')
+
+    def load_nested(self, ids, selected, request):
+        formatters = column_formatters(OrderItem, ORDER_ITEM_COLUMNS, request)
+        items = defaultdict(list)
+        for item in OrderItem.objects.filter(transaction_id__in=ids).values('transaction_id', *ORDER_ITEM_COLUMNS):
+            data = format_row(item, formatters)
+            data['subtotal'] = format_decimal(item['unit_price'] * item['quantity'])
+            items[item['transaction_id']].append(data)
+        return {'items': items}
+
+
+product_rows = ProductRows()
+transaction_rows = TransactionRows()
+
+
+class RowListMixin:
+    """ModelViewSet.list() through a Rows builder instead of the serializer"""
+    rows = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.rows.values(self.filter_queryset(self.get_queryset()), request)
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset) if page is None else page
+        data = timed_representation(lambda rows: self.rows.build(rows, request), rows)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
@@ -0,0 +1,89 @@
+# core/search.py
+
+import re
+import uuid
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = 'core_transaction_fts'
+# Admin search is for finding a handful of orders, not for listing them all
+SEARCH_RESULT_LIMIT = 200
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def search_enabled(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def build_match_query(term):
+    """Turn free text into an FTS5 query where every word is a prefix match"""
+    return ' '.join(f'"{token}"*' for token in TOKEN_PATTERN.findall(term.lower()))
+
+
+def index_transaction(transaction, using='default'):
+    if not search_enabled(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [transaction.pk])
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name, email, tracking_number) VALUES (%s, %s, %s, %s)',
+            [transaction.pk, transaction.name, transaction.email, uuid.UUID(str(transaction.tracking_number)).hex],
+        )
+
+
+def unindex_transaction(transaction, using='default'):
+    if not search_enabled(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [transaction.pk])
+
+
+def rebuild_index(using='default'):
+    if not search_enabled(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        # SQLite stores UUIDs as 32 hex chars, which is what we index
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name, email, tracking_number) '
+            f'SELECT id, name, email, tracking_number FROM core_transaction'
+        )
+
+
+def search_transactions(queryset, term, limit=SEARCH_RESULT_LIMIT):
+    """
+    Filter a Transaction queryset by name, email or tracking number, best
+    matches first. A full tracking number is an exact, indexed lookup.
+    Words are prefix matched and every match is ranked with bm25.
+    """
+    term = term.strip()
+    try:
+        return queryset.filter(tracking_number=uuid.UUID(term))
+    except ValueError:
+        pass
+
+    if not search_enabled(queryset.db):
+        return queryset.filter(Q(name__icontains=term) | Q(email__icontains=term)).order_by('-created_at', '-id')
+
+    match = build_match_query(term)
+    if not match:
+        return queryset.none()
+    with connections[queryset.db].cursor() as cursor:
+        # Newest first among equally good matches
+        cursor.execute(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s ORDER BY rank, rowid DESC LIMIT %s',
+            [match, limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return queryset.none()
+    # A raw CASE is much cheaper to build than an ORM Case() with hundreds of When()s
+    table = queryset.model._meta.db_table
+    ranking = RawSQL(
+        f'CASE "{table}"."id" ' + 'WHEN %s THEN %s ' * len(ids) + 'END',
+        [value for position, pk in enumerate(ids) for value in (pk, position)],
+    )
+    return queryset.filter(pk__in=ids).order_by(ranking)
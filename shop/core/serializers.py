@@ -1,38 +1,193 @@
 # core/serializers.py
 
+from functools import cached_property
+
+from django.core.files.storage import default_storage
+from django.db import transaction as db_transaction
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Product, ProductImage, Transaction, BankDetails, SiteSettings
+from .models import Product, ProductImage, Transaction, OrderItem, OrderStatusEvent, BankDetails, SiteSettings
+from .inventory import OutOfStock, release_stock, reservation_timeout, reserve_stock
+from .metrics import timed_representation
+
+class FieldsProjectionMixin:
+    """
+    Limits the serialized fields to a comma separated ?fields= list taken from
+    the request, e.g. ?fields=id,name,price. Unknown names are ignored.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = requested_fields(self.context.get('request'), self.fields)
+        if requested:
+            for field_name in set(self.fields) - requested:
+                self.fields.pop(field_name)
+
+class TimedSerializerMixin:
+    """Reports serialization time to the metrics middleware when it is enabled"""
+    def to_representation(self, instance):
+        return timed_representation(super().to_representation, instance)
+
+def requested_fields(request, known):
+    """
+    The names from ?fields= that are in `known`, or None for every field:
+    when there is no ?fields= or none of its names are known
+    """
+    if request is None or request.method != 'GET':
+        return None
+    # Plain Django requests (the async views) have no query_params
+    fields = getattr(request, 'query_params', request.GET).get('fields')
+    if not fields:
+        return None
+    return {name.strip() for name in fields.split(',')} & set(known) or None
+
+class ProductImageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField()
 
-class ProductImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'is_primary', 'created_at']
+        fields = ['id', 'image', 'is_primary', 'created_at', 'variants']
+
+    def get_variants(self, obj):
+        request = self.context.get('request')
+        urls = {}
+        for name, formats in obj.variants.items():
+            urls[name] = {}
+            for extension, path in formats.items():
+                url = default_storage.url(path)
+                urls[name][extension] = request.build_absolute_uri(url) if request else url
+        return urls
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TimedSerializerMixin, FieldsProjectionMixin, serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
     primary_image = serializers.SerializerMethodField()
     
     class Meta:
         model = Product
-        fields = ['id', 'name', 'category', 'description', 'price', 'quantity', 'images', 'primary_image']
+        fields = ['id', 'sku', 'name', 'category', 'description', 'price', 'quantity', 'images', 'primary_image']
     
     def get_primary_image(self, obj):
-        primary_image = obj.images.filter(is_primary=True).first()
+        # Pick from the (prefetched) images instead of issuing a query per product
+        primary_image = next((image for image in obj.images.all() if image.is_primary), None)
         if primary_image:
-            return ProductImageSerializer(primary_image).data
+            return self.primary_image_serializer.to_representation(primary_image)
         return None
 
-class TransactionSerializer(serializers.ModelSerializer):
+    @cached_property
+    def primary_image_serializer(self):
+        # Built once per list rather than once per product. It has no request,
+        # so primary image URLs stay relative as before.
+        return ProductImageSerializer()
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    quantity = serializers.IntegerField(min_value=1)
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'product', 'product_name', 'unit_price', 'quantity', 'subtotal']
+        read_only_fields = ['product_name', 'unit_price']
+        extra_kwargs = {'product': {'allow_null': False, 'required': True}}
+
+class TransactionSerializer(TimedSerializerMixin, FieldsProjectionMixin, serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, required=False)
+
     class Meta:
         model = Transaction
         fields = '__all__'
+        extra_kwargs = {
+            'products': {'required': False},
+            'total_amount': {'required': False},
+        }
+
+    def validate_status(self, value):
+        if self.instance is None:
+            if value != 'pending':
+                raise serializers.ValidationError('New orders start as pending.')
+            return value
+        error = Transaction.status_change_error(self.instance.status, value)
+        if error:
+            raise serializers.ValidationError(error)
+        return value
+
+    def validate(self, attrs):
+        if self.instance is None:
+            if not attrs.get('items') and not attrs.get('products'):
+                raise serializers.ValidationError({'items': 'An order needs at least one item.'})
+            if not attrs.get('items') and attrs.get('total_amount') is None:
+                raise serializers.ValidationError({'total_amount': 'This field is required.'})
+        return attrs
+
+    @staticmethod
+    def build_items(items_data):
+        # Price and name are snapshotted from the product, never trusted from the client
+        return [
+            OrderItem(
+                product=item['product'],
+                product_name=item['product'].name,
+                unit_price=item['product'].price,
+                quantity=item['quantity'],
+            )
+            for item in items_data
+        ]
+
+    def apply_items(self, validated_data, items):
+        validated_data['total_amount'] = sum((item.subtotal for item in items), 0)
+        if not validated_data.get('products'):
+            validated_data['products'] = ', '.join(str(item) for item in items)
 
-class BankDetailsSerializer(serializers.ModelSerializer):
+    @staticmethod
+    def reserve(items):
+        try:
+            reserve_stock(items)
+        except OutOfStock as e:
+            name = next(item.product_name for item in items if item.product_id == e.product_id)
+            raise serializers.ValidationError({'items': f'Not enough stock for {name}.'})
+
+    def create(self, validated_data):
+        items_data = validated_data.pop('items', None)
+        items = self.build_items(items_data or [])
+        if items:
+            self.apply_items(validated_data, items)
+        if items:
+            validated_data['stock_reserved'] = True
+            validated_data['reserved_until'] = timezone.now() + reservation_timeout()
+        with db_transaction.atomic():
+            self.reserve(items)
+            instance = super().create(validated_data)
+            for item in items:
+                item.transaction = instance
+            OrderItem.objects.bulk_create(items)
+        return instance
+
+    def update(self, instance, validated_data):
+        items_data = validated_data.pop('items', None)
+        with db_transaction.atomic():
+            if items_data is not None:
+                items = self.build_items(items_data)
+                self.apply_items(validated_data, items)
+                # Swap the held stock over to the new items
+                if release_stock(instance):
+                    self.reserve(items)
+                    validated_data['stock_reserved'] = True
+                    validated_data['reserved_until'] = timezone.now() + reservation_timeout()
+                instance.items.all().delete()
+                for item in items:
+                    item.transaction = instance
+                OrderItem.objects.bulk_create(items)
+            instance = super().update(instance, validated_data)
+        return instance
+
+class BankDetailsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = BankDetails
         fields = '__all__'
 
-class SiteSettingsSerializer(serializers.ModelSerializer):
+class SiteSettingsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = SiteSettings
-        fields = ['id', 'site_title', 'contact_email', 'contact_number', 'main_color', 'store_tag']
\ No newline at end of file
+        fields = ['id', 'site_title', 'contact_email', 'contact_number', 'main_color', 'store_tag']
+
+class OrderStatusEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderStatusEvent
+        fields = ['from_status', 'to_status', 'created_at']
\ No newline at end of file
@@ -0,0 +1,95 @@
+# core/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bank_details_cache, site_settings_cache
+from .images import delete_variant_files, schedule_variants
+from .inventory import release_stock
+from .models import AdminToken, BankDetails, Product, ProductImage, SiteSettings, Transaction
+from .rollups import order_deleted, order_saved
+from .search import index_transaction, unindex_transaction
+from .tokens import forget as forget_admin_token
+from .transitions import status_saved
+from .versions import bump as bump_version
+
+
+@receiver(post_save, sender=Transaction)
+def update_transaction_search_index(sender, instance, using, created, **kwargs):
+    search_key = instance.search_key()
+    if created or search_key != getattr(instance, '_loaded_search_key', None):
+        index_transaction(instance, using)
+        instance._loaded_search_key = search_key
+
+
+@receiver(post_save, sender=Transaction)
+def release_cancelled_order_stock(sender, instance, **kwargs):
+    if instance.status == 'cancelled' and instance.stock_reserved:
+        release_stock(instance)
+
+
+@receiver(post_save, sender=Transaction)
+def update_order_rollups(sender, instance, created, **kwargs):
+    order_saved(instance, created)
+
+
+@receiver(post_save, sender=Transaction)
+def record_status_change(sender, instance, created, **kwargs):
+    status_saved(instance, created)
+
+
+@receiver(post_delete, sender=Transaction)
+def remove_order_from_rollups(sender, instance, **kwargs):
+    order_deleted(instance)
+
+
+@receiver(post_delete, sender=Transaction)
+def remove_transaction_from_search_index(sender, instance, using, **kwargs):
+    unindex_transaction(instance, using)
+
+
+@receiver(post_save, sender=ProductImage)
+def create_image_variants(sender, instance, created, **kwargs):
+    if created and instance.image:
+        schedule_variants([instance.pk])
+
+
+@receiver(post_delete, sender=ProductImage)
+def delete_image_variants(sender, instance, **kwargs):
+    variants = instance.variants
+    transaction.on_commit(lambda: delete_variant_files(variants))
+
+
+@receiver(post_save, sender=BankDetails)
+@receiver(post_delete, sender=BankDetails)
+def invalidate_bank_details_cache(sender, **kwargs):
+    transaction.on_commit(bank_details_cache.invalidate)
+
+
+@receiver(post_save, sender=SiteSettings)
+@receiver(post_delete, sender=SiteSettings)
+def invalidate_site_settings_cache(sender, **kwargs):
+    transaction.on_commit(site_settings_cache.invalidate)
+
+
+@receiver(post_save, sender=AdminToken)
+@receiver(post_delete, sender=AdminToken)
+def invalidate_admin_token_cache(sender, instance, **kwargs):
+    token_hash = instance.token_hash
+    transaction.on_commit(lambda: forget_admin_token(token_hash))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=Transaction)
+def bump_list_version(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver(post_delete, sender=Product)
+def bump_versions_for_deleted_product(sender, **kwargs):
+    # Order items pointing at the product are set to NULL without signals
+    bump_version(Product, Transaction)
@@ -0,0 +1,123 @@
+# core/storage.py
+"""
+File storage for product images and payment proofs, with presigned
+uploads so clients send file bytes straight to storage and the API only
+records where they went (see core.uploads).
+
+Product images use the 'default' storage and have public URLs. Payment
+proofs use the 'private' storage, whose URLs are signed and expire.
+
+S3Storage works with Amazon S3 and S3-compatible services such as MinIO,
+and needs django-storages and boto3. LocalStorage keeps files on disk
+and answers the same presigned requests through core.views.storage_upload
+and storage_download. It stands in for S3 in development and tests.
+Both store hashed uploads once per content (see core.dedup).
+"""
+
+import math
+import time
+
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import FileSystemStorage, storages
+from django.urls import reverse
+
+from .dedup import ContentAddressedMixin
+
+try:
+    from storages.backends.s3 import S3Storage as BaseS3Storage
+    from storages.utils import clean_name
+except ImportError:
+    BaseS3Storage = None
+
+UPLOAD_EXPIRY = 3600  # seconds a presigned upload stays valid
+SIGNING_SALT = 'core.storage'
+
+
+def private_storage():
+    # A callable, so STORAGES is read when the field is used rather than at import
+    return storages['private']
+
+
+def supports_direct_upload(storage):
+    return hasattr(storage, 'presigned_upload')
+
+
+def expires_at(seconds):
+    # Rounded up to the minute, so a URL stays the same for a minute and can be cached
+    return math.ceil((time.time() + seconds) / 60) * 60
+
+
+class LocalStorage(ContentAddressedMixin, FileSystemStorage):
+    """
+    FileSystemStorage with S3-style presigned uploads. With querystring_auth,
+    url() returns signed download links that expire after querystring_expire
+    seconds. `alias` is this storage's key in settings.STORAGES.
+    """
+    def __init__(self, alias='default', querystring_auth=False, querystring_expire=3600, **kwargs):
+        super().__init__(**kwargs)
+        self.alias = alias
+        self.querystring_auth = querystring_auth
+        self.querystring_expire = querystring_expire
+
+    def sign(self, action, **payload):
+        return signing.Signer(salt=SIGNING_SALT).sign_object({'storage': self.alias, 'action': action, **payload})
+
+    def presigned_upload(self, name, content_type, size, expires=UPLOAD_EXPIRY):
+        """Form for a multipart POST of the file, in the shape boto3's generate_presigned_post returns"""
+        policy = self.sign('upload', name=name, content_type=content_type, size=size, expires=expires_at(expires))
+        return {
+            'url': reverse('storage_upload'),
+            'fields': {'key': name, 'Content-Type': content_type, 'policy': policy},
+        }
+
+    def url(self, name):
+        if not self.querystring_auth:
+            return super().url(name)
+        token = self.sign('download', name=name, expires=expires_at(self.querystring_expire))
+        return reverse('storage_download', args=[token])
+
+    def read_head(self, name, length):
+        with self.open(name, 'rb') as f:
+            return f.read(length)
+
+
+def read_signed(token, action):
+    """
+    (storage, payload) for a LocalStorage token signed for action ('upload'
+    or 'download'). Raises signing.BadSignature if it was tampered with,
+    is for the other action or has expired.
+    """
+    payload = signing.Signer(salt=SIGNING_SALT).unsign_object(token)
+    if payload['action'] != action or payload['expires'] < time.time():
+        raise signing.BadSignature('Expired, or signed for another action')
+    storage = storages[payload['storage']]
+    if not isinstance(storage, LocalStorage):
+        raise signing.BadSignature('Not a local storage')
+    return storage, payload
+
+
+if BaseS3Storage is None:
+    class S3Storage:
+        def __init__(self, **options):
+            raise ImproperlyConfigured('core.storage.S3Storage needs django-storages and boto3: pip install "django-storages[s3]"')
+else:
+    class S3Storage(ContentAddressedMixin, BaseS3Storage):
+        def get_default_settings(self):
+            # django-storages rejects OPTIONS it doesn't know; set alias for entries other than 'default'
+            return {**super().get_default_settings(), 'alias': 'default'}
+
+        def presigned_upload(self, name, content_type, size, expires=UPLOAD_EXPIRY):
+            # S3 itself rejects a different size or content type
+            return self.bucket.meta.client.generate_presigned_post(
+                self.bucket_name,
+                self._normalize_name(clean_name(name)),
+                Fields={'Content-Type': content_type},
+                Conditions=[{'Content-Type': content_type}, ['content-length-range', size, size]],
+                ExpiresIn=expires,
+            )
+
+        def read_head(self, name, length):
+            # A ranged GET, rather than open() which downloads the whole object
+            obj = self.bucket.Object(self._normalize_name(clean_name(name)))
+            return obj.get(Range=f'bytes=0-{length - 1}')['Body'].read()
@@ -1,3 +1,2172 @@
-from django.test import TestCase
+import csv
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+import zipfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from importlib import import_module
+from importlib.util import find_spec, module_from_spec, spec_from_file_location
+from io import BytesIO, StringIO
+from uuid import uuid4
+from unittest import mock, skipUnless
+from xml.etree import ElementTree
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, Storage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.db.backends.signals import connection_created
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework import renderers
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from .cache import bank_details_cache, load_site_settings, site_settings_cache
+from .models import AdminToken, BankDetails, DailyOrderStats, OrderStatusEvent, Product, ProductImage, SiteSettings, StoredFile, Transaction, OrderItem, OutgoingEmail, UploadSession
+from .images import VARIANT_WIDTHS, generate_variants
+from .catalog import import_products
+from .inventory import OutOfStock, reserve_stock
+from .metrics import RequestMetrics, registry as metrics_registry
+from .outbox import MAX_ATTEMPTS, send_queued_emails
+from .renderers import JSONRenderer
+from .rollups import rebuild_rollups
+from .search import SEARCH_TABLE, search_transactions
+from .serializers import ProductSerializer, TransactionSerializer
+from . import storage as storage_module
+from .storage import private_storage
+from .tokens import check_token, create_token, hash_token
+from .uploads import purge_expired_uploads
+from .versions import LOCAL_COUNTER_TTL, versions
+from .benchmarks import run_benchmarks, run_concurrency, run_serialization, run_write_concurrency, seed_products, seed_transactions
+
+
+def create_product(**kwargs):
+    defaults = {
+        'name': 'Test Product',
+        'category': 'General',
+        'description': 'A product used in tests',
+        'price': '10.00',
+        'quantity': 5,
+    }
+    defaults.update(kwargs)
+    return Product.objects.create(**defaults)
+
+
+class ProductListQueryTests(APITestCase):
+    def create_products(self, count, images_per_product=2):
+        for i in range(count):
+            product = create_product(name=f'Product {i}')
+            for j in range(images_per_product):
+                ProductImage.objects.create(product=product, image=f'products/images/{i}_{j}.jpg')
+
+    def test_list_query_count_is_constant(self):
+        self.create_products(3)
+        # One query for the products, one for all of their images
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('product-list'))
+        self.assertEqual(len(response.data), 3)
+
+        self.create_products(20)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('product-list'))
+        self.assertEqual(len(response.data), 23)
+
+    def test_primary_image_picked_from_prefetched_images(self):
+        product = create_product()
+        first = ProductImage.objects.create(product=product, image='products/images/first.jpg')
+        second = ProductImage.objects.create(product=product, image='products/images/second.jpg')
+
+        response = self.client.get(reverse('product-detail', args=[product.pk]))
+        self.assertEqual(response.data['primary_image']['id'], first.pk)
+
+        second.is_primary = True
+        second.save()
+        response = self.client.get(reverse('product-detail', args=[product.pk]))
+        self.assertEqual(response.data['primary_image']['id'], second.pk)
+        self.assertEqual(response.data['images'][0]['id'], second.pk)
+
+    def test_product_without_images_has_no_primary_image(self):
+        product = create_product()
+        response = self.client.get(reverse('product-detail', args=[product.pk]))
+        self.assertIsNone(response.data['primary_image'])
+        self.assertEqual(response.data['images'], [])
+
+
+def create_transaction(**kwargs):
+    defaults = {
+        'name': 'Jane Doe',
+        'email': 'jane@example.com',
+        'location': 'Lagos',
+        'phone': '08000000000',
+        'total_amount': '20.00',
+        'products': 'Test Product (x2)',
+    }
+    defaults.update(kwargs)
+    return Transaction.objects.create(**defaults)
+
+
+class AdminClientMixin:
+    """Sends a valid admin token with every request made through self.client"""
+    def setUp(self):
+        super().setUp()
+        _, token = create_token()
+        check_token(token)  # warm the token cache so query counts cover only the view
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+
+class PaginationAndProjectionTests(AdminClientMixin, APITestCase):
+    def test_list_without_pagination_params_returns_plain_list(self):
+        create_transaction()
+        response = self.client.get(reverse('transaction-list'))
+        self.assertIsInstance(response.data, list)
+
+    def test_transactions_cursor_pagination(self):
+        for i in range(5):
+            create_transaction(name=f'Customer {i}')
+
+        response = self.client.get(reverse('transaction-list'), {'page_size': 2})
+        self.assertEqual([t['name'] for t in response.data['results']], ['Customer 4', 'Customer 3'])
+        self.assertIsNotNone(response.data['next'])
+
+        seen = [t['name'] for t in response.data['results']]
+        next_url = response.data['next']
+        while next_url:
+            response = self.client.get(next_url)
+            seen.extend(t['name'] for t in response.data['results'])
+            next_url = response.data['next']
+        self.assertEqual(seen, [f'Customer {i}' for i in reversed(range(5))])
+
+    def test_products_cursor_pagination(self):
+        products = [create_product(name=f'Product {i}') for i in range(3)]
+        response = self.client.get(reverse('product-list'), {'page_size': 2})
+        self.assertEqual([p['id'] for p in response.data['results']], [products[2].pk, products[1].pk])
+
+    def test_fields_projection(self):
+        create_transaction()
+        response = self.client.get(reverse('transaction-list'), {'fields': 'id,status,unknown'})
+        self.assertEqual(set(response.data[0]), {'id', 'status'})
+        # A misspelt projection gets every field rather than empty objects
+        response = self.client.get(reverse('transaction-list'), {'fields': 'nmae'})
+        self.assertIn('name', response.data[0])
+        create_product()
+        response = self.client.get(reverse('product-list'), {'fields': 'nmae'})
+        self.assertIn('images', response.data[0])
+
+    def test_product_projection_skips_image_prefetch(self):
+        product = create_product()
+        ProductImage.objects.create(product=product, image='products/images/a.jpg')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('product-list'), {'fields': 'id,name,price'})
+        self.assertEqual(set(response.data[0]), {'id', 'name', 'price'})
+
+
+class OrderItemTests(APITestCase):
+    def setUp(self):
+        self.shirt = create_product(name='Shirt', price='15.00')
+        self.cap = create_product(name='Cap', price='5.50')
+
+    def test_checkout_with_items_snapshots_prices(self):
+        response = self.client.post(reverse('transaction-list'), {
+            'name': 'Jane Doe',
+            'email': 'jane@example.com',
+            'location': 'Lagos',
+            'phone': '08000000000',
+            'total_amount': '1.00',
+            'items': [
+                {'product': self.shirt.pk, 'quantity': 2, 'unit_price': '0.01'},
+                {'product': self.cap.pk, 'quantity': 1},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total_amount'], '35.50')
+        self.assertEqual(response.data['products'], 'Shirt (x2), Cap (x1)')
+        self.assertEqual(
+            [(i['product_name'], i['unit_price'], i['quantity']) for i in response.data['items']],
+            [('Shirt', '15.00', 2), ('Cap', '5.50', 1)],
+        )
+
+        self.shirt.price = '99.00'
+        self.shirt.save()
+        item = OrderItem.objects.get(product=self.shirt)
+        self.assertEqual(str(item.unit_price), '15.00')
+
+    def test_checkout_with_legacy_products_text(self):
+        response = self.client.post(reverse('transaction-list'), {
+            'name': 'Jane Doe',
+            'email': 'jane@example.com',
+            'location': 'Lagos',
+            'phone': '08000000000',
+            'total_amount': '20.00',
+            'products': 'Shirt (x1)',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['items'], [])
+
+    def test_checkout_requires_items_or_products(self):
+        response = self.client.post(reverse('transaction-list'), {
+            'name': 'Jane Doe',
+            'email': 'jane@example.com',
+            'location': 'Lagos',
+            'phone': '08000000000',
+            'total_amount': '20.00',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('items', response.data)
+
+    def test_sales_by_product(self):
+        first = create_transaction()
+        second = create_transaction()
+        OrderItem.objects.create(transaction=first, product=self.shirt, product_name='Shirt', unit_price='15.00', quantity=1)
+        OrderItem.objects.create(transaction=first, product=self.cap, product_name='Cap', unit_price='5.50', quantity=2)
+        OrderItem.objects.create(transaction=second, product=self.cap, product_name='Cap', unit_price='5.00', quantity=2)
+
+        sales = list(OrderItem.objects.sales_by_product())
+        self.assertEqual([row['product'] for row in sales], [self.cap.pk, self.shirt.pk])
+        self.assertEqual(sales[0]['quantity_sold'], 4)
+        self.assertEqual(sales[0]['revenue'], Decimal('21.00'))
+
+    def test_legacy_products_parser(self):
+        migration = import_module('core.migrations.0008_populate_orderitems')
+        self.assertEqual(
+            migration.parse_products('Shirt, long sleeve (x2), Cap (x1)'),
+            [('Shirt, long sleeve', 2), ('Cap', 1)],
+        )
+        self.assertEqual(migration.parse_products(''), [])
+
+    def test_backfill_prices_items_from_the_order_total(self):
+        # Both products cost less when these orders were placed
+        headphones = create_product(name='Wireless Bluetooth Headphones', price='9000.00')
+        single = create_transaction(products='Wireless Bluetooth Headphones (x2)', total_amount='199.98')
+        mixed = create_transaction(products='Wireless Bluetooth Headphones (x1), Cap (x2), Gone (x1)', total_amount='100.10')
+
+        import_module('core.migrations.0008_populate_orderitems').populate_order_items(django_apps, None)
+        self.assertEqual(list(single.items.values_list('unit_price', 'quantity')), [(Decimal('99.99'), 2)])
+        # Unknown products weigh lines by quantity alone
+        self.assertEqual(sum(item.subtotal for item in mixed.items.all()), Decimal('100.10'))
+        self.assertEqual(mixed.items.get(product=self.cap).unit_price, Decimal('25.02'))
+        sales = {row['product']: row['revenue'] for row in OrderItem.objects.sales_by_product()}
+        self.assertEqual(sales[headphones.pk], Decimal('199.98') + mixed.items.get(product=headphones).unit_price)
+
+    def test_allocation_follows_current_price_proportions(self):
+        allocate = import_module('core.migrations.0008_populate_orderitems').allocate
+        self.assertEqual(allocate(Decimal('110.00'), [(1, Decimal('200.00')), (2, Decimal('10.00'))]), [Decimal('100.00'), Decimal('5.00')])
+        self.assertEqual(allocate(Decimal('10.00'), [(3, None)]), [Decimal('3.33')])
+        self.assertEqual(allocate(Decimal('0.00'), [(0, None)]), [Decimal('0.00')])
+
+    def test_reprice_backfilled_items(self):
+        repair = import_module('core.migrations.0022_reprice_backfilled_order_items').reprice_order_items
+        headphones = create_product(name='Wireless Bluetooth Headphones', price='9000.00')
+        backfilled = create_transaction(total_amount='199.98')
+        OrderItem.objects.create(transaction=backfilled, product=headphones, product_name='Headphones', unit_price='9000.00', quantity=2)
+        paid = create_transaction(total_amount='30.00')
+        OrderItem.objects.create(transaction=paid, product=self.shirt, product_name='Shirt', unit_price='15.00', quantity=2)
+        Transaction.objects.update(created_at=timezone.make_aware(datetime(2020, 1, 1)))
+        recent = create_transaction(total_amount='1.00')
+        OrderItem.objects.create(transaction=recent, product=self.shirt, product_name='Shirt', unit_price='15.00', quantity=1)
+
+        repair(django_apps, types.SimpleNamespace(connection=connection))
+        prices = dict(OrderItem.objects.values_list('transaction_id', 'unit_price'))
+        self.assertEqual(prices, {backfilled.pk: Decimal('99.99'), paid.pk: Decimal('15.00'), recent.pk: Decimal('15.00')})
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError('SMTP server unavailable')
+
+
+class OutboxTests(APITestCase):
+    def place_order(self):
+        return self.client.post(reverse('transaction-list'), {
+            'name': 'Jane Doe',
+            'email': 'jane@example.com',
+            'location': 'Lagos',
+            'phone': '08000000000',
+            'total_amount': '20.00',
+            'products': 'Shirt (x1)',
+        }, format='json')
+
+    def test_checkout_queues_email_instead_of_sending(self):
+        response = self.place_order()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+        queued = OutgoingEmail.objects.get()
+        self.assertEqual(queued.to, 'jane@example.com')
+        self.assertIn(response.data['tracking_number'], queued.body)
+
+    def test_worker_sends_pending_emails(self):
+        self.place_order()
+        self.place_order()
+        call_command('send_queued_emails', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(OutgoingEmail.objects.exclude(status='sent').exists())
+
+        call_command('send_queued_emails', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+
+    @override_settings(EMAIL_BACKEND='core.tests.FailingEmailBackend')
+    def test_failed_sends_are_retried_with_backoff(self):
+        self.place_order()
+        self.assertEqual(send_queued_emails(), (0, 1))
+        queued = OutgoingEmail.objects.get()
+        self.assertEqual(queued.status, 'pending')
+        self.assertEqual(queued.attempts, 1)
+        self.assertIn('SMTP server unavailable', queued.last_error)
+        self.assertGreater(queued.next_attempt_at, timezone.now())
+
+        # Not due yet, so nothing is picked up
+        self.assertEqual(send_queued_emails(), (0, 0))
+
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now(), attempts=MAX_ATTEMPTS - 1)
+        send_queued_emails()
+        self.assertEqual(OutgoingEmail.objects.get().status, 'failed')
+
+
+class FastListTests(AdminClientMixin, APITestCase):
+    """The .values() list path must match the ModelSerializers field for field"""
+    def setUp(self):
+        super().setUp()
+        self.shirt = create_product(name='Shirt', price='15.50')
+        create_product(name='Café mug ', price='1000.00')
+        ProductImage.objects.create(product=self.shirt, image='products/images/a.jpg')
+        ProductImage.objects.create(
+            product=self.shirt, image='products/images/b.jpg',
+            variants={'thumb': {'webp': 'products/variants/b_thumb.webp', 'jpeg': 'products/variants/b_thumb.jpg'}},
+            is_primary=True,
+        )
+        order = create_transaction(payment_proof='payment_proofs/receipt.pdf', status='payment_uploaded')
+        OrderItem.objects.create(transaction=order, product=self.shirt, product_name='Shirt', unit_price='15.50', quantity=3)
+        OrderItem.objects.create(transaction=order, product=None, product_name='Gone', unit_price='2.00', quantity=1)
+        create_transaction()
+
+    def serialized(self, serializer_class, queryset, **params):
+        request = Request(APIRequestFactory().get('/', params))
+        return json.loads(json.dumps(serializer_class(queryset, many=True, context={'request': request}).data))
+
+    def test_products_match_serializer(self):
+        response = self.client.get(reverse('product-list'))
+        expected = self.serialized(ProductSerializer, Product.objects.prefetch_related('images'))
+        self.assertEqual(response.json(), expected)
+        self.assertEqual(list(response.json()[0]), ProductSerializer.Meta.fields)
+
+    def test_transactions_match_serializer(self):
+        response = self.client.get(reverse('transaction-list'))
+        expected = self.serialized(TransactionSerializer, Transaction.objects.prefetch_related('items'))
+        self.assertEqual(response.json(), expected)
+        self.assertEqual(list(response.json()[0]), list(expected[0]))
+
+    def test_projection_and_pagination_match_serializer(self):
+        params = {'fields': 'id,name,primary_image', 'page_size': 1}
+        first = self.client.get(reverse('product-list'), params).json()
+        second = self.client.get(first['next']).json()
+        products = Product.objects.prefetch_related('images').order_by('-id')
+        expected = self.serialized(ProductSerializer, products, fields='id,name,primary_image')
+        self.assertEqual(first['results'] + second['results'], expected)
+
+        response = self.client.get(reverse('transaction-list'), {'fields': 'tracking_number,items', 'page_size': 5})
+        expected = self.serialized(
+            TransactionSerializer, Transaction.objects.prefetch_related('items').order_by('-created_at', '-id'),
+            fields='tracking_number,items',
+        )
+        self.assertEqual(response.json()['results'], expected)
+
+    def test_list_query_count(self):
+        with self.assertNumQueries(2):
+            self.client.get(reverse('transaction-list'))
+        with self.assertNumQueries(1):
+            self.client.get(reverse('product-list'), {'fields': 'id,name'})
+
+    def test_renderer_output_matches_drf(self):
+        data = {
+            'price': Decimal('1.50'), 'at': timezone.now(), 'id': uuid4(), 'text': 'line\u2028break é',
+            1: [None, True, 2.5],
+        }
+        self.assertEqual(JSONRenderer().render(data), renderers.JSONRenderer().render(data))
+
+
+class VersionedListTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = create_product()
+
+    def assert_not_modified(self, url, etag, **params):
+        with self.assertNumQueries(0):
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_unchanged_product_list_is_not_modified_without_queries(self):
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assert_not_modified(reverse('product-list'), response['ETag'])
+        # Projections and pages are separate representations
+        self.assertNotEqual(self.client.get(reverse('product-list'), {'fields': 'id'})['ETag'], response['ETag'])
+
+    def test_changes_produce_a_new_etag(self):
+        url = reverse('product-list')
+        changes = [
+            lambda: Product.objects.filter(pk=self.product.pk).first().save(),
+            lambda: ProductImage.objects.create(product=self.product),  # no file, so no variant job
+            lambda: import_products(BytesIO(b'sku,name,category,description,price,quantity\nA1,A,B,C,1.00,1\n'), 'csv'),
+            lambda: reserve_stock([OrderItem(product_id=self.product.pk, quantity=1)]),
+            lambda: self.product.delete(),
+        ]
+        etag = self.client.get(url)['ETag']
+        for change in changes:
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            etag = response['ETag']
+
+    def test_lost_counters_do_not_revive_old_etags(self):
+        etag = self.client.get(reverse('product-list'))['ETag']
+        cache.clear()
+        self.assertEqual(self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_local_counters_expire(self):
+        # Another worker's write is invisible to a per-process cache, so its counters restart
+        etag = self.client.get(reverse('product-list'))['ETag']
+        later = time.time() + LOCAL_COUNTER_TTL + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertEqual(self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_transaction_list(self):
+        _, token = create_token()
+        check_token(token)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        order = create_transaction()
+        response = self.client.get(reverse('transaction-list'))
+        self.assertEqual(response['Cache-Control'], 'no-cache, private')
+        self.assert_not_modified(reverse('transaction-list'), response['ETag'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'shipped'
+            order.save()
+        self.assertEqual(self.client.get(reverse('transaction-list'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+        self.client.credentials()
+        self.assertEqual(self.client.get(reverse('transaction-list'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 401)
+
+
+class CompressionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        for i in range(20):
+            create_product(name=f'Product {i}', description='A long description. ' * 10)
+
+    def test_large_json_is_gzipped(self):
+        plain = self.client.get(reverse('product-list'))
+        self.assertNotIn('Content-Encoding', plain)
+        response = self.client.get(reverse('product-list'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertLess(len(response.content), len(plain.content) / 4)
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        # The weakened ETag still revalidates
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+        revalidated = self.client.get(reverse('product-list'), HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_small_responses_are_not_compressed(self):
+        response = self.client.get(reverse('product-list'), {'fields': 'id'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertLess(len(response.content), settings.COMPRESSION_MIN_SIZE)
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_streamed_csv_is_compressed(self):
+        _, token = create_token()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        response = self.client.get(reverse('product-export-catalog'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        rows = list(csv.reader(gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()))
+        self.assertEqual(len(rows), 21)
+
+    def test_site_settings_etag_survives_compression(self):
+        etag = self.client.get(reverse('site-settings-list'))['ETag']
+        response = self.client.get(reverse('site-settings-list'), HTTP_IF_NONE_MATCH='W/' + etag)
+        self.assertEqual(response.status_code, 304)
+
+    @skipUnless(find_spec('brotli'), 'brotli is not installed')
+    def test_brotli_preferred_when_accepted(self):
+        import brotli
+        plain = self.client.get(reverse('product-list'))
+        response = self.client.get(reverse('product-list'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+
+class TransactionSearchTests(AdminClientMixin, APITestCase):
+    def search(self, term):
+        response = self.client.get(reverse('transaction-list'), {'search': term})
+        return [t['id'] for t in response.data]
+
+    def test_prefix_search_on_name_and_email(self):
+        jane = create_transaction(name='Jane Doe', email='jane@example.com')
+        john = create_transaction(name='John Smith', email='jsmith@mail.com')
+        self.assertEqual(self.search('jan'), [jane.pk])
+        self.assertEqual(self.search('jsmi'), [john.pk])
+        self.assertEqual(self.search('Jo Smi'), [john.pk])
+        self.assertEqual(self.search('nobody'), [])
+
+    def test_search_by_tracking_number(self):
+        order = create_transaction()
+        create_transaction()
+        self.assertEqual(self.search(str(order.tracking_number)), [order.pk])
+        self.assertEqual(self.search(order.tracking_number.hex[:8]), [order.pk])
+
+    def test_results_are_ranked(self):
+        weak = create_transaction(name='Ada Lovelace', email='someone@example.com')
+        strong = create_transaction(name='Ada Ada', email='ada@example.com')
+        self.assertEqual(self.search('ada'), [strong.pk, weak.pk])
+
+    def test_older_match_outranks_many_newer_ones(self):
+        strong = create_transaction(name='Ada Ada', email='ada@example.com')
+        Transaction.objects.bulk_create(
+            Transaction(name=f'Ada Lovelace {i}', email=f'someone{i}@example.com', location='Lagos',
+                        phone='08000000000', total_amount='20.00', products='Test Product (x1)')
+            for i in range(1500)
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('ada')[0], strong.pk)
+
+    def test_search_pages_follow_rank(self):
+        strong = create_transaction(name='Ada Ada', email='ada@example.com')
+        weak = [create_transaction(name=f'Ada Lovelace {i}', email=f'someone{i}@example.com') for i in range(3)]
+
+        first = self.client.get(reverse('transaction-list'), {'search': 'ada', 'page_size': 2}).data
+        self.assertEqual([t['id'] for t in first['results']], [strong.pk, weak[2].pk])
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).data
+        self.assertEqual([t['id'] for t in second['results']], [weak[1].pk, weak[0].pk])
+        self.assertIsNone(second['next'])
+        previous = self.client.get(second['previous']).data
+        self.assertEqual(previous['results'], first['results'])
+
+    def test_index_follows_updates_and_deletes(self):
+        order = create_transaction(name='Jane Doe', email='jd@example.com')
+        order.name = 'Mary Major'
+        order.save()
+        self.assertEqual(self.search('jane'), [])
+        self.assertEqual(self.search('mary'), [order.pk])
+
+        order = Transaction.objects.get(pk=order.pk)
+        order.status = 'cancelled'
+        with CaptureQueriesContext(connection) as queries:
+            order.save(update_fields=['status'])
+        self.assertFalse([query for query in queries if SEARCH_TABLE in query['sql']])
+
+        order.delete()
+        self.assertEqual(self.search('mary'), [])
+
+    def test_rebuild_index(self):
+        order = create_transaction(name='Jane Doe')
+        Transaction.objects.filter(pk=order.pk).update(name='Bulk Renamed')
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('bulk'), [order.pk])
+
+
+@skipUnless(os.environ.get('BENCHMARK_SEARCH_ROWS'), 'set BENCHMARK_SEARCH_ROWS to run the search benchmark')
+class TransactionSearchBenchmark(TransactionTestCase):
+    """
+    BENCHMARK_SEARCH_ROWS=1000000 python manage.py test core.tests.TransactionSearchBenchmark
+    """
+    def test_search_latency(self):
+        rows = int(os.environ['BENCHMARK_SEARCH_ROWS'])
+        seed_transactions(rows)
+
+        timings = {}
+        for term in ['customer12345', 'Chinedu Oka', 'jane', 'ibrahim 99']:
+            started = time.perf_counter()
+            for _ in range(10):
+                list(search_transactions(Transaction.objects.all(), term))
+            timings[term] = (time.perf_counter() - started) / 10 * 1000
+        print(f'\nSearch over {rows} transactions (ms): ' + ', '.join(f'{t!r}: {ms:.1f}' for t, ms in timings.items()))
+        # Every match is ranked, and these two match a tenth of the orders
+        self.assertLess(max(timings.pop('jane'), timings.pop('Chinedu Oka')), 500)
+        self.assertLess(max(timings.values()), 50)
+
+
+class IndexUsageTests(TestCase):
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_transaction_status_filter_uses_index(self):
+        queryset = Transaction.objects.filter(status='pending').order_by('-created_at')
+        self.assertUsesIndex(queryset, 'core_txn_status_created_idx')
+
+    def test_transaction_recent_first_uses_index(self):
+        queryset = Transaction.objects.order_by('-created_at', '-id')[:50]
+        self.assertUsesIndex(queryset, 'core_txn_created_idx')
+
+    def test_transaction_email_lookup_uses_index(self):
+        self.assertUsesIndex(Transaction.objects.filter(email='jane@example.com'), 'core_txn_email_idx')
+
+    def test_product_category_filter_uses_index(self):
+        self.assertUsesIndex(Product.objects.filter(category='Shoes'), 'core_product_category_idx')
+
+    def test_image_prefetch_uses_index(self):
+        self.assertUsesIndex(ProductImage.objects.filter(product_id__in=[1, 2, 3]), 'core_prodimg_product_order_idx')
+
+    def test_product_images_are_read_in_index_order(self):
+        product = create_product()
+        plan = product.images.all().explain()
+        self.assertIn('core_prodimg_product_order_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class PrimaryImageTests(TestCase):
+    def setUp(self):
+        self.product = create_product()
+
+    def add_image(self, **kwargs):
+        return ProductImage.objects.create(product=self.product, image='products/images/a.jpg', **kwargs)
+
+    def test_first_image_becomes_primary(self):
+        first = self.add_image()
+        second = self.add_image()
+        self.assertTrue(first.is_primary)
+        self.assertFalse(second.is_primary)
+
+    def test_new_primary_replaces_old(self):
+        first = self.add_image()
+        second = self.add_image(is_primary=True)
+        first.refresh_from_db()
+        self.assertFalse(first.is_primary)
+        self.assertTrue(second.is_primary)
+
+    def test_database_rejects_two_primary_images(self):
+        first = self.add_image()
+        second = self.add_image()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ProductImage.objects.filter(pk=second.pk).update(is_primary=True)
+        self.assertTrue(ProductImage.objects.get(pk=first.pk).is_primary)
+
+
+def make_image_file(name='photo.png', size=(1200, 800), color=(200, 30, 30), image_format='PNG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, image_format)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{image_format.lower()}')
+
+
+class TemporaryMediaMixin:
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = override_settings(
+            MEDIA_ROOT=media_root,
+            CHUNKED_UPLOAD_TEMP_DIR=os.path.join(media_root, 'chunks'),
+            IMAGE_VARIANTS_ASYNC=False,
+        )
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        # The private storage has its own location (settings.STORAGES). Overriding STORAGES
+        # builds new storages, while the payment_proof field keeps the one it started with.
+        for private in {private_storage(), Transaction._meta.get_field('payment_proof').storage}:
+            self.addCleanup(self.move_storage, private, private._location)
+            self.move_storage(private, os.path.join(media_root, 'private'))
+
+    @staticmethod
+    def move_storage(storage, location):
+        storage._location = location
+        for name in ('base_location', 'location'):
+            storage.__dict__.pop(name, None)
+
+
+class ImageVariantTests(AdminClientMixin, TemporaryMediaMixin, APITestCase):
+    def test_upload_generates_variants(self):
+        product = create_product()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('product-upload-images', args=[product.pk]),
+                {'images': [make_image_file()]},
+                format='multipart',
+            )
+        self.assertEqual(response.status_code, 201)
+
+        image = ProductImage.objects.get()
+        self.assertEqual(set(image.variants), set(VARIANT_WIDTHS))
+        for name, width in VARIANT_WIDTHS.items():
+            self.assertEqual(set(image.variants[name]), {'webp', 'jpeg'})
+            with default_storage.open(image.variants[name]['webp']) as f, Image.open(f) as variant:
+                self.assertEqual(variant.format, 'WEBP')
+                self.assertEqual(variant.size, (width, round(800 * width / 1200)))
+
+        response = self.client.get(reverse('product-detail', args=[product.pk]))
+        urls = response.data['images'][0]['variants']
+        self.assertTrue(urls['thumb']['webp'].startswith('http://testserver/media/products/variants/'))
+
+    def test_small_images_are_not_upscaled(self):
+        product = create_product()
+        product_image = ProductImage.objects.create(product=product, image=make_image_file(size=(100, 80)))
+        variants = generate_variants(product_image.pk)
+        with default_storage.open(variants['detail']['jpeg']) as f, Image.open(f) as variant:
+            self.assertEqual(variant.size, (100, 80))
+
+    def test_deleting_image_removes_variants(self):
+        product = create_product()
+        product_image = ProductImage.objects.create(product=product, image=make_image_file())
+        variants = generate_variants(product_image.pk)
+        product_image.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            product_image.delete()
+        self.assertFalse(default_storage.exists(variants['thumb']['webp']))
+
+    def test_backfill_command(self):
+        product = create_product()
+        ProductImage.objects.create(product=product, image=make_image_file())
+        call_command('generate_image_variants', stdout=StringIO())
+        self.assertNotEqual(ProductImage.objects.get().variants, {})
+
+
+class GalleryTests(AdminClientMixin, TemporaryMediaMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = create_product()
+        self.shade = 0
+
+    def upload(self, count, **data):
+        # A different colour each time, so no upload is a duplicate of another
+        files = []
+        for i in range(count):
+            self.shade += 1
+            files.append(make_image_file(name=f'photo{i}.png', size=(40, 30), color=(self.shade, 30, 30)))
+        return self.client.post(
+            reverse('product-upload-images', args=[self.product.pk]),
+            {'images': files, **data},
+            format='multipart',
+        )
+
+    def add_image(self, **kwargs):
+        return ProductImage.objects.create(product=self.product, image='products/images/a.jpg', **kwargs)
+
+    def primary_ids(self):
+        return list(ProductImage.objects.filter(product=self.product, is_primary=True).values_list('pk', flat=True))
+
+    def test_upload_query_count_does_not_grow_with_images(self):
+        counts = []
+        for count in (1, 5):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.upload(count)
+            self.assertEqual(response.status_code, 201)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_first_uploaded_image_becomes_primary(self):
+        response = self.upload(3)
+        self.assertEqual([image['is_primary'] for image in response.data], [True, False, False])
+        self.assertEqual(self.primary_ids(), [response.data[0]['id']])
+
+    def test_upload_keeps_existing_primary(self):
+        existing = self.add_image()
+        self.upload(2)
+        self.assertEqual(self.primary_ids(), [existing.pk])
+
+    def test_upload_can_pick_existing_primary(self):
+        self.add_image()
+        second = self.add_image()
+        response = self.upload(1, primary_image=second.pk)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.primary_ids(), [second.pk])
+
+    def test_invalid_primary_leaves_nothing_behind(self):
+        existing = self.add_image()
+        response = self.upload(2, primary_image=existing.pk + 100)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Specified primary image does not exist')
+        self.assertEqual(ProductImage.objects.count(), 1)
+        self.assertEqual(self.primary_ids(), [existing.pk])
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, 'products')))
+
+    def test_image_limit(self):
+        for _ in range(8):
+            self.add_image()
+        response = self.upload(3)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('You can add 2 more images', response.data['error'])
+        self.assertEqual(ProductImage.objects.count(), 8)
+
+    def test_set_primary_keeps_one_primary(self):
+        first = self.add_image()
+        second = self.add_image()
+        response = self.client.post(
+            reverse('product-set-primary-image', args=[self.product.pk]), {'image_id': second.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.primary_ids(), [second.pk])
+
+        response = self.client.post(
+            reverse('product-set-primary-image', args=[self.product.pk]), {'image_id': first.pk + 100}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.primary_ids(), [second.pk])
+
+    def test_deleting_primary_promotes_newest_image(self):
+        primary = self.add_image()
+        older = self.add_image()
+        newer = self.add_image()
+        ProductImage.objects.filter(pk=older.pk).update(created_at=timezone.now() - timedelta(days=1))
+        response = self.client.delete(
+            reverse('product-delete-image', args=[self.product.pk]), {'image_id': primary.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.primary_ids(), [newer.pk])
+
+    def test_deleting_other_image_keeps_primary(self):
+        primary = self.add_image()
+        other = self.add_image()
+        self.client.delete(reverse('product-delete-image', args=[self.product.pk]), {'image_id': other.pk})
+        self.assertEqual(self.primary_ids(), [primary.pk])
+
+    def test_upload_schedules_variants_and_bumps_list_version(self):
+        before = versions(ProductImage)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(2)
+        self.assertNotEqual(versions(ProductImage), before)
+        for image in ProductImage.objects.all():
+            self.assertEqual(set(image.variants), set(VARIANT_WIDTHS))
+        self.assertEqual(len(response.data), 2)
+
+
+class UploadSessionMixin:
+    """start() remembers each upload's token and the other helpers send it"""
+    start_data = {}
+
+    def setUp(self):
+        super().setUp()
+        self.upload_tokens = {}
+
+    def start(self, **data):
+        response = self.client.post(reverse('start_chunked_upload'), {**self.start_data, **data}, format='json')
+        if response.status_code == 201:
+            self.upload_tokens[str(response.data['id'])] = response.data['token']
+        return response
+
+    def token_header(self, upload_id):
+        return {'HTTP_UPLOAD_TOKEN': self.upload_tokens[str(upload_id)]}
+
+    def send_chunk(self, upload_id, offset, chunk):
+        return self.client.patch(
+            reverse('chunked_upload', args=[upload_id]),
+            data=chunk,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+            **self.token_header(upload_id),
+        )
+
+    def complete(self, upload_id):
+        return self.client.post(reverse('complete_chunked_upload', args=[upload_id]), **self.token_header(upload_id))
+
+
+class ChunkedUploadTests(AdminClientMixin, UploadSessionMixin, TemporaryMediaMixin, APITestCase):
+
+    def test_payment_proof_in_chunks(self):
+        order = create_transaction()
+        content = b'%PDF-1.4\n' + b'x' * 5000
+        response = self.start(purpose='payment_proof', filename='receipt.pdf', size=len(content),
+                              tracking_number=str(order.tracking_number))
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.data['id']
+
+        for offset in range(0, len(content), 2048):
+            response = self.send_chunk(upload_id, offset, content[offset:offset + 2048])
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['offset'], len(content))
+
+        response = self.complete(upload_id)
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'payment_uploaded')
+        with order.payment_proof.open('rb') as f:
+            self.assertEqual(f.read(), content)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_resume_reports_offset_and_rejects_gaps(self):
+        order = create_transaction()
+        content = b'\x89PNG\r\n\x1a\n' + b'x' * 100
+        upload_id = self.start(purpose='payment_proof', filename='proof.png', size=len(content),
+                               tracking_number=str(order.tracking_number)).data['id']
+        # A tiny first chunk, so the signature check has to span two requests
+        self.send_chunk(upload_id, 0, content[:4])
+
+        response = self.client.get(reverse('chunked_upload', args=[upload_id]), **self.token_header(upload_id))
+        self.assertEqual(response.data['offset'], 4)
+        self.assertEqual(response['Upload-Offset'], '4')
+
+        self.assertEqual(self.send_chunk(upload_id, 50, content[50:]).status_code, 409)
+        self.assertEqual(self.send_chunk(upload_id, 4, content[4:]).status_code, 200)
+        self.assertEqual(self.complete(upload_id).status_code, 200)
+
+    def test_oversize_chunk_is_rejected_and_discarded(self):
+        order = create_transaction()
+        upload_id = self.start(purpose='payment_proof', filename='receipt.pdf', size=10,
+                               tracking_number=str(order.tracking_number)).data['id']
+        response = self.send_chunk(upload_id, 0, b'%PDF-' + b'x' * 100)
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(settings.CHUNKED_UPLOAD_TEMP_DIR), [])
+
+    def test_declared_size_over_limit_is_rejected(self):
+        order = create_transaction()
+        response = self.start(purpose='payment_proof', filename='receipt.pdf', size=50 * 1024 * 1024,
+                              tracking_number=str(order.tracking_number))
+        self.assertEqual(response.status_code, 413)
+
+    def test_content_must_match_extension(self):
+        order = create_transaction()
+        upload_id = self.start(purpose='payment_proof', filename='receipt.pdf', size=20,
+                               tracking_number=str(order.tracking_number)).data['id']
+        response = self.send_chunk(upload_id, 0, b'MZ' + b'\x00' * 18)
+        self.assertEqual(response.status_code, 415)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_incomplete_upload_cannot_be_completed(self):
+        order = create_transaction()
+        upload_id = self.start(purpose='payment_proof', filename='receipt.pdf', size=20,
+                               tracking_number=str(order.tracking_number)).data['id']
+        self.send_chunk(upload_id, 0, b'%PDF-')
+        response = self.complete(upload_id)
+        self.assertEqual(response.status_code, 409)
+
+    def test_product_image_upload(self):
+        product = create_product()
+        content = make_image_file(image_format='JPEG').read()
+        response = self.start(purpose='product_image', filename='photo.jpg', size=len(content), product=product.pk)
+        upload_id = response.data['id']
+        self.send_chunk(upload_id, 0, content)
+        response = self.complete(upload_id)
+        self.assertEqual(response.status_code, 201)
+        image = ProductImage.objects.get(product=product)
+        self.assertTrue(image.is_primary)
+        self.assertEqual(image.image.size, len(content))
+
+    def test_requests_without_the_upload_token_are_not_found(self):
+        order = create_transaction()
+        upload_id = self.start(purpose='payment_proof', filename='receipt.pdf', size=20,
+                               tracking_number=str(order.tracking_number)).data['id']
+        url = reverse('chunked_upload', args=[upload_id])
+        for headers in ({}, {'HTTP_UPLOAD_TOKEN': 'guess'}):
+            self.assertEqual(self.client.get(url, **headers).status_code, 404)
+            self.assertEqual(self.client.patch(url, data=b'%PDF-', content_type='application/offset+octet-stream',
+                                               HTTP_UPLOAD_OFFSET='0', **headers).status_code, 404)
+            self.assertEqual(self.client.delete(url, **headers).status_code, 404)
+            self.assertEqual(self.client.post(reverse('complete_chunked_upload', args=[upload_id]), **headers).status_code, 404)
+        self.assertEqual(UploadSession.objects.get().received, 0)
+        self.assertEqual(self.send_chunk(upload_id, 0, b'%PDF-').status_code, 200)
+
+    def test_product_image_upload_needs_an_admin_token_throughout(self):
+        product = create_product()
+        upload_id = self.start(purpose='product_image', filename='photo.jpg', size=100, product=product.pk).data['id']
+        self.client.credentials()
+        self.assertEqual(self.send_chunk(upload_id, 0, b'\xff\xd8\xff').status_code, 401)
+        self.assertEqual(self.complete(upload_id).status_code, 401)
+
+    def test_expired_upload_is_gone(self):
+        order = create_transaction()
+        upload_id = self.start(purpose='payment_proof', filename='receipt.pdf', size=20,
+                               tracking_number=str(order.tracking_number)).data['id']
+        self.send_chunk(upload_id, 0, b'%PDF-')
+        later = timezone.now() + timedelta(days=1)
+        with mock.patch('core.uploads.timezone.now', return_value=later):
+            self.assertEqual(self.send_chunk(upload_id, 5, b'x' * 15).status_code, 410)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(settings.CHUNKED_UPLOAD_TEMP_DIR), [])
+        self.assertEqual(self.complete(upload_id).status_code, 404)
+
+    def test_purge_discards_expired_uploads(self):
+        order = create_transaction()
+        self.start(purpose='payment_proof', filename='receipt.pdf', size=20, tracking_number=str(order.tracking_number))
+        self.assertEqual(purge_expired_uploads(), 0)
+        self.assertEqual(purge_expired_uploads(now=timezone.now() + timedelta(days=1)), 1)
+        self.assertFalse(UploadSession.objects.exists())
+
+
+class DirectUploadTests(AdminClientMixin, UploadSessionMixin, TemporaryMediaMixin, APITestCase):
+    start_data = {'direct': True}
+
+    def put_file(self, upload, content, **fields):
+        data = {**upload['fields'], 'file': SimpleUploadedFile('ignored', content), **fields}
+        return self.client.post(upload['url'], data)
+
+    def start_payment_proof(self, content, order=None):
+        order = order or create_transaction()
+        response = self.start(purpose='payment_proof', filename='receipt.pdf', size=len(content),
+                              tracking_number=str(order.tracking_number))
+        self.assertEqual(response.status_code, 201)
+        return order, response.data
+
+    def test_payment_proof_goes_straight_to_storage(self):
+        content = b'%PDF-1.4\n' + b'x' * 5000
+        order, upload = self.start_payment_proof(content)
+        self.assertTrue(upload['upload']['url'].startswith('http://testserver/'))
+        self.assertEqual(self.put_file(upload['upload'], content).status_code, 204)
+
+        response = self.complete(upload['id'])
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'payment_uploaded')
+        self.assertEqual(order.payment_proof.name, upload['upload']['fields']['key'])
+        self.assertFalse(UploadSession.objects.exists())
+
+        # Proofs are private: the API hands out signed, expiring links
+        url = self.client.get(reverse('transaction-list')).json()[0]['payment_proof']
+        self.assertTrue(url.startswith('http://testserver/api/storage/'))
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), content)
+        with mock.patch('core.storage.time.time', return_value=time.time() + 7200):
+            self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url[:-2] + 'x/').status_code, 404)
+
+    def test_product_image_goes_straight_to_storage(self):
+        product = create_product()
+        content = make_image_file(image_format='JPEG').read()
+        response = self.start(purpose='product_image', filename='photo.jpg', size=len(content), product=product.pk)
+        upload = response.data
+        self.assertEqual(upload['upload']['fields']['Content-Type'], 'image/jpeg')
+        self.put_file(upload['upload'], content)
+
+        response = self.complete(upload['id'])
+        self.assertEqual(response.status_code, 201)
+        image = ProductImage.objects.get(product=product)
+        self.assertTrue(image.is_primary)
+        self.assertTrue(image.image.name.startswith('products/images/'))
+        self.assertTrue(response.data['image'].startswith('http://testserver/media/products/images/'))
+
+    def test_upload_must_match_its_policy(self):
+        content = b'%PDF-1.4\n' + b'x' * 100
+        _, upload = self.start_payment_proof(content)
+        form = upload['upload']
+        self.assertEqual(self.put_file(form, content + b'x').status_code, 400)
+        self.assertEqual(self.put_file(form, content, key='payment_proofs/other.pdf').status_code, 403)
+        self.assertEqual(self.put_file(form, content, policy=form['fields']['policy'] + 'x').status_code, 403)
+        self.assertFalse(private_storage().exists(form['fields']['key']))
+
+    def test_complete_before_upload(self):
+        _, upload = self.start_payment_proof(b'%PDF-1.4\n')
+        response = self.complete(upload['id'])
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(UploadSession.objects.exists())
+
+    def test_content_must_match_extension(self):
+        content = b'MZ' + b'\x00' * 30
+        _, upload = self.start_payment_proof(content)
+        self.put_file(upload['upload'], content)
+        response = self.complete(upload['id'])
+        self.assertEqual(response.status_code, 415)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(private_storage().exists(upload['upload']['fields']['key']))
+
+    def test_chunks_are_refused(self):
+        _, upload = self.start_payment_proof(b'%PDF-1.4\n')
+        response = self.client.patch(
+            reverse('chunked_upload', args=[upload['id']]), data=b'%PDF-1.4\n',
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET='0', **self.token_header(upload['id']),
+        )
+        self.assertEqual(response.status_code, 409)
+
+    def test_storage_without_presigned_uploads(self):
+        product = create_product()
+        storages = {**settings.STORAGES, 'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'}}
+        with override_settings(STORAGES=storages):
+            response = self.start(purpose='product_image', filename='photo.jpg', size=100, product=product.pk)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadSession.objects.exists())
+
+
+class DeduplicationTests(AdminClientMixin, TemporaryMediaMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.content = make_image_file(size=(40, 30)).read()
+
+    def upload_images(self, product, *contents):
+        files = [SimpleUploadedFile(f'photo{i}.png', content, content_type='image/png') for i, content in enumerate(contents)]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('product-upload-images', args=[product.pk]), {'images': files}, format='multipart',
+            )
+        self.assertEqual(response.status_code, 201)
+        return [ProductImage.objects.get(pk=image['id']).image.name for image in response.data]
+
+    def stored_files(self, directory='products/images', storage=default_storage):
+        return os.listdir(storage.path(directory))
+
+    def test_duplicate_upload_is_not_written_again(self):
+        first, = self.upload_images(create_product(), self.content)
+        self.assertEqual(first, f'products/images/{hashlib.sha256(self.content).hexdigest()}.png')
+
+        with mock.patch.object(FileSystemStorage, '_save', autospec=True, side_effect=FileSystemStorage._save) as save:
+            second, = self.upload_images(create_product(), self.content)
+        # Only the new image's variants were written
+        self.assertEqual([call.args[1] for call in save.call_args_list if call.args[1].startswith('products/images/')], [])
+        self.assertEqual(second, first)
+        self.assertEqual(self.stored_files(), [os.path.basename(first)])
+        self.assertEqual(StoredFile.objects.get(name=first).refs, 2)
+
+    def test_duplicates_in_one_batch(self):
+        names = self.upload_images(create_product(), self.content, self.content)
+        self.assertEqual(names[0], names[1])
+        self.assertEqual(StoredFile.objects.get().refs, 2)
+
+    def test_file_is_deleted_with_its_last_reference(self):
+        product = create_product()
+        name, _ = self.upload_images(product, self.content, self.content)
+        images = list(ProductImage.objects.filter(product=product))
+
+        for image, refs in zip(images, [1, 0]):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.delete(
+                    reverse('product-delete-image', args=[product.pk]), {'image_id': image.pk}
+                )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(default_storage.exists(name), bool(refs))
+            self.assertEqual(StoredFile.objects.filter(refs=refs).exists(), bool(refs))
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_payment_proofs_are_shared_and_released(self):
+        receipt = b'%PDF-1.4\n' + b'x' * 500
+        orders = [create_transaction(), create_transaction()]
+        for order in orders:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('upload_payment_proof'), {
+                    'tracking_number': str(order.tracking_number),
+                    'payment_proof': SimpleUploadedFile('receipt.pdf', receipt),
+                })
+            order.refresh_from_db()
+        self.assertEqual(orders[0].payment_proof.name, orders[1].payment_proof.name)
+        self.assertEqual(len(self.stored_files('payment_proofs', private_storage())), 1)
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, 'payment_proofs')))
+
+        # Replacing one order's proof releases its reference
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('upload_payment_proof'), {
+                'tracking_number': str(orders[0].tracking_number),
+                'payment_proof': SimpleUploadedFile('receipt.pdf', receipt + b'2'),
+            })
+        self.assertEqual(StoredFile.objects.get(name=orders[1].payment_proof.name).refs, 1)
+        self.assertEqual(len(self.stored_files('payment_proofs', private_storage())), 2)
+
+    def test_chunked_upload_is_hashed_on_completion(self):
+        product = create_product()
+        upload = self.client.post(reverse('start_chunked_upload'), {
+            'purpose': 'product_image', 'filename': 'photo.png', 'size': len(self.content), 'product': product.pk,
+        }, format='json').data
+        self.client.patch(
+            reverse('chunked_upload', args=[upload['id']]), data=self.content,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET='0', HTTP_UPLOAD_TOKEN=upload['token'],
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('complete_chunked_upload', args=[upload['id']]), HTTP_UPLOAD_TOKEN=upload['token'])
+
+        name, = self.upload_images(product, self.content)
+        self.assertEqual(set(ProductImage.objects.values_list('image', flat=True)), {name})
+        self.assertEqual(StoredFile.objects.get().refs, 2)
+
+
+class FakeS3Storage(Storage):
+    """django-storages' S3Storage as far as core.storage relies on it: the same OPTIONS check, objects in a dict"""
+    def __init__(self, **settings):
+        defaults = self.get_default_settings()
+        for name, value in defaults.items():
+            if not hasattr(self, name):
+                setattr(self, name, value)
+        for name, value in settings.items():
+            if name not in defaults:
+                raise ImproperlyConfigured(f"Invalid setting '{name}'")
+            setattr(self, name, value)
+        self.objects = {}
+        self.bucket = mock.Mock()
+
+    def get_default_settings(self):
+        return {'bucket_name': None, 'location': '', 'querystring_auth': True}
+
+    def _normalize_name(self, name):
+        return name
+
+    def _save(self, name, content):
+        self.objects[name] = content.read()
+        return name
+
+    def _open(self, name, mode='rb'):
+        return ContentFile(self.objects[name], name=name)
+
+    def exists(self, name):
+        return name in self.objects
+
+    def size(self, name):
+        return len(self.objects[name])
+
+    def delete(self, name):
+        self.objects.pop(name, None)
+
+
+def load_s3_storage():
+    """core.storage.S3Storage built on FakeS3Storage, from a separate copy of the module"""
+    s3 = types.ModuleType('storages.backends.s3')
+    s3.S3Storage = FakeS3Storage
+    utils = types.ModuleType('storages.utils')
+    utils.clean_name = lambda name: name
+    fake_modules = {
+        'storages': types.ModuleType('storages'), 'storages.backends': types.ModuleType('storages.backends'),
+        'storages.backends.s3': s3, 'storages.utils': utils,
+    }
+    with mock.patch.dict(sys.modules, fake_modules):
+        spec = spec_from_file_location('core.storage_with_fake_s3', storage_module.__file__)
+        module = module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module.S3Storage
+
+
+class S3StorageTests(TestCase):
+    def setUp(self):
+        self.S3Storage = load_s3_storage()
+
+    def test_alias_option(self):
+        self.assertEqual(self.S3Storage(bucket_name='shop-media').alias, 'default')
+        self.assertEqual(self.S3Storage(alias='private', bucket_name='shop-private').alias, 'private')
+        with self.assertRaises(ImproperlyConfigured):
+            self.S3Storage(bucket='shop-media')
+
+    def test_content_is_stored_once_under_its_alias(self):
+        storage = self.S3Storage(alias='private', bucket_name='shop-private')
+        names = []
+        for _ in range(2):
+            receipt = ContentFile(b'%PDF-1.4 receipt', name='receipt.pdf')
+            receipt.sha256 = hashlib.sha256(receipt.read()).hexdigest()
+            receipt.seek(0)
+            names.append(storage.save('payment_proofs/receipt.pdf', receipt))
+
+        self.assertEqual(names[0], names[1])
+        self.assertEqual(list(storage.objects), [names[0]])
+        stored = StoredFile.objects.get()
+        self.assertEqual((stored.storage, stored.name, stored.refs), ('private', names[0], 2))
+
+        storage.delete(names[0])
+        self.assertTrue(storage.exists(names[0]))
+        storage.delete(names[0])
+        self.assertFalse(storage.exists(names[0]))
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_presigned_upload_limits_size_and_type(self):
+        storage = self.S3Storage(bucket_name='shop-media')
+        storage.presigned_upload('products/images/photo.png', 'image/png', 1234)
+        storage.bucket.meta.client.generate_presigned_post.assert_called_once_with(
+            'shop-media', 'products/images/photo.png',
+            Fields={'Content-Type': 'image/png'},
+            Conditions=[{'Content-Type': 'image/png'}, ['content-length-range', 1234, 1234]],
+            ExpiresIn=3600,
+        )
+
+
+class CachedSingletonTests(AdminClientMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        bank_details_cache.invalidate()
+        site_settings_cache.invalidate()
+
+    def test_site_settings_served_from_cache(self):
+        first = self.client.get(reverse('site-settings-list'))
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data['site_title'], 'My E-commerce Site')
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('site-settings-list'))
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_if_none_match_returns_304_without_queries(self):
+        etag = self.client.get(reverse('site-settings-list'))['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('site-settings-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_update_invalidates_site_settings(self):
+        etag = self.client.get(reverse('site-settings-list'))['ETag']
+        settings_id = SiteSettings.objects.get().pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('site-settings-detail', args=[settings_id]), {'site_title': 'New Title'}, format='json')
+        response = self.client.get(reverse('site-settings-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['site_title'], 'New Title')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_entry_from_a_read_that_raced_an_invalidation_expires(self):
+        def load_then_invalidate():
+            data = load_site_settings()
+            site_settings_cache.invalidate()  # a save landing between the read and cache.set()
+            return data
+
+        with mock.patch.object(site_settings_cache, 'loader', load_then_invalidate), \
+                mock.patch('core.cache.cache.set') as cache_set:
+            site_settings_cache.get()
+        self.assertEqual(cache_set.call_args.kwargs['timeout'], site_settings_cache.shared_ttl)
+        self.assertIsNotNone(site_settings_cache.shared_ttl)
+
+    def test_bank_details_cached_and_invalidated(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            BankDetails.objects.create(bank_name='Bank', account_name='Store', account_number='0123456789')
+        first = self.client.get(reverse('bankdetails-list'))
+        self.assertEqual(first.data[0]['account_name'], 'Store')
+        with self.assertNumQueries(0):
+            self.client.get(reverse('bankdetails-list'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BankDetails.objects.get().delete()
+        self.assertEqual(self.client.get(reverse('bankdetails-list')).data, [])
+
+
+class StockReservationTests(AdminClientMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.shirt = create_product(name='Shirt', price='15.00', quantity=5)
+        self.cap = create_product(name='Cap', price='5.00', quantity=1)
+
+    def checkout(self, *items):
+        return self.client.post(reverse('transaction-list'), {
+            'name': 'Jane Doe',
+            'email': 'jane@example.com',
+            'location': 'Lagos',
+            'phone': '08000000000',
+            'items': [{'product': product.pk, 'quantity': quantity} for product, quantity in items],
+        }, format='json')
+
+    def assertStock(self, product, quantity):
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, quantity)
+
+    def test_checkout_reserves_stock(self):
+        response = self.checkout((self.shirt, 2), (self.cap, 1))
+        self.assertEqual(response.status_code, 201)
+        self.assertStock(self.shirt, 3)
+        self.assertStock(self.cap, 0)
+        order = Transaction.objects.get()
+        self.assertTrue(order.stock_reserved)
+        self.assertGreater(order.reserved_until, timezone.now())
+
+    def test_out_of_stock_rolls_back_whole_order(self):
+        response = self.checkout((self.shirt, 2), (self.cap, 2))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Not enough stock for Cap', str(response.data['items']))
+        self.assertStock(self.shirt, 5)
+        self.assertStock(self.cap, 1)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_cancelling_releases_stock_once(self):
+        order_id = self.checkout((self.shirt, 2)).data['id']
+        for _ in range(2):
+            self.client.patch(reverse('transaction-detail', args=[order_id]), {'status': 'cancelled'}, format='json')
+        self.assertStock(self.shirt, 5)
+        self.assertFalse(Transaction.objects.get().stock_reserved)
+
+    def test_expired_reservations_are_released(self):
+        self.checkout((self.shirt, 2))
+        paid_id = self.checkout((self.shirt, 1)).data['id']
+        Transaction.objects.filter(pk=paid_id).update(status='payment_uploaded')
+        Transaction.objects.update(reserved_until=timezone.now() - timedelta(minutes=1))
+
+        call_command('release_expired_reservations', stdout=StringIO())
+        self.assertStock(self.shirt, 4)
+        self.assertEqual(
+            dict(Transaction.objects.values_list('pk', 'status')),
+            {paid_id - 1: 'cancelled', paid_id: 'payment_uploaded'},
+        )
+
+
+@skipUnless(connection.vendor == 'sqlite', 'uses the shared in-memory SQLite test database')
+class StockReservationStressTest(TransactionTestCase):
+    threads = 16
+    attempts_per_thread = 25
+    stock = 100
+
+    def test_concurrent_checkouts_never_oversell(self):
+        product = create_product(quantity=self.stock)
+        sold = []
+        errors = []
+        barrier = threading.Barrier(self.threads)
+
+        def buy():
+            barrier.wait()
+            try:
+                for _ in range(self.attempts_per_thread):
+                    while True:
+                        try:
+                            with transaction.atomic():
+                                reserve_stock([OrderItem(product_id=product.pk, quantity=1)])
+                            sold.append(1)
+                        except OutOfStock:
+                            pass
+                        except OperationalError:
+                            # SQLite's shared cache reports lock contention instead of waiting
+                            continue
+                        break
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=buy) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 0)
+        self.assertEqual(len(sold), self.stock)
+
+
+class BenchmarkHarnessTests(TemporaryMediaMixin, TestCase):
+    def test_run_benchmarks_reports_every_endpoint(self):
+        seed_products(5)
+        seed_transactions(20)
+        report = run_benchmarks(iterations=3, transports=('client',))
+
+        self.assertEqual(report['meta']['products'], 5)
+        self.assertEqual(report['meta']['transactions'], 20)
+        results = report['results']['client']
+        self.assertEqual(set(results), {
+            'products_list', 'products_page', 'product_detail', 'track_order',
+            'transaction_search', 'checkout', 'upload_images',
+        })
+        for stats in results.values():
+            self.assertEqual(stats['errors'], 0)
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+            self.assertGreater(stats['queries'], 0)
+
+    def test_run_serialization_reports_per_object_cost(self):
+        seed_products(5)
+        seed_transactions(5)
+        report = run_serialization(count_=5, rounds=1)
+        for name in ('products', 'transactions'):
+            self.assertEqual(report[name]['objects'], 5)
+            self.assertGreater(report[name]['model_serializer_us'], 0)
+            self.assertGreater(report[name]['rows_us'], 0)
+
+
+class CatalogImportExportTests(AdminClientMixin, APITestCase):
+    def import_file(self, name, content, **data):
+        upload = SimpleUploadedFile(name, content.encode())
+        return self.client.post(reverse('product-import-catalog'), {'file': upload, **data}, format='multipart')
+
+    def test_csv_import_upserts_by_sku_and_reports_errors(self):
+        create_product(sku='SKU-1', name='Old name', quantity=1)
+        content = (
+            'sku,name,category,description,price,quantity\n'
+            'SKU-1,Shirt,Tops,"Cotton, blue",15.00,7\n'
+            'SKU-2,Cap,Hats,Wool cap,8.50,3\n'
+            'SKU-3,Broken,Hats,Bad price,cheap,3\n'
+            ',No sku,Hats,Missing sku,1.00,1\n'
+            'SKU-4,Negative,Hats,Bad stock,1.00,-2\n'
+        )
+        response = self.import_file('products.csv', content)
+        self.assertEqual(response.status_code, 200)
+        report = response.data
+        self.assertEqual((report['rows'], report['created'], report['updated'], report['failed']), (5, 1, 1, 3))
+        self.assertEqual([error['line'] for error in report['errors']], [4, 5, 6])
+        self.assertIn('price', report['errors'][0]['errors'])
+        self.assertIn('sku', report['errors'][1]['errors'])
+        self.assertIn('quantity', report['errors'][2]['errors'])
+
+        shirt = Product.objects.get(sku='SKU-1')
+        self.assertEqual((shirt.name, shirt.description, shirt.quantity), ('Shirt', 'Cotton, blue', 7))
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_import_queries_per_batch(self):
+        content = 'sku,name,category,description,price,quantity\n' + ''.join(
+            f'SKU-{i},Item {i},Misc,Thing,1.00,1\n' for i in range(50)
+        )
+        # Savepoint, existing-SKU lookup, upsert, release: per batch, not per row
+        with self.assertNumQueries(4):
+            self.import_file('products.csv', content)
+
+    def test_jsonl_import_command_in_batches(self):
+        lines = [
+            json.dumps({'sku': f'SKU-{i}', 'name': f'Item {i}', 'category': 'Misc', 'description': 'Thing', 'price': 2.5, 'quantity': i})
+            for i in range(25)
+        ]
+        lines.insert(3, 'not json')
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            f.write('\n'.join(lines))
+        self.addCleanup(os.remove, f.name)
+
+        out, err = StringIO(), StringIO()
+        call_command('import_products', f.name, '--batch-size', '10', stdout=out, stderr=err)
+        self.assertIn('26 row(s): 25 created, 0 updated, 1 failed', out.getvalue())
+        self.assertIn('line 4', err.getvalue())
+        self.assertEqual(Product.objects.get(sku='SKU-24').price, Decimal('2.50'))
+
+    def test_unknown_format_is_rejected(self):
+        response = self.import_file('products.xlsx', 'whatever')
+        self.assertEqual(response.status_code, 400)
+        response = self.import_file('products.csv', 'name,price\nShirt,1\n')
+        self.assertEqual(response.data, {'error': 'The CSV header must include a sku column'})
+
+    def test_streaming_export_round_trips(self):
+        create_product(sku='SKU-1', name='Shirt', description='Cotton, "blue"', price='15.00')
+        create_product(name='No sku yet')
+
+        response = self.client.get(reverse('product-export-catalog'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        content = b''.join(response.streaming_content).decode()
+        self.assertTrue(content.startswith('id,sku,name,category,description,price,quantity\r\n'))
+        self.assertIn('"Cotton, ""blue"""', content)
+
+        Product.objects.filter(sku='SKU-1').update(name='Changed')
+        report = self.import_file('products.csv', content).data
+        self.assertEqual((report['updated'], report['failed']), (1, 1))
+        self.assertEqual(Product.objects.get(sku='SKU-1').name, 'Shirt')
+
+    def test_jsonl_export_command(self):
+        create_product(sku='SKU-1', price='15.00')
+        out = StringIO()
+        call_command('export_products', '--format', 'jsonl', stdout=out)
+        record = json.loads(out.getvalue())
+        self.assertEqual((record['sku'], record['price']), ('SKU-1', '15.00'))
+
+
+class TransactionExportTests(AdminClientMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.old = create_transaction(name='Old Order', status='delivered')
+        Transaction.objects.filter(pk=self.old.pk).update(created_at=timezone.make_aware(datetime(2026, 1, 31, 23, 0)))
+        self.paid = create_transaction(name='Paid, "VIP"', status='payment_confirmed', total_amount='120.50')
+        Transaction.objects.filter(pk=self.paid.pk).update(created_at=timezone.make_aware(datetime(2026, 2, 10, 9, 30)))
+        self.pending = create_transaction(name='Pending Order', status='pending')
+        Transaction.objects.filter(pk=self.pending.pk).update(created_at=timezone.make_aware(datetime(2026, 2, 28, 18, 0)))
+
+    def export(self, **params):
+        response = self.client.get(reverse('transaction-export'), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_filtered_by_date_range_and_status(self):
+        response, content = self.export(start='2026-02-01', end='2026-02-28')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(StringIO(content.decode())))
+        self.assertEqual(rows[0][:4], ['id', 'tracking_number', 'created_at', 'status'])
+        self.assertEqual([row[4] for row in rows[1:]], ['Paid, "VIP"', 'Pending Order'])
+        self.assertEqual(rows[1][8], '120.50')
+
+        _, content = self.export(status='pending,delivered')
+        names = [row[4] for row in csv.reader(StringIO(content.decode()))][1:]
+        self.assertEqual(names, ['Old Order', 'Pending Order'])
+
+    def test_invalid_filters(self):
+        self.assertEqual(self.client.get(reverse('transaction-export'), {'start': '02/01/2026'}).status_code, 400)
+        response = self.client.get(reverse('transaction-export'), {'start': '2026-02-30'})
+        self.assertEqual(response.data, {'error': 'start must be a date in YYYY-MM-DD format'})
+        response = self.client.get(reverse('transaction-export'), {'status': 'lost'})
+        self.assertEqual(response.data, {'error': 'Unknown status: lost'})
+        self.assertEqual(self.client.get(reverse('transaction-export'), {'file_format': 'pdf'}).status_code, 400)
+
+    def read_sheets(self, content):
+        package = zipfile.ZipFile(BytesIO(content))
+        namespace = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        workbook = ElementTree.fromstring(package.read('xl/workbook.xml'))
+        sheets = []
+        for n in range(1, len(workbook.findall('.//s:sheet', namespace)) + 1):
+            sheet = ElementTree.fromstring(package.read(f'xl/worksheets/sheet{n}.xml'))
+            sheets.append([
+                [''.join(cell.itertext()) for cell in row.findall('s:c', namespace)]
+                for row in sheet.findall('.//s:row', namespace)
+            ])
+        return sheets
+
+    def test_xlsx_export(self):
+        response, content = self.export(file_format='xlsx', status='payment_confirmed')
+        self.assertEqual(response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        [rows] = self.read_sheets(content)
+        self.assertEqual(rows[0][0], 'id')
+        self.assertEqual((rows[1][0], rows[1][4], rows[1][8]), (str(self.paid.pk), 'Paid, "VIP"', '120.50'))
+
+    def test_xlsx_continues_on_new_sheet(self):
+        with mock.patch('core.reports.XLSX_MAX_ROWS', 3):
+            _, content = self.export(file_format='xlsx')
+        sheets = self.read_sheets(content)
+        self.assertEqual([len(rows) for rows in sheets], [3, 2])
+        self.assertEqual(sheets[1][1][4], 'Pending Order')
+
+
+class DashboardTests(AdminClientMixin, APITestCase):
+    def order(self, day, status='pending', total_amount='20.00'):
+        order = create_transaction(status=status, total_amount=total_amount)
+        # created_at is auto_now_add, so move the order and its rollup to the wanted day
+        Transaction.objects.filter(pk=order.pk).update(created_at=timezone.make_aware(datetime.combine(day, datetime.min.time())))
+        rebuild_rollups()
+        return Transaction.objects.get(pk=order.pk)
+
+    def rollups(self):
+        return sorted(DailyOrderStats.objects.exclude(orders=0).values_list('day', 'status', 'orders', 'revenue'))
+
+    def assertRollupsMatchRebuild(self):
+        incremental = self.rollups()
+        rebuild_rollups()
+        self.assertEqual(incremental, self.rollups())
+
+    def test_rollups_follow_creates_updates_and_deletes(self):
+        create_transaction(total_amount='10.00')
+        order = create_transaction(total_amount='30.00')
+        self.assertEqual(self.rollups(), [(timezone.localdate(), 'pending', 2, Decimal('40.00'))])
+
+        order = Transaction.objects.get(pk=order.pk)
+        order.status = 'payment_confirmed'
+        order.save()
+        self.client.patch(reverse('transaction-detail', args=[order.pk]), {'total_amount': '35.00'}, format='json')
+        self.assertEqual(self.rollups(), [
+            (timezone.localdate(), 'payment_confirmed', 1, Decimal('35.00')),
+            (timezone.localdate(), 'pending', 1, Decimal('10.00')),
+        ])
+        self.assertRollupsMatchRebuild()
+
+        Transaction.objects.get(pk=order.pk).delete()
+        self.assertEqual(self.rollups(), [(timezone.localdate(), 'pending', 1, Decimal('10.00'))])
+
+    def test_unchanged_save_touches_no_rollups(self):
+        order = Transaction.objects.get(pk=create_transaction().pk)
+        with self.assertNumQueries(1):  # the UPDATE; the search index is unchanged too
+            order.save()
+
+    def test_deferred_fields_fall_back_to_recounting_the_day(self):
+        order = create_transaction()
+        order = Transaction.objects.only('id', 'name').get(pk=order.pk)
+        order.status = 'shipped'
+        order.save()
+        self.assertEqual(self.rollups(), [(timezone.localdate(), 'shipped', 1, Decimal('20.00'))])
+
+    def test_expired_reservation_cancellation_moves_rollup(self):
+        product = create_product(quantity=5)
+        self.client.post(reverse('transaction-list'), {
+            'name': 'Jane Doe', 'email': 'jane@example.com', 'location': 'Lagos', 'phone': '08000000000',
+            'items': [{'product': product.pk, 'quantity': 1}],
+        }, format='json')
+        Transaction.objects.update(reserved_until=timezone.now() - timedelta(minutes=1))
+        call_command('release_expired_reservations', stdout=StringIO())
+        self.assertEqual(self.rollups(), [(timezone.localdate(), 'cancelled', 1, Decimal('10.00'))])
+
+    def test_dashboard(self):
+        today = timezone.localdate()
+        yesterday = today - timedelta(days=1)
+        self.order(yesterday, 'delivered', '100.00')
+        self.order(yesterday, 'shipped', '50.00')
+        self.order(today, 'payment_confirmed', '30.00')
+        self.order(today, 'pending', '999.00')
+        self.order(today - timedelta(days=40), 'delivered', '500.00')
+        create_product(name='Almost gone', sku='SKU-1', quantity=2)
+        create_product(name='Plenty', quantity=50)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('dashboard'), {'start': str(yesterday), 'end': str(today)})
+        data = response.data
+        self.assertEqual(data['revenue'], '180.00')
+        self.assertEqual(data['paid_orders'], 3)
+        self.assertEqual(data['average_order_value'], '60.00')
+        self.assertEqual(data['orders_by_status']['pending'], 1)
+        self.assertEqual(data['orders_by_status']['delivered'], 1)
+        self.assertEqual(data['revenue_per_day'], [
+            {'day': yesterday, 'orders': 2, 'revenue': '150.00'},
+            {'day': today, 'orders': 1, 'revenue': '30.00'},
+        ])
+        self.assertEqual([product['name'] for product in data['low_stock']], ['Almost gone'])
+
+        default = self.client.get(reverse('dashboard')).data
+        self.assertEqual(len(default['revenue_per_day']), 30)
+        self.assertEqual(default['revenue'], '180.00')
+
+    def test_invalid_range(self):
+        self.assertEqual(self.client.get(reverse('dashboard'), {'start': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('dashboard'), {'start': '2026-02-01', 'end': '2026-01-01'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('dashboard'), {'start': '2020-01-01', 'end': '2026-01-01'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('dashboard'), {'start': '2026-02-30', 'end': '2026-03-01'}).status_code, 400)
+
+    def test_rebuild_command(self):
+        create_transaction()
+        DailyOrderStats.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_dashboard_rollups', stdout=out)
+        self.assertIn('1 day/status rows', out.getvalue())
+        self.assertEqual(self.rollups(), [(timezone.localdate(), 'pending', 1, Decimal('20.00'))])
+
+
+class OrderStatusTests(AdminClientMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = create_product(quantity=10)
+
+    def checkout(self, quantity=1):
+        return self.client.post(reverse('transaction-list'), {
+            'name': 'Jane Doe', 'email': 'jane@example.com', 'location': 'Lagos', 'phone': '08000000000',
+            'items': [{'product': self.product.pk, 'quantity': quantity}],
+        }, format='json').data['id']
+
+    def patch_status(self, order_id, new_status):
+        return self.client.patch(reverse('transaction-detail', args=[order_id]), {'status': new_status}, format='json')
+
+    def bulk(self, ids, new_status):
+        return self.client.post(reverse('transaction-bulk-status'), {'ids': ids, 'status': new_status}, format='json')
+
+    def events(self, order_id):
+        return list(OrderStatusEvent.objects.filter(transaction_id=order_id).values_list('from_status', 'to_status'))
+
+    def rollups(self):
+        return sorted(DailyOrderStats.objects.exclude(orders=0).values_list('day', 'status', 'orders', 'revenue'))
+
+    def test_changes_are_recorded(self):
+        order_id = self.checkout()
+        self.assertEqual(self.patch_status(order_id, 'payment_confirmed').status_code, 200)
+        self.assertEqual(self.patch_status(order_id, 'shipped').status_code, 200)
+        self.patch_status(order_id, 'shipped')  # unchanged, not recorded
+        self.assertEqual(self.events(order_id), [('pending', 'payment_confirmed'), ('payment_confirmed', 'shipped')])
+
+        response = self.client.get(reverse('transaction-history', args=[order_id]))
+        self.assertEqual([event['to_status'] for event in response.data], ['payment_confirmed', 'shipped'])
+
+    def test_invalid_changes_are_rejected(self):
+        order_id = self.checkout()
+        response = self.patch_status(order_id, 'delivered')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['status'], ['Cannot change status from pending to delivered'])
+
+        self.patch_status(order_id, 'cancelled')
+        self.assertEqual(self.patch_status(order_id, 'pending').status_code, 400)
+        self.assertEqual(Transaction.objects.get().status, 'cancelled')
+        self.assertEqual(self.events(order_id), [('pending', 'cancelled')])
+
+    def test_payment_proof_needs_an_open_order(self):
+        order = Transaction.objects.get(pk=self.checkout())
+        Transaction.objects.filter(pk=order.pk).update(status='shipped')
+        proof = SimpleUploadedFile('proof.pdf', b'%PDF-1.4 proof', content_type='application/pdf')
+        response = self.client.post(reverse('upload_payment_proof'), {
+            'tracking_number': order.tracking_number, 'payment_proof': proof,
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Transaction.objects.get().status, 'shipped')
+
+    def test_bulk_change_uses_constant_queries(self):
+        def run(count, new_status):
+            ids = [create_transaction().pk for _ in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.bulk(ids, new_status)
+            self.assertEqual(response.data, {'updated': count})
+            return len(queries)
+
+        run(1, 'payment_confirmed')  # creates the day's rollup row
+        self.assertEqual(run(3, 'payment_confirmed'), run(30, 'payment_confirmed'))
+        self.assertEqual(Transaction.objects.filter(status='payment_confirmed').count(), 34)
+        self.assertEqual(OrderStatusEvent.objects.filter(to_status='payment_confirmed').count(), 34)
+
+    def test_bulk_change_is_all_or_nothing(self):
+        pending = create_transaction()
+        delivered = create_transaction(status='delivered')
+        response = self.bulk([pending.pk, delivered.pk, 999999], 'cancelled')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['orders'], [{'id': delivered.pk, 'status': 'delivered'}])
+        self.assertEqual(response.data['missing'], [999999])
+        self.assertEqual(Transaction.objects.get(pk=pending.pk).status, 'pending')
+        self.assertFalse(OrderStatusEvent.objects.exists())
+
+        self.assertEqual(self.bulk('1,2', 'shipped').status_code, 400)
+        self.assertEqual(self.bulk([pending.pk], 'lost').status_code, 400)
+
+    def test_bulk_cancel_releases_stock_and_moves_rollups(self):
+        ids = [self.checkout(2), self.checkout(3)]
+        shipped = create_transaction(total_amount='50.00')
+        self.bulk([shipped.pk], 'payment_confirmed')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.bulk(ids + [shipped.pk], 'cancelled')
+        self.assertEqual(response.data, {'updated': 3})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 10)
+        self.assertFalse(Transaction.objects.filter(stock_reserved=True).exists())
+
+        incremental = self.rollups()
+        self.assertEqual([row[1:3] for row in incremental], [('cancelled', 3)])
+        rebuild_rollups()
+        self.assertEqual(incremental, self.rollups())
+
+    def test_expired_reservation_is_recorded(self):
+        order_id = self.checkout()
+        Transaction.objects.update(reserved_until=timezone.now() - timedelta(minutes=1))
+        call_command('release_expired_reservations', stdout=StringIO())
+        self.assertEqual(self.events(order_id), [('pending', 'cancelled')])
+
+    def test_events_cannot_be_changed(self):
+        order_id = self.checkout()
+        self.patch_status(order_id, 'cancelled')
+        event = OrderStatusEvent.objects.get()
+        event.to_status = 'delivered'
+        with self.assertRaises(ValueError):
+            event.save()
+
+
+class AdminTokenTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def verify(self, token):
+        return self.client.post(reverse('verify_admin'), {'token': token}, format='json')
+
+    def test_only_a_keyed_hash_is_stored(self):
+        admin_token, token = create_token()
+        self.assertEqual(admin_token.token_hash, hash_token(token))
+        self.assertNotIn(token, str(AdminToken.objects.values_list().get()))
+        self.assertEqual(admin_token.prefix, token[:8])
+        self.assertTrue(admin_token.is_valid())
+
+    def test_verify_is_cached(self):
+        _, token = create_token()
+        with self.assertNumQueries(1):
+            self.assertTrue(self.verify(token).data['valid'])
+        with self.assertNumQueries(0):
+            self.assertTrue(self.verify(token).data['valid'])
+
+    def test_unknown_tokens_are_negatively_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.verify('guess').status_code, 401)
+        with self.assertNumQueries(0):
+            response = self.verify('guess')
+        self.assertEqual(response.data, {'valid': False, 'message': 'Invalid token'})
+
+    def test_cached_token_expires_on_time(self):
+        _, token = create_token(expires_at=timezone.now() + timedelta(seconds=30))
+        self.assertTrue(self.verify(token).data['valid'])
+        with mock.patch('core.tokens.time.time', return_value=time.time() + 31):
+            response = self.verify(token)
+        self.assertEqual(response.data, {'valid': False, 'message': 'Token expired'})
+
+    def test_deleting_a_token_drops_the_cached_entry(self):
+        admin_token, token = create_token()
+        self.assertTrue(self.verify(token).data['valid'])
+        with self.captureOnCommitCallbacks(execute=True):
+            admin_token.delete()
+        self.assertEqual(self.verify(token).status_code, 401)
+
+    def test_authentication_class_protects_admin_endpoints(self):
+        create_transaction()
+        self.assertEqual(self.client.get(reverse('transaction-list')).status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION='Token wrong')
+        response = self.client.get(reverse('transaction-list'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+        _, token = create_token()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        self.client.get(reverse('transaction-list'))
+        with self.assertNumQueries(2):  # the transactions and their items; the token comes from cache
+            self.assertEqual(self.client.get(reverse('transaction-list')).status_code, 200)
+
+    def test_public_endpoints_stay_open(self):
+        product = create_product()
+        self.assertEqual(self.client.get(reverse('product-list')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('product-detail', args=[product.pk])).status_code, 200)
+        self.assertEqual(self.client.get(reverse('site-settings-list')).status_code, 200)
+        self.assertEqual(self.client.delete(reverse('product-detail', args=[product.pk])).status_code, 401)
+
+    def test_purge_expired_tokens_in_batches(self):
+        expired = timezone.now() - timedelta(days=1)
+        for _ in range(5):
+            create_token(expires_at=expired)
+        live, _ = create_token()
+        out = StringIO()
+        call_command('purge_admin_tokens', '--batch-size', '2', stdout=out)
+        self.assertIn('Purged 5 expired admin token(s)', out.getvalue())
+        self.assertEqual(list(AdminToken.objects.all()), [live])
+
+
+@override_settings(RATE_LIMITS={'track_order': '3/min', 'upload_payment_proof': '2/hour'}, RATE_LIMIT_CLIENTS={})
+class RateLimitTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.order = create_transaction()
+
+    def track(self, name='track_order', ip='203.0.113.1', **extra):
+        return self.client.get(reverse(name), {'tracking_number': str(self.order.tracking_number)}, REMOTE_ADDR=ip, **extra)
+
+    def test_rejected_requests_cost_no_queries(self):
+        for _ in range(3):
+            self.assertEqual(self.track().status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.track()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json(), {'error': 'Too many requests, please try again later'})
+        self.assertEqual(response['Retry-After'], '20')
+
+    def test_buckets_are_per_client_and_refill(self):
+        for _ in range(3):
+            self.track()
+        self.assertEqual(self.track().status_code, 429)
+        self.assertEqual(self.track(ip='203.0.113.2').status_code, 200)
+        with mock.patch('core.ratelimit.time.time', return_value=time.time() + 20):
+            self.assertEqual(self.track().status_code, 200)
+            self.assertEqual(self.track().status_code, 429)
+
+    def test_sync_and_async_endpoints_share_a_bucket(self):
+        for _ in range(3):
+            self.assertEqual(self.track('async_track_order').status_code, 200)
+        self.assertEqual(self.track('async_track_order').status_code, 429)
+        self.assertEqual(self.track().status_code, 429)
+
+    def test_client_overrides(self):
+        with override_settings(RATE_LIMIT_CLIENTS={'203.0.113.1': {'track_order': None}}):
+            for _ in range(5):
+                self.assertEqual(self.track().status_code, 200)
+
+    def test_forwarded_for_is_only_trusted_behind_proxies(self):
+        for i in range(3):
+            self.track(HTTP_X_FORWARDED_FOR=f'198.51.100.{i}')
+        self.assertEqual(self.track(HTTP_X_FORWARDED_FOR='198.51.100.9').status_code, 429)
+        with override_settings(RATE_LIMIT_PROXIES=1):
+            self.assertEqual(self.track(HTTP_X_FORWARDED_FOR='198.51.100.9').status_code, 200)
+
+    def test_payment_proof_uploads_are_limited(self):
+        data = {'tracking_number': str(self.order.tracking_number)}
+        self.assertEqual(self.client.post(reverse('upload_payment_proof'), data).status_code, 200)
+        start = {'purpose': 'payment_proof', 'filename': 'receipt.pdf', 'size': 10, **data}
+        self.assertEqual(self.client.post(reverse('start_chunked_upload'), start, format='json').status_code, 201)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.post(reverse('upload_payment_proof'), data).status_code, 429)
+            self.assertEqual(self.client.post(reverse('start_chunked_upload'), start, format='json').status_code, 429)
+
+    def test_unknown_tracking_numbers_are_cached(self):
+        unknown = str(uuid4())
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('track_order'), {'tracking_number': unknown})
+        self.assertEqual(response.status_code, 400)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('track_order'), {'tracking_number': unknown}).status_code, 400)
+            self.assertEqual(self.client.get(reverse('async_track_order'), {'tracking_number': unknown}).status_code, 400)
+            response = self.client.post(reverse('upload_payment_proof'), {'tracking_number': unknown})
+        self.assertEqual(response.json(), {'error': 'Invalid tracking number'})
+
+    def test_malformed_tracking_numbers_skip_the_database(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('track_order'), {'tracking_number': 'not-a-uuid'})
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(find_spec('uvicorn'), 'uvicorn is not installed')
+@override_settings(ALLOWED_HOSTS=['*'], RATE_LIMITS={})
+class ConcurrencyBenchmarkTests(TransactionTestCase):
+    def test_sync_and_async_endpoints_under_uvicorn(self):
+        seed_products(3)
+        seed_transactions(10)
+        report = run_concurrency(concurrency=2, duration=0.2)
+
+        for mode in ('sync', 'async'):
+            results = report['results'][mode]
+            self.assertEqual(set(results), {'track_order', 'product_detail', 'products_list', 'site_settings'})
+            for stats in results.values():
+                self.assertGreater(stats['requests'], 0)
+                self.assertEqual(stats['errors'], 0)
+
+    def test_checkout_throughput_per_connection_profile(self):
+        seed_products(3)
+        settings_dict = dict(connection.settings_dict)
+        opened = []
+
+        def remember(sender, connection, **kwargs):
+            if threading.current_thread() is not threading.main_thread():
+                opened.append(connection)
+
+        connection_created.connect(remember)
+        try:
+            report = run_write_concurrency(threads=2, duration=0.3)
+        finally:
+            connection_created.disconnect(remember)
+            # Django never closes connections to the in-memory test database; one left
+            # holding a table lock would block the tests that follow
+            for worker_connection in opened:
+                if worker_connection.connection is not None:
+                    worker_connection.connection.close()
+
+        self.assertEqual(set(report['results']), {'default', 'configured'})
+        for stats in report['results'].values():
+            self.assertGreater(stats['checkouts'], 0)
+        # The shared in-memory test database may fail a response's reads after its order committed
+        self.assertGreaterEqual(Transaction.objects.count(), sum(stats['checkouts'] for stats in report['results'].values()))
+        self.assertEqual(dict(connection.settings_dict), settings_dict)
+
+
+@override_settings(RATE_LIMITS={})
+class BenchmarkVariantWorkerTests(TemporaryMediaMixin, TransactionTestCase):
+    @override_settings(IMAGE_VARIANTS_ASYNC=True)
+    def test_write_concurrency_after_upload_scenario(self):
+        seed_products(3)
+        opened, closed = [], set()
+
+        def remember(sender, connection, **kwargs):
+            if threading.current_thread() is not threading.main_thread():
+                opened.append((threading.current_thread().name, connection))
+
+        wrapper_class = type(connections['default'])
+        close = wrapper_class.close
+
+        def record_close(wrapper):
+            closed.add(threading.current_thread().name)
+            close(wrapper)
+
+        connection_created.connect(remember)
+        try:
+            # The shared in-memory test database fails a worker's write that overlaps the next
+            # upload instead of waiting; the worker still has to close its connection
+            with mock.patch.object(wrapper_class, 'close', record_close), \
+                    mock.patch.object(logging.getLogger('core.images'), 'disabled', True):
+                uploads = run_benchmarks(iterations=1, scenarios=['upload_images'], transports=('client',))
+                report = run_write_concurrency(threads=2, duration=0.2)
+        finally:
+            connection_created.disconnect(remember)
+            # See test_checkout_throughput_per_connection_profile
+            for _, worker_connection in opened:
+                if worker_connection.connection is not None:
+                    worker_connection.connection.close()
+
+        self.assertEqual(uploads['results']['client']['upload_images']['errors'], 0)
+        variant_threads = {name for name, _ in opened if name.startswith('image-variants')}
+        self.assertTrue(variant_threads)
+        # A variant worker left holding its connection locks out the journal mode switch
+        self.assertLessEqual(variant_threads, closed)
+        for stats in report['results'].values():
+            self.assertGreater(stats['checkouts'], 0)
+
+
+@override_settings(METRICS_ENABLED=True)
+class MetricsMiddlewareTests(APITestCase):
+    def setUp(self):
+        metrics_registry.reset()
+
+    def test_server_timing_header(self):
+        product = create_product()
+        ProductImage.objects.create(product=product, image='products/images/a.jpg')
+        response = self.client.get(reverse('product-list'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="2 queries", serialize;dur=[\d.]+$')
+
+    def test_prometheus_endpoint(self):
+        self.client.get(reverse('product-list'))
+        self.client.get(reverse('product-list'))
+        self.client.get(reverse('track_order'), {'tracking_number': str(uuid4())})
+
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        _, token = create_token()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('shop_request_duration_seconds_bucket{view="product-list",method="GET",le="+Inf"} 2', body)
+        self.assertIn('shop_request_duration_seconds_count{view="track_order",method="GET"} 1', body)
+        self.assertIn('shop_db_queries_total{view="product-list",method="GET"} 2', body)
+        self.assertIn('# TYPE shop_response_bytes_total counter', body)
+
+    def test_threads_record_into_separate_collectors(self):
+        stats = RequestMetrics()
+        stats.queries = 1
+        workers = [
+            threading.Thread(target=metrics_registry.record, args=('view', 'GET', 0.01, stats, 10))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        metrics_registry.record('view', 'GET', 0.01, stats, 10)
+        merged = metrics_registry.snapshot()[('view', 'GET')]
+        self.assertEqual((merged.count, merged.queries, merged.response_bytes), (5, 5, 50))
+
+    async def test_async_view_queries_are_counted(self):
+        product = await sync_to_async(create_product)()
+        await ProductImage.objects.acreate(product=product, image='products/images/a.jpg')
+        response = await self.async_client.get(reverse('async_product_list'))
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+        stats = metrics_registry.snapshot()[('async_product_list', 'GET')]
+        self.assertEqual((stats.count, stats.queries), (1, 2))
+
+
+class MetricsDisabledTests(APITestCase):
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('product-list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+
+class AsyncEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        site_settings_cache.invalidate()
+        self.product = create_product(name='Shirt', price='15.00')
+        ProductImage.objects.create(product=self.product, image='products/images/a.jpg')
+        self.transaction = create_transaction()
+        OrderItem.objects.create(
+            transaction=self.transaction, product=self.product, product_name='Shirt', unit_price='15.00', quantity=1
+        )
+
+    async def test_product_list_matches_sync_view(self):
+        response = await self.async_client.get(reverse('async_product_list'))
+        self.assertEqual(response.status_code, 200)
+        expected = await self.async_client.get(reverse('product-list'))
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(response.json()[0]['primary_image']['image'], '/media/products/images/a.jpg')
+
+    async def test_product_list_projection(self):
+        response = await self.async_client.get(reverse('async_product_list'), {'fields': 'id,name'})
+        self.assertEqual(response.json(), [{'id': self.product.pk, 'name': 'Shirt'}])
+
+    async def test_product_detail(self):
+        response = await self.async_client.get(reverse('async_product_detail', args=[self.product.pk]))
+        expected = await self.async_client.get(reverse('product-detail', args=[self.product.pk]))
+        self.assertEqual(response.json(), expected.json())
+
+        missing = await self.async_client.get(reverse('async_product_detail', args=[self.product.pk + 1]))
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_track_order(self):
+        response = await self.async_client.get(
+            reverse('async_track_order'), {'tracking_number': str(self.transaction.tracking_number)}
+        )
+        expected = await self.async_client.get(
+            reverse('track_order'), {'tracking_number': str(self.transaction.tracking_number)}
+        )
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(response.json()['items'][0]['product_name'], 'Shirt')
+
+        for tracking_number in (str(uuid4()), 'not-a-uuid'):
+            response = await self.async_client.get(reverse('async_track_order'), {'tracking_number': tracking_number})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'error': 'Invalid tracking number'})
+
+    async def test_site_settings_etag(self):
+        response = await self.async_client.get(reverse('async_site_settings'))
+        self.assertEqual(response.json()['site_title'], 'My E-commerce Site')
+        cached = await self.async_client.get(reverse('async_site_settings'), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+    async def test_read_only(self):
+        response = await self.async_client.post(reverse('async_product_list'), {})
+        self.assertEqual(response.status_code, 405)
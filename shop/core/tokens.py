@@ -0,0 +1,86 @@
+# core/tokens.py
+"""
+Admin tokens: only an HMAC-SHA256 of each token is stored, and lookups
+are cached in the Django cache. Valid tokens are cached until they expire
+(at most POSITIVE_TTL), unknown ones for NEGATIVE_TTL so repeated bad
+guesses don't reach the database either. core.signals drops the cached
+entry when a token is saved or deleted.
+"""
+
+import secrets
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+from .models import AdminToken
+
+POSITIVE_TTL = 300
+NEGATIVE_TTL = 60
+PURGE_BATCH_SIZE = 1000
+MISSING = 'missing'
+
+
+def hash_token(token):
+    # Tokens are long random strings, so a keyed hash is enough; no slow KDF needed
+    return salted_hmac('core.AdminToken', token, algorithm='sha256').hexdigest()
+
+
+def generate_token():
+    return secrets.token_urlsafe(32)
+
+
+def create_token(**kwargs):
+    """Create and return (AdminToken, plaintext token); the plaintext is not stored anywhere"""
+    token = generate_token()
+    admin_token = AdminToken.objects.create(token_hash=hash_token(token), prefix=token[:8], **kwargs)
+    return admin_token, token
+
+
+def cache_key(token_hash):
+    return f'core:admin-token:{token_hash}'
+
+
+def check_token(token):
+    """
+    Return (token id, expires_at) for a valid token, or (None, reason) where
+    reason is 'Invalid token' or 'Token expired'.
+    """
+    if not token or not isinstance(token, str):
+        return None, 'Invalid token'
+    token_hash = hash_token(token)
+    key = cache_key(token_hash)
+    cached = cache.get(key)
+    if cached is None:
+        row = AdminToken.objects.filter(token_hash=token_hash).values_list('pk', 'expires_at').first()
+        if row is None:
+            cached = MISSING
+            cache.set(key, cached, NEGATIVE_TTL)
+        else:
+            cached = (row[0], row[1].timestamp())
+            remaining = cached[1] - time.time()
+            if remaining > 0:
+                cache.set(key, cached, min(POSITIVE_TTL, remaining))
+
+    if cached == MISSING:
+        return None, 'Invalid token'
+    token_id, expires_at = cached
+    if expires_at <= time.time():
+        return None, 'Token expired'
+    return token_id, expires_at
+
+
+def forget(token_hash):
+    cache.delete(cache_key(token_hash))
+
+
+def purge_expired_tokens(batch_size=PURGE_BATCH_SIZE):
+    """Delete expired tokens a batch at a time so the table is never locked for long"""
+    purged = 0
+    now = timezone.now()
+    while True:
+        batch = list(AdminToken.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return purged
+        purged += AdminToken.objects.filter(pk__in=batch).delete()[0]
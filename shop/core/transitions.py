@@ -0,0 +1,92 @@
+# core/transitions.py
+"""
+Order status changes.
+
+Transaction.STATUS_TRANSITIONS says where each status may go. The API
+checks it (TransactionSerializer, the payment proof uploads), and every
+change is appended to OrderStatusEvent: by core.signals when an order is
+saved, and here for changes made with QuerySet.update().
+
+change_statuses() moves many orders at once: one conditional UPDATE per
+current status, one bulk_create of events, and the stock and dashboard
+rollup updates the per-order signals would have made, batched.
+"""
+
+from django.db import transaction as db_transaction
+
+from .inventory import release_orders_stock
+from .models import OrderStatusEvent, Transaction
+from .rollups import statuses_changed
+from .versions import bump as bump_version
+
+MAX_BULK_ORDERS = 10000
+
+
+class TransitionError(Exception):
+    def __init__(self, message, orders=(), missing=()):
+        super().__init__(message)
+        self.message = message
+        self.orders = list(orders)  # [{'id': ..., 'status': ...}] of orders that can't make the change
+        self.missing = list(missing)
+
+
+def status_saved(order, created):
+    """Record the status change of a saved order"""
+    old_status = None if created else getattr(order, '_loaded_status', None)
+    if old_status is not None and old_status != order.status:
+        OrderStatusEvent.objects.create(transaction=order, from_status=old_status, to_status=order.status)
+    order._loaded_status = order.status
+
+
+def check_status_change(order, new_status):
+    error = Transaction.status_change_error(order.status, new_status)
+    if error:
+        raise TransitionError(error, [{'id': order.pk, 'status': order.status}])
+
+
+def change_statuses(ids, new_status):
+    """
+    Move the orders with these ids to new_status, all or none. Orders
+    already there are left alone. Returns how many orders changed.
+    """
+    if new_status not in Transaction.STATUS_TRANSITIONS:
+        raise TransitionError(f'Unknown status {new_status}')
+    ids = set(ids)
+    if len(ids) > MAX_BULK_ORDERS:
+        raise TransitionError(f'At most {MAX_BULK_ORDERS} orders can be changed at once')
+
+    with db_transaction.atomic():
+        orders = list(
+            Transaction.objects.select_for_update().filter(pk__in=ids)
+            .values('id', 'status', 'created_at', 'total_amount')
+        )
+        missing = ids - {order['id'] for order in orders}
+        blocked = [
+            {'id': order['id'], 'status': order['status']} for order in orders
+            if Transaction.status_change_error(order['status'], new_status)
+        ]
+        if missing or blocked:
+            raise TransitionError(
+                f'Some orders cannot be changed to {new_status}',
+                sorted(blocked, key=lambda order: order['id']), sorted(missing),
+            )
+
+        moving = [order for order in orders if order['status'] != new_status]
+        by_status = {}
+        for order in moving:
+            by_status.setdefault(order['status'], []).append(order['id'])
+        for old_status, order_ids in by_status.items():
+            # Conditional on the status read above, in case the database took no row locks (SQLite)
+            if Transaction.objects.filter(pk__in=order_ids, status=old_status).update(status=new_status) != len(order_ids):
+                raise TransitionError('Some orders changed while they were being updated, please try again')
+
+        OrderStatusEvent.objects.bulk_create(
+            OrderStatusEvent(transaction_id=order['id'], from_status=order['status'], to_status=new_status)
+            for order in moving
+        )
+        statuses_changed(moving, new_status)
+        if new_status == 'cancelled':
+            release_orders_stock([order['id'] for order in moving])
+        if moving:
+            bump_version(Transaction)
+    return len(moving)
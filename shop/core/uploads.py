@@ -0,0 +1,261 @@
+# core/uploads.py
+
+import os
+import secrets
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .dedup import hash_file
+from .gallery import GalleryError, add_images
+from .models import ProductImage, Transaction, UploadSession
+from .storage import supports_direct_upload
+from .transitions import TransitionError, check_status_change
+
+READ_SIZE = 64 * 1024  # bytes read from the request stream at a time
+
+MAX_SIZES = {
+    'payment_proof': 10 * 1024 * 1024,
+    'product_image': 5 * 1024 * 1024,  # same limit as validate_image_size
+}
+ALLOWED_TYPES = {
+    'payment_proof': ('jpeg', 'png', 'pdf'),
+    'product_image': ('jpeg', 'png'),
+}
+EXTENSIONS = {
+    'jpg': 'jpeg',
+    'jpeg': 'jpeg',
+    'png': 'png',
+    'pdf': 'pdf',
+}
+MAGIC_BYTES = {
+    'jpeg': b'\xff\xd8\xff',
+    'png': b'\x89PNG\r\n\x1a\n',
+    'pdf': b'%PDF-',
+}
+MAGIC_LENGTH = max(len(magic) for magic in MAGIC_BYTES.values())
+CONTENT_TYPES = {
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'pdf': 'application/pdf',
+}
+# The model field each purpose's files end up in
+FIELDS = {
+    'payment_proof': Transaction._meta.get_field('payment_proof'),
+    'product_image': ProductImage._meta.get_field('image'),
+}
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def upload_dir():
+    path = settings.CHUNKED_UPLOAD_TEMP_DIR
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def part_path(session):
+    return os.path.join(upload_dir(), f'{session.pk}.part')
+
+
+def file_type(filename):
+    return EXTENSIONS.get(os.path.splitext(filename)[1].lower().lstrip('.'))
+
+
+def target_storage(session):
+    return FIELDS[session.purpose].storage
+
+
+def hash_upload_token(token):
+    return salted_hmac('core.UploadSession', token, algorithm='sha256').hexdigest()
+
+
+def start_upload(purpose, filename, size, transaction=None, product=None, direct=False):
+    """
+    Start a chunked upload, or with direct a presigned one that the client
+    sends straight to storage (see direct_upload_form). Returns (session,
+    token); the token is needed for every later request and is not stored.
+    """
+    if purpose not in MAX_SIZES:
+        raise UploadError('Unknown upload purpose')
+    if file_type(filename) not in ALLOWED_TYPES[purpose]:
+        raise UploadError(f'File type not allowed. Allowed extensions: {", ".join(ALLOWED_TYPES[purpose])}', 415)
+    if size <= 0:
+        raise UploadError('File is empty')
+    if size > MAX_SIZES[purpose]:
+        raise UploadError(f'File size cannot exceed {MAX_SIZES[purpose] // (1024 * 1024)}MB', 413)
+
+    key = ''
+    if direct:
+        field = FIELDS[purpose]
+        if not supports_direct_upload(field.storage):
+            raise UploadError('Direct uploads are not supported by this storage')
+        # A fresh name, so a direct upload can never overwrite another file
+        key = field.generate_filename(None, f'{uuid.uuid4().hex}.{file_type(filename)}')
+
+    token = secrets.token_urlsafe(32)
+    session = UploadSession.objects.create(
+        purpose=purpose,
+        filename=os.path.basename(filename),
+        size=size,
+        transaction=transaction,
+        product=product,
+        key=key,
+        token_hash=hash_upload_token(token),
+    )
+    if not direct:
+        open(part_path(session), 'wb').close()
+    return session, token
+
+
+def find_upload(upload_id, token, now=None):
+    """
+    The session started with token. Unknown ids and wrong tokens are both
+    404; an expired session is discarded and reported as 410.
+    """
+    session = UploadSession.objects.filter(pk=upload_id).first()
+    if session is None or not token or not constant_time_compare(session.token_hash, hash_upload_token(token)):
+        raise UploadError('Upload not found', 404)
+    if session.expires_at <= (now or timezone.now()):
+        abort_upload(session)
+        raise UploadError('Upload has expired', 410)
+    return session
+
+
+def direct_upload_form(session):
+    """{'url': ..., 'fields': {...}} for the client to POST the file to"""
+    return target_storage(session).presigned_upload(
+        session.key, CONTENT_TYPES[file_type(session.filename)], session.size,
+    )
+
+
+def abort_upload(session):
+    if session.key:
+        target_storage(session).delete(session.key)
+    else:
+        try:
+            os.remove(part_path(session))
+        except FileNotFoundError:
+            pass
+    session.delete()
+
+
+def check_magic(session, head):
+    expected = MAGIC_BYTES[file_type(session.filename)]
+    if not head.startswith(expected[:len(head)]):
+        raise UploadError('File content does not match its extension', 415)
+
+
+def write_chunk(session, offset, stream, content_length=None):
+    """
+    Append a chunk read from stream at offset, READ_SIZE bytes at a time.
+    Oversized or mislabelled files are rejected as soon as the offending
+    bytes arrive and the upload is discarded.
+    """
+    if session.key:
+        raise UploadError('This upload goes directly to storage', 409)
+    if offset != session.received:
+        raise UploadError(f'Expected offset {session.received}', 409)
+    if content_length is not None and offset + content_length > session.size:
+        abort_upload(session)
+        raise UploadError('Chunk goes past the declared file size', 413)
+
+    received = offset
+    head = b''
+    try:
+        with open(part_path(session), 'r+b') as part:
+            if offset < MAGIC_LENGTH:
+                # Resuming inside the signature; re-read what we already have
+                head = part.read(offset)
+            part.seek(offset)
+            while True:
+                data = stream.read(READ_SIZE)
+                if not data:
+                    break
+                received += len(data)
+                if received > session.size:
+                    raise UploadError('Chunk goes past the declared file size', 413)
+                if received - len(data) < MAGIC_LENGTH:
+                    head += data[:MAGIC_LENGTH - len(head)]
+                    check_magic(session, head)
+                part.write(data)
+            part.truncate()
+    except UploadError:
+        abort_upload(session)
+        raise
+
+    session.received = received
+    session.save(update_fields=['received'])
+    return received
+
+
+def attach(session, upload):
+    """Attach an uploaded file, or the storage name of one, to the session's target"""
+    if session.purpose == 'payment_proof':
+        result = session.transaction
+        try:
+            check_status_change(result, 'payment_uploaded')
+        except TransitionError as e:
+            raise UploadError(e.message)
+        result.payment_proof = upload
+        result.status = 'payment_uploaded'
+        result.save()
+        return result
+    try:
+        return add_images(session.product, [upload])[0]
+    except GalleryError as e:
+        raise UploadError(str(e))
+
+
+def complete_direct_upload(session):
+    """Check what the client put in storage and record it; the bytes stay where they are"""
+    storage = target_storage(session)
+    if not storage.exists(session.key):
+        raise UploadError('File has not been uploaded yet', 409)
+    try:
+        if storage.size(session.key) != session.size:
+            raise UploadError('Uploaded file does not match the declared size', 413)
+        check_magic(session, storage.read_head(session.key, MAGIC_LENGTH))
+        result = attach(session, session.key)
+    except UploadError:
+        abort_upload(session)
+        raise
+    session.delete()
+    return result
+
+
+def complete_upload(session):
+    """Move a fully received upload into storage and attach it to its target"""
+    if session.key:
+        return complete_direct_upload(session)
+    if session.received != session.size:
+        raise UploadError(f'Upload incomplete: {session.received} of {session.size} bytes received', 409)
+
+    path = part_path(session)
+    with open(path, 'rb') as part:
+        if session.received < MAGIC_LENGTH:
+            check_magic(session, part.read(MAGIC_LENGTH))
+            part.seek(0)
+        upload = File(part, name=session.filename)
+        # Chunks arrive over many requests, so the hash is taken here rather than as they stream in
+        hash_file(upload)
+        result = attach(session, upload)
+
+    os.remove(path)
+    session.delete()
+    return result
+
+
+def purge_expired_uploads(now=None):
+    expired = list(UploadSession.objects.filter(expires_at__lte=now or timezone.now()))
+    for session in expired:
+        abort_upload(session)
+    return len(expired)
@@ -2,7 +2,8 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter # type: ignore
-from .views import ProductViewSet, TransactionViewSet, BankDetailsViewSet, SiteSettingsViewSet, verify_admin, upload_payment_proof, track_order
+from . import async_views
+from .views import ProductViewSet, TransactionViewSet, BankDetailsViewSet, SiteSettingsViewSet, verify_admin, upload_payment_proof, track_order, start_chunked_upload, chunked_upload, complete_chunked_upload, storage_upload, storage_download, dashboard, metrics
 
 router = DefaultRouter()
 router.register(r'products', ProductViewSet)
@@ -15,4 +16,15 @@ urlpatterns = [
     path('api/verify-admin/', verify_admin, name='verify_admin'),
     path('api/upload-payment-proof/', upload_payment_proof, name='upload_payment_proof'),
     path('api/track-order/', track_order, name='track_order'),
+    path('api/uploads/', start_chunked_upload, name='start_chunked_upload'),
+    path('api/uploads/<uuid:upload_id>/', chunked_upload, name='chunked_upload'),
+    path('api/uploads/<uuid:upload_id>/complete/', complete_chunked_upload, name='complete_chunked_upload'),
+    path('api/storage/upload/', storage_upload, name='storage_upload'),
+    path('api/storage/<str:token>/', storage_download, name='storage_download'),
+    path('api/dashboard/', dashboard, name='dashboard'),
+    path('api/metrics/', metrics, name='metrics'),
+    path('api/async/products/', async_views.product_list, name='async_product_list'),
+    path('api/async/products/<int:pk>/', async_views.product_detail, name='async_product_detail'),
+    path('api/async/track-order/', async_views.track_order, name='async_track_order'),
+    path('api/async/site-settings/', async_views.site_settings, name='async_site_settings'),
 ]
\ No newline at end of file
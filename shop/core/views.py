@@ -1,17 +1,79 @@
 # core/views.py 
 
 from rest_framework import viewsets, status 
-from rest_framework.decorators import api_view, action 
+from rest_framework.decorators import api_view, action, authentication_classes, permission_classes
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response 
-from .models import Product, ProductImage, Transaction, BankDetails, AdminToken, SiteSettings
-from .serializers import ProductSerializer, ProductImageSerializer, TransactionSerializer, BankDetailsSerializer, SiteSettingsSerializer
-from django.shortcuts import get_object_or_404
-from django.core.mail import send_mail
+from .models import Product, ProductImage, Transaction, BankDetails, SiteSettings
+from .serializers import ProductSerializer, ProductImageSerializer, TransactionSerializer, OrderStatusEventSerializer, BankDetailsSerializer, SiteSettingsSerializer, requested_fields
+from .pagination import ProductCursorPagination, TransactionCursorPagination
 from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
+from .outbox import queue_email
+from .search import search_transactions
+from .metrics import registry as metrics_registry
+from .cache import bank_details_cache, cached_response, site_settings_cache
+from .gallery import MAX_IMAGES, GalleryError, add_images, delete_image, set_primary
+from .catalog import FORMATS, ImportFormatError, export_products, file_format, import_products
+from .rollups import DEFAULT_DAYS, MAX_DAYS, dashboard as dashboard_data
+from .reports import CONTENT_TYPES, FORMATS as REPORT_FORMATS, ReportError, report_queryset, stream_report
+from .rows import RowListMixin, product_rows, transaction_rows
+from .ratelimit import RateLimit, rate_limit, remember_unknown_tracking_number, too_many_requests, unknown_tracking_number
+from .tokens import check_token
+from .versions import VersionedListMixin
+from .storage import read_signed
+from .transitions import TransitionError, change_statuses, check_status_change
+from .uploads import UploadError, abort_upload, complete_upload, direct_upload_form, find_upload, start_upload, write_chunk
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+class ProductViewSet(VersionedListMixin, RowListMixin, viewsets.ModelViewSet):
+    # Images are prefetched in ProductImage.Meta.ordering so the serializer
+    # never has to query per product
+    queryset = Product.objects.prefetch_related('images')
     serializer_class = ProductSerializer
+    pagination_class = ProductCursorPagination
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    # Lists are built from .values() rows (core/rows.py) and carry version ETags (core/versions.py)
+    rows = product_rows
+    version_models = (Product, ProductImage)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = requested_fields(self.request, product_rows.field_names)
+        # Skip the image prefetch when the client projected the images away
+        if fields and not fields & {'images', 'primary_image'}:
+            queryset = queryset.prefetch_related(None)
+        return queryset
+
+    @action(detail=False, methods=['POST'], url_path='import')
+    def import_catalog(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.data.get('file_format') or file_format(upload.name)
+        if fmt not in FORMATS:
+            return Response({'error': 'Upload a .csv or .jsonl file'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            report = import_products(upload, fmt)
+        except ImportFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
+    @action(detail=False, methods=['GET'], url_path='export', permission_classes=[IsAuthenticated])
+    def export_catalog(self, request):
+        fmt = request.query_params.get('file_format', 'csv')
+        if fmt not in FORMATS:
+            return Response({'error': 'file_format must be csv or jsonl'}, status=status.HTTP_400_BAD_REQUEST)
+        content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(export_products(fmt), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="products.{fmt}"'
+        return response
 
     @action(detail=True, methods=['POST'], url_path='upload-images')
     def upload_images(self, request, pk=None):
@@ -25,43 +87,10 @@ class ProductViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Limit total number of images per product
-        existing_count = product.images.count()
-        if existing_count + len(images) > 10:  # Maximum 10 images per product
-            return Response(
-                {'error': f'Maximum 10 images allowed per product. You can add {10 - existing_count} more images.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        uploaded_images = []
-        for image in images:
-            try:
-                product_image = ProductImage.objects.create(
-                    product=product,
-                    image=image
-                )
-                uploaded_images.append(product_image)
-            except Exception as e:
-                return Response(
-                    {'error': str(e)},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        
-        # Set primary image
-        if primary_image_id:
-            try:
-                primary_image = ProductImage.objects.get(id=primary_image_id, product=product)
-                product.images.update(is_primary=False)
-                primary_image.is_primary = True
-                primary_image.save()
-            except ProductImage.DoesNotExist:
-                return Response(
-                    {'error': 'Specified primary image does not exist'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        elif uploaded_images and not product.images.filter(is_primary=True).exists():
-            uploaded_images[0].is_primary = True
-            uploaded_images[0].save()
+        try:
+            uploaded_images = add_images(product, images, primary_image_id)
+        except GalleryError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = ProductImageSerializer(uploaded_images, many=True)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -78,15 +107,9 @@ class ProductViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            image = ProductImage.objects.get(id=image_id, product=product)
-            product.images.update(is_primary=False)
-            image.is_primary = True
-            image.save()
-        except ProductImage.DoesNotExist:
-            return Response(
-                {'error': 'Specified image does not exist'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+            set_primary(product, image_id)
+        except GalleryError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({'message': 'Primary image updated successfully'})
     
@@ -102,50 +125,47 @@ class ProductViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            image = ProductImage.objects.get(id=image_id, product=product)
-            
-            # If deleting primary image, set another image as primary if available
-            if image.is_primary:
-                next_image = product.images.exclude(id=image_id).first()
-                if next_image:
-                    next_image.is_primary = True
-                    next_image.save()
-            
-            image.delete()
-        except ProductImage.DoesNotExist:
-            return Response(
-                {'error': 'Specified image does not exist'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+            delete_image(product, image_id)
+        except GalleryError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({'message': 'Image deleted successfully'})
 
-class TransactionViewSet(viewsets.ModelViewSet):
-    queryset = Transaction.objects.all()
+class TransactionViewSet(VersionedListMixin, RowListMixin, viewsets.ModelViewSet):
+    queryset = Transaction.objects.prefetch_related('items')
     serializer_class = TransactionSerializer
+    pagination_class = TransactionCursorPagination
+    rows = transaction_rows
+    version_models = (Transaction,)
+
+    def get_permissions(self):
+        # Customers place orders; everything else is for the admin
+        if self.action == 'create':
+            return [AllowAny()]
+        return [IsAuthenticated()]
 
     def get_queryset(self):
-        queryset = Transaction.objects.all()
+        queryset = Transaction.objects.prefetch_related('items')
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(name__icontains=search) | queryset.filter(email__icontains=search) | queryset.filter(tracking_number__iexact=search)
+            queryset = search_transactions(queryset, search)
         return queryset
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
-        headers = self.get_success_headers(serializer.data)
 
-        # Send email with tracking number
-        transaction = serializer.instance
-        send_mail(
-            'Your Order Tracking Number',
-            f'Thank you for your order. Your tracking number is: {transaction.tracking_number}',
-            settings.DEFAULT_FROM_EMAIL,
-            [transaction.email],
-            fail_silently=False,
-        )
+        # Queue the tracking number email with the order; the send_queued_emails
+        # worker delivers it, so checkout never waits on the mail server
+        with db_transaction.atomic():
+            self.perform_create(serializer)
+            transaction = serializer.instance
+            queue_email(
+                'Your Order Tracking Number',
+                f'Thank you for your order. Your tracking number is: {transaction.tracking_number}',
+                transaction.email,
+            )
+        headers = self.get_success_headers(serializer.data)
 
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
@@ -153,46 +173,237 @@ class TransactionViewSet(viewsets.ModelViewSet):
         kwargs['partial'] = True
         return self.update(request, *args, **kwargs)
 
+    @action(detail=False, methods=['GET'], url_path='export')
+    def export(self, request):
+        params = request.query_params
+        fmt = params.get('file_format', 'csv')
+        if fmt not in REPORT_FORMATS:
+            return Response({'error': 'file_format must be csv or xlsx'}, status=status.HTTP_400_BAD_REQUEST)
+        statuses = [value.strip() for value in params.get('status', '').split(',') if value.strip()]
+        try:
+            queryset = report_queryset(params.get('start'), params.get('end'), statuses)
+        except ReportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(stream_report(queryset, fmt), content_type=CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="transactions.{fmt}"'
+        return response
+
+    @action(detail=False, methods=['POST'], url_path='bulk-status')
+    def bulk_status(self, request):
+        ids = request.data.get('ids')
+        new_status = request.data.get('status')
+        if not isinstance(ids, list) or not ids or not all(type(pk) is int for pk in ids):
+            return Response({'error': 'ids must be a list of order ids'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            updated = change_statuses(ids, new_status)
+        except TransitionError as e:
+            return Response(
+                {'error': e.message, 'orders': e.orders, 'missing': e.missing},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response({'updated': updated})
+
+    @action(detail=True, methods=['GET'], url_path='history')
+    def history(self, request, pk=None):
+        transaction = self.get_object()
+        return Response(OrderStatusEventSerializer(transaction.status_events.all(), many=True).data)
+
 class BankDetailsViewSet(viewsets.ModelViewSet):
     queryset = BankDetails.objects.all()
     serializer_class = BankDetailsSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(request, bank_details_cache.get())
 
 @api_view(['POST'])
+@authentication_classes([])  # the token comes in the body; a stale Authorization header must not block this check
 def verify_admin(request):
-    token = request.data.get('token')
-    try:
-        admin_token = AdminToken.objects.get(token=token)
-        if admin_token.is_valid():
-            return Response({'valid': True})
-        else:
-            return Response({'valid': False, 'message': 'Token expired'})
-    except AdminToken.DoesNotExist:
-        return Response({'valid': False, 'message': 'Invalid token'}, status=status.HTTP_401_UNAUTHORIZED)
+    token_id, message = check_token(request.data.get('token'))
+    if token_id is not None:
+        return Response({'valid': True})
+    if message == 'Token expired':
+        return Response({'valid': False, 'message': message})
+    return Response({'valid': False, 'message': message}, status=status.HTTP_401_UNAUTHORIZED)
 
 
+@rate_limit('upload_payment_proof')
 @api_view(['POST'])
 def upload_payment_proof(request):
     tracking_number = request.data.get('tracking_number')
     payment_proof = request.data.get('payment_proof')
 
+    if unknown_tracking_number(tracking_number):
+        return Response({'error': 'Invalid tracking number'}, status=status.HTTP_400_BAD_REQUEST)
     try:
         transaction = Transaction.objects.get(tracking_number=tracking_number)
     except Transaction.DoesNotExist:
+        remember_unknown_tracking_number(tracking_number)
         return Response({'error': 'Invalid tracking number'}, status=status.HTTP_400_BAD_REQUEST)
 
+    try:
+        check_status_change(transaction, 'payment_uploaded')
+    except TransitionError as e:
+        return Response({'error': e.message}, status=status.HTTP_400_BAD_REQUEST)
+
     transaction.payment_proof = payment_proof
     transaction.status = 'payment_uploaded'
     transaction.save()
 
     return Response({'message': 'Payment proof uploaded successfully'}, status=status.HTTP_200_OK)
 
+def upload_state(session):
+    return Response(
+        {'id': session.id, 'offset': session.received, 'size': session.size},
+        headers={'Upload-Offset': str(session.received)},
+    )
+
+def find_upload_for(request, upload_id):
+    """The session for upload_id if the request carries its Upload-Token; raises UploadError"""
+    session = find_upload(upload_id, request.headers.get('Upload-Token'))
+    if session.purpose == 'product_image' and not request.user.is_authenticated:
+        raise UploadError('Admin token required', 401)
+    return session
+
+# Shared with upload_payment_proof; product image uploads come from admins and are not limited
+payment_proof_rate_limit = RateLimit('upload_payment_proof')
+
+@api_view(['POST'])
+def start_chunked_upload(request):
+    purpose = request.data.get('purpose')
+    filename = request.data.get('filename') or ''
+    direct = str(request.data.get('direct', '')).lower() in ('true', '1')
+    try:
+        size = int(request.data.get('size'))
+    except (TypeError, ValueError):
+        return Response({'error': 'size is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    transaction = product = None
+    if purpose == 'payment_proof':
+        wait = payment_proof_rate_limit.check(request)
+        if wait is not None:
+            return too_many_requests(wait)
+        tracking_number = request.data.get('tracking_number')
+        if unknown_tracking_number(tracking_number):
+            return Response({'error': 'Invalid tracking number'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            transaction = Transaction.objects.get(tracking_number=tracking_number)
+        except Transaction.DoesNotExist:
+            remember_unknown_tracking_number(tracking_number)
+            return Response({'error': 'Invalid tracking number'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            check_status_change(transaction, 'payment_uploaded')
+        except TransitionError as e:
+            return Response({'error': e.message}, status=status.HTTP_400_BAD_REQUEST)
+    elif purpose == 'product_image':
+        if not request.user.is_authenticated:
+            return Response({'error': 'Admin token required'}, status=status.HTTP_401_UNAUTHORIZED)
+        product = Product.objects.filter(pk=request.data.get('product')).first()
+        if product is None:
+            return Response({'error': 'Invalid product'}, status=status.HTTP_400_BAD_REQUEST)
+        if product.images.count() >= MAX_IMAGES:
+            return Response({'error': f'Maximum {MAX_IMAGES} images allowed per product.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        session, token = start_upload(purpose, filename, size, transaction=transaction, product=product, direct=direct)
+    except UploadError as e:
+        return Response({'error': e.message}, status=e.status_code)
+    if session.key:
+        form = direct_upload_form(session)
+        return Response(
+            {'id': session.id, 'token': token, 'size': session.size,
+             'upload': {'url': request.build_absolute_uri(form['url']), 'fields': form['fields']}},
+            status=status.HTTP_201_CREATED,
+        )
+    response = upload_state(session)
+    response.data['token'] = token
+    response.status_code = status.HTTP_201_CREATED
+    return response
+
+@api_view(['GET', 'PATCH', 'DELETE'])
+def chunked_upload(request, upload_id):
+    try:
+        session = find_upload_for(request, upload_id)
+    except UploadError as e:
+        return Response({'error': e.message}, status=e.status_code)
+
+    if request.method == 'GET':
+        return upload_state(session)
+
+    if request.method == 'DELETE':
+        abort_upload(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    # The chunk is the raw request body; it is streamed to disk and never parsed
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return Response({'error': 'Upload-Offset header is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if not content_length:
+        return upload_state(session)
+    try:
+        write_chunk(session, offset, request.stream, content_length)
+    except UploadError as e:
+        return Response({'error': e.message}, status=e.status_code)
+    return upload_state(session)
+
+@api_view(['POST'])
+def complete_chunked_upload(request, upload_id):
+    try:
+        session = find_upload_for(request, upload_id)
+        result = complete_upload(session)
+    except UploadError as e:
+        return Response({'error': e.message}, status=e.status_code)
+
+    if isinstance(result, ProductImage):
+        return Response(ProductImageSerializer(result, context={'request': request}).data, status=status.HTTP_201_CREATED)
+    return Response({'message': 'Payment proof uploaded successfully'}, status=status.HTTP_200_OK)
+
+# Stand-ins for S3's presigned POST and GET when files are kept in a
+# core.storage.LocalStorage; with S3 clients never call these
+@api_view(['POST'])
+@authentication_classes([])
+def storage_upload(request):
+    try:
+        storage, policy = read_signed(request.data.get('policy') or '', 'upload')
+    except signing.BadSignature:
+        return Response({'error': 'Invalid or expired upload policy'}, status=status.HTTP_403_FORBIDDEN)
+    if request.data.get('key') != policy['name'] or request.data.get('Content-Type') != policy['content_type']:
+        return Response({'error': 'Upload does not match its policy'}, status=status.HTTP_403_FORBIDDEN)
+
+    file = request.data.get('file')
+    if file is None:
+        return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if file.size != policy['size']:
+        return Response({'error': f'File must be {policy["size"]} bytes'}, status=status.HTTP_400_BAD_REQUEST)
+    # Like S3, a second upload to the same key replaces the first. File()
+    # drops the upload's sha256, so the file keeps its signed name.
+    storage.delete(policy['name'])
+    storage.save(policy['name'], File(file))
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+@api_view(['GET'])
+@authentication_classes([])
+def storage_download(request, token):
+    try:
+        storage, payload = read_signed(token, 'download')
+        return FileResponse(storage.open(payload['name'], 'rb'))
+    except (signing.BadSignature, FileNotFoundError):
+        raise Http404
+
+@rate_limit('track_order')
 @api_view(['GET'])
 def track_order(request):
     tracking_number = request.query_params.get('tracking_number')
 
+    if unknown_tracking_number(tracking_number):
+        return Response({'error': 'Invalid tracking number'}, status=status.HTTP_400_BAD_REQUEST)
     try:
-        transaction = Transaction.objects.get(tracking_number=tracking_number)
+        transaction = Transaction.objects.prefetch_related('items').get(tracking_number=tracking_number)
     except Transaction.DoesNotExist:
+        remember_unknown_tracking_number(tracking_number)
         return Response({'error': 'Invalid tracking number'}, status=status.HTTP_400_BAD_REQUEST)
 
     serializer = TransactionSerializer(transaction)
@@ -201,13 +412,10 @@ def track_order(request):
 class SiteSettingsViewSet(viewsets.ModelViewSet):
     queryset = SiteSettings.objects.all()
     serializer_class = SiteSettingsSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
 
     def list(self, request):
-        settings = SiteSettings.objects.first()
-        if not settings:
-            settings = SiteSettings.objects.create()
-        serializer = self.get_serializer(settings)
-        return Response(serializer.data)
+        return cached_response(request, site_settings_cache.get())
 
     def update(self, request, *args, **kwargs):
         settings = SiteSettings.objects.first()
@@ -216,4 +424,34 @@ class SiteSettingsViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(settings, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def dashboard(request):
+    params = request.query_params
+    try:
+        end = parse_date(params['end']) if params.get('end') else timezone.localdate()
+        start = parse_date(params['start']) if params.get('start') else end and end - timedelta(days=DEFAULT_DAYS - 1)
+    except ValueError:  # well formed but impossible, like 2026-02-30
+        start = end = None
+    if start is None or end is None:
+        return Response({'error': 'start and end must be dates in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+    if start > end or (end - start).days >= MAX_DAYS:
+        return Response({'error': f'Choose a range of 1 to {MAX_DAYS} days'}, status=status.HTTP_400_BAD_REQUEST)
+
+    threshold = params.get('low_stock_threshold')
+    if threshold is not None:
+        try:
+            threshold = int(threshold)
+        except ValueError:
+            return Response({'error': 'low_stock_threshold must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(dashboard_data(start, end, threshold))
+
+@api_view(['GET'])
+def metrics(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    if not request.user.is_authenticated:
+        return Response({'error': 'Admin token required'}, status=status.HTTP_401_UNAUTHORIZED)
+    return HttpResponse(metrics_registry.render_prometheus(), content_type='text/plain; version=0.0.4')
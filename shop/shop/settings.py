@@ -47,8 +47,12 @@ INSTALLED_APPS = [
 CORS_ALLOW_ALL_ORIGINS = True
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',  # no-op unless METRICS_ENABLED
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.compression.CompressionMiddleware',
+    # ETags for the remaining GET responses; the list endpoints set their own (see core/versions.py)
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -78,16 +82,86 @@ TEMPLATES = [
 WSGI_APPLICATION = 'shop.wsgi.application'
 
 
+# Admin endpoints take `Authorization: Token <admin token>` (see core/tokens.py).
+# JSON is encoded with orjson when it is installed (see core/renderers.py).
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': ['core.authentication.AdminTokenAuthentication'],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+
+# Responses smaller than this many bytes are sent uncompressed (see core/compression.py)
+COMPRESSION_MIN_SIZE = 1024
+
+
+# Per-view timing, query counts and Server-Timing headers, exported at /api/metrics/
+METRICS_ENABLED = False
+
+
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Connections are kept open for CONN_MAX_AGE seconds and reused by the next request
+# on the same worker thread, after a cheap health check. SQLite runs in WAL mode, so
+# readers never wait for the writer; writers queue for up to busy_timeout ms instead
+# of failing with "database is locked", and take the write lock when their
+# transaction starts (IMMEDIATE) so two checkouts can't deadlock upgrading a read.
+# synchronous=NORMAL is durable in WAL mode except for the last commits on power loss.
+# Compare profiles with `manage.py benchmark --write-concurrency 16`.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA busy_timeout=5000',
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# PostgreSQL with a connection pool per worker process (pip install "psycopg[binary,pool]").
+# The pool replaces persistent connections, so CONN_MAX_AGE must stay 0; prefer it when
+# serving through ASGI, where requests don't keep to one thread.
+#
+# DATABASES['default'] = {
+#     'ENGINE': 'django.db.backends.postgresql',
+#     'NAME': 'shop', 'USER': 'shop', 'PASSWORD': '...', 'HOST': 'localhost', 'PORT': '5432',
+#     'CONN_MAX_AGE': 0,
+#     'OPTIONS': {'pool': {'min_size': 2, 'max_size': 10, 'timeout': 10}},
+# }
+
+
+# Cache
+# Site settings, bank details and the version counters behind the product and order
+# list ETags live here (see core/cache.py and core/versions.py). Use a shared backend
+# such as Redis or Memcached when running several workers: with the per-process
+# LocMemCache a worker only sees its own writes until the local copies expire.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+# Rate limits for the public order endpoints, per client IP (see core/ratelimit.py).
+# Buckets live in RATE_LIMIT_CACHE; point it at a shared cache such as Redis when
+# running several workers or servers.
+RATE_LIMITS = {
+    'track_order': '60/min',
+    'upload_payment_proof': '20/hour',
+}
+# Per-IP overrides, e.g. {'203.0.113.7': {'track_order': '600/min'}}; None exempts the client
+RATE_LIMIT_CLIENTS = {}
+RATE_LIMIT_CACHE = 'default'
+# Number of reverse proxies in front of the app whose X-Forwarded-For entries are trusted
+RATE_LIMIT_PROXIES = 0
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -126,6 +200,29 @@ USE_TZ = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# File storage (see core/storage.py). Product images go to 'default' and have public
+# URLs; payment proofs go to 'private', whose URLs are signed and expire. LocalStorage
+# keeps them on disk and stands in for S3 in development. Private files live outside
+# MEDIA_ROOT, so only the signed /api/storage/ links serve them. To serve files from
+# S3 or an S3-compatible service such as MinIO (pip install "django-storages[s3]"):
+#
+# STORAGES['default'] = {'BACKEND': 'core.storage.S3Storage', 'OPTIONS': {
+#     'bucket_name': 'shop-media', 'endpoint_url': 'http://localhost:9000',
+#     'access_key': '...', 'secret_key': '...', 'querystring_auth': False,
+# }}
+# STORAGES['private'] = {'BACKEND': 'core.storage.S3Storage', 'OPTIONS': {
+#     'alias': 'private', 'bucket_name': 'shop-private', 'endpoint_url': 'http://localhost:9000',
+#     'access_key': '...', 'secret_key': '...', 'querystring_expire': 3600,
+# }}
+STORAGES = {
+    'default': {'BACKEND': 'core.storage.LocalStorage'},
+    'private': {'BACKEND': 'core.storage.LocalStorage', 'OPTIONS': {
+        'alias': 'private', 'querystring_auth': True,
+        'location': BASE_DIR / 'private_media', 'base_url': '/private-media/',  # never served as is
+    }},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
 STATIC_URL = 'static/'
 
 # Default primary key field type
@@ -138,5 +235,24 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 
-FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
-DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
\ No newline at end of file
+# Multipart uploads larger than this are spooled to a temporary file instead of RAM
+FILE_UPLOAD_MAX_MEMORY_SIZE = 262144  # 256KB
+# Uploads are hashed as they stream in, so duplicates are stored once (see core/dedup.py)
+FILE_UPLOAD_HANDLERS = [
+    'core.dedup.HashingMemoryFileUploadHandler',
+    'core.dedup.HashingTemporaryFileUploadHandler',
+]
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
+
+# Unpaid pending orders hold their stock this long before release_expired_reservations cancels them
+STOCK_RESERVATION_HOURS = 48
+
+# Products at or below this quantity are listed under low_stock on /api/dashboard/
+LOW_STOCK_THRESHOLD = 5
+
+# Where resumable chunked uploads (/api/uploads/) are assembled before being stored
+CHUNKED_UPLOAD_TEMP_DIR = BASE_DIR / 'upload_chunks'
+
+# Product image variants (see core/images.py)
+IMAGE_VARIANTS_ASYNC = True  # generate in a background thread pool after upload
+IMAGE_VARIANT_WORKERS = 2